@@ -0,0 +1,419 @@
+"""
+Benchmarks for the Entanglement Criteria.
+
+Times the hot paths of Entangled and create_statevector over a range of qubit
+counts, and records the peak memory of each call with tracemalloc.  Inputs are
+generated from a fixed seed, so runs are reproducible and need no network
+access.
+
+Benchmarks:
+1. 'init', Entangled(n) and the first access of 'kets', 'basis_kets',
+    'non_basis_kets' and 'decomp_dict', with an empty structure cache
+2. 'entangled', Entangled.entangled() with the 'dict' and 'numpy' engines
+3. 'normalize_statevector', Entangled.normalize_statevector()
+4. 'basis_change_method_one' and 'basis_change_method_two', with the first
+    ket with a nonzero amplitude as the source ket
+5. 'normalize_random_statevector', create_statevector.normalize_random_statevector()
+
+Inputs:
+- 'product', a random product state (not Entangled)
+- 'random', a random state drawn from complex Gaussian amplitudes (Entangled)
+- 'zero_ket', a random state with zero ket amplitude 0, so a basis change is
+    needed first
+The 'dict' engine is given statevector dictionaries and the 'numpy' engine is
+given arrays of amplitudes.
+
+Each benchmark runs 'repeat' times and the fastest and median times are
+reported; one more run measures peak memory, since tracemalloc slows every
+allocation.  Every benchmark grows as 2**n, so once a run would take longer
+than 'max_seconds' at the next qubit count, the benchmark is skipped for larger
+n and the default range n = 2..24 finishes in minutes.
+
+Results are written as JSON, with the Python, NumPy and Qiskit versions and
+the git commit, so runs of different versions can be compared:
+$ python benchmark.py --max-qubits 16 --output before.json
+$ git checkout my-branch
+$ python benchmark.py --max-qubits 16 --output after.json --compare before.json
+entangled dict product n=16: 0.912043s -> 0.455120s (0.50x)
+...
+
+See (Entanglement Criteria module)
+"""
+
+import argparse
+import contextlib
+import datetime
+import importlib.metadata
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import create_statevector
+import entanglement_class
+
+BENCHMARKS = (
+    'init', 'entangled', 'normalize_statevector', 'basis_change_method_one',
+    'basis_change_method_two', 'normalize_random_statevector'
+    )
+INPUTS = ('product', 'random', 'zero_ket')
+
+# inputs used by each benchmark
+BENCHMARK_INPUTS = {
+    'init': (None,),
+    'entangled': INPUTS,
+    'normalize_statevector': ('product', 'random'),
+    'basis_change_method_one': ('zero_ket',),
+    'basis_change_method_two': ('zero_ket',),
+    'normalize_random_statevector': (None,),
+    }
+
+# engines used by each benchmark, None where the engine does not apply
+BENCHMARK_ENGINES = {
+    'init': (None,),
+    'entangled': entanglement_class.ENGINES,
+    # these methods do not depend on the engine beyond dict or array input
+    'normalize_statevector': ('dict', 'numpy'),
+    'basis_change_method_one': ('dict', 'numpy'),
+    'basis_change_method_two': ('dict', 'numpy'),
+    'normalize_random_statevector': (None,),
+    }
+
+
+# Generate the amplitudes of an input statevector
+# inputs:
+#   - kind = one of INPUTS
+#   - number_qubits
+#   - seed = seed of the random generator
+# output:
+#   - complex array of length 2**number_qubits
+def input_amplitudes(kind: str, number_qubits: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+
+    if kind == 'product':
+        # tensor product of single qubit states with nonzero amplitudes
+        amplitudes = np.ones(1, dtype=complex)
+        for _ in range(number_qubits):
+            qubit = rng.uniform(0.5, 1.5, 2) + 1j*rng.uniform(-0.5, 0.5, 2)
+            amplitudes = np.kron(amplitudes, qubit)
+        return amplitudes/np.linalg.norm(amplitudes)
+
+    amplitudes = (
+        rng.standard_normal(2**number_qubits)
+        + 1j*rng.standard_normal(2**number_qubits)
+        )
+    if kind == 'zero_ket':
+        amplitudes[0] = 0
+    return amplitudes/np.linalg.norm(amplitudes)
+
+
+# Inputs for one qubit count, generated when first needed
+class Inputs:
+    def __init__(self, number_qubits: int, seed: int) -> None:
+        self.number_qubits = number_qubits
+        self.seed = seed
+        self.entangled = entanglement_class.Entangled(number_qubits)
+        self._cache = {}
+
+    # input:
+    #   - kind = one of INPUTS
+    #   - engine = 'dict' for a statevector dictionary, 'numpy' or 'sparse'
+    #       for an array
+    # output:
+    #   - statevector
+    def get(self, kind: str, engine: str):
+        key = kind, engine
+        if key not in self._cache:
+            amplitudes = input_amplitudes(kind, self.number_qubits, self.seed)
+            if engine == 'dict':
+                self._cache[key] = dict(
+                    zip(self.entangled.kets, amplitudes.tolist())
+                    )
+            else:
+                self._cache[key] = amplitudes
+        return self._cache[key]
+
+
+# Build the function to benchmark
+# inputs:
+#   - name = one of BENCHMARKS
+#   - engine = entanglement engine, or None
+#   - kind = input kind, or None
+#   - inputs = Inputs for the qubit count
+# output:
+#   - function with no arguments
+def make_case(name: str, engine, kind, inputs: Inputs):
+    n = inputs.number_qubits
+
+    if name == 'init':
+        def run():
+            entanglement_class.Entangled.structure_cache.clear()
+            x = entanglement_class.Entangled(n)
+            x.kets, x.basis_kets, x.non_basis_kets, x.decomp_dict
+        return run
+
+    if name == 'normalize_random_statevector':
+        return lambda: create_statevector.normalize_random_statevector(n)
+
+    # build the shared structure the 'dict' engine reads before timing
+    x = entanglement_class.Entangled(n, engine=engine, source_policy='first')
+    if engine == 'dict':
+        x.kets
+        if name == 'entangled':
+            x.decomp_dict
+    statevector = inputs.get(kind, engine)
+
+    if name == 'entangled':
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                x.entangled(statevector)
+        return run
+
+    if name == 'normalize_statevector':
+        return lambda: x.normalize_statevector(statevector)
+
+    # basis change methods
+    source_index = int(np.flatnonzero(inputs.get(kind, 'numpy'))[0])
+    source_ket = source_index if engine == 'numpy' else x.ket_string(
+        source_index
+        )
+    method = getattr(x, name)
+    return lambda: method(statevector, source_ket)
+
+
+# Time a function and measure its peak memory
+# inputs:
+#   - run = function with no arguments
+#   - repeat = number of timed runs
+#   - (optional) memory = True to measure peak memory in one more run
+#   - (optional) max_seconds = stop repeating once the timed runs take longer
+# output:
+#   - dictionary of times in seconds and peak memory in bytes
+def measure(run, repeat: int, memory=True, max_seconds=None) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+        if max_seconds is not None and sum(times) > max_seconds:
+            break
+
+    peak_bytes = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'seconds_min': min(times),
+        'seconds_median': statistics.median(times),
+        'peak_bytes': peak_bytes
+        }
+
+
+# Versions and machine details stored with the results
+def metadata(arguments) -> dict:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), check=True
+            ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    # read the installed version without importing Qiskit
+    try:
+        qiskit_version = importlib.metadata.version('qiskit')
+    except importlib.metadata.PackageNotFoundError:
+        qiskit_version = None
+
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'qiskit': qiskit_version,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'arguments': vars(arguments)
+        }
+
+
+# Run the benchmarks
+# inputs:
+#   - arguments = parsed command line arguments, see parse_arguments()
+#   - (optional) log = file for progress messages
+# output:
+#   - list of result dictionaries, one per benchmark, engine, input and qubit
+#       count; benchmarks over the time budget are marked 'skipped'
+def run_benchmarks(arguments, log=sys.stderr) -> list:
+    results = []
+    over_budget = set()
+
+    for n in range(arguments.min_qubits, arguments.max_qubits + 1):
+        inputs = Inputs(n, arguments.seed)
+        for name in arguments.benchmarks:
+            for engine in BENCHMARK_ENGINES[name]:
+                if engine is not None and engine not in arguments.engines:
+                    continue
+                for kind in BENCHMARK_INPUTS[name]:
+                    if kind is not None and kind not in arguments.inputs:
+                        continue
+                    result = {
+                        'benchmark': name, 'engine': engine, 'input': kind,
+                        'number_qubits': n
+                        }
+                    results.append(result)
+
+                    if (name, engine, kind) in over_budget:
+                        result['status'] = 'skipped'
+                        continue
+
+                    result.update(measure(
+                        make_case(name, engine, kind, inputs),
+                        arguments.repeat, arguments.memory,
+                        arguments.max_seconds
+                        ))
+                    result['status'] = 'ok'
+                    print(format_result(result), file=log, flush=True)
+
+                    # every benchmark grows as 2**n, so one more qubit
+                    # doubles the time
+                    if 2*result['seconds_min'] > arguments.max_seconds:
+                        over_budget.add((name, engine, kind))
+
+    return results
+
+
+# Label of a result, e.g. 'entangled dict product n=16'
+def result_label(result: dict) -> str:
+    parts = [result['benchmark'], result['engine'], result['input']]
+    return ' '.join(
+        [part for part in parts if part is not None]
+        + ['n='+str(result['number_qubits'])]
+        )
+
+
+def format_result(result: dict) -> str:
+    line = f"{result_label(result)}: {result['seconds_min']:.6f}s"
+    if result['peak_bytes'] is not None:
+        line += f", peak {result['peak_bytes']/2**20:.2f} MB"
+    return line
+
+
+# Compare results with an earlier run
+# inputs:
+#   - results = list of results from run_benchmarks()
+#   - baseline = list of results from an earlier run
+#   - threshold = slowdown ratio reported as a regression
+# output:
+#   - tuple (lines, number of regressions)
+def compare(results: list, baseline: list, threshold: float) -> tuple:
+    previous = {
+        result_label(result): result for result in baseline
+        if result['status'] == 'ok'
+        }
+    lines = []
+    regressions = 0
+
+    for result in results:
+        old = previous.get(result_label(result))
+        if result['status'] != 'ok' or old is None:
+            continue
+        ratio = result['seconds_min']/max(old['seconds_min'], 1e-12)
+        line = (
+            f"{result_label(result)}: {old['seconds_min']:.6f}s -> "
+            f"{result['seconds_min']:.6f}s ({ratio:.2f}x)"
+            )
+        if ratio > threshold:
+            line += " REGRESSION"
+            regressions += 1
+        lines.append(line)
+
+    return lines, regressions
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the Entanglement Criteria."
+        )
+    parser.add_argument('--min-qubits', type=int, default=2)
+    parser.add_argument('--max-qubits', type=int, default=24)
+    parser.add_argument(
+        '--benchmarks', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS)
+        )
+    parser.add_argument(
+        '--engines', nargs='+', choices=entanglement_class.ENGINES,
+        default=list(entanglement_class.ENGINES)
+        )
+    parser.add_argument(
+        '--inputs', nargs='+', choices=INPUTS, default=list(INPUTS)
+        )
+    parser.add_argument(
+        '--repeat', type=int, default=3, help="timed runs per benchmark"
+        )
+    parser.add_argument(
+        '--max-seconds', type=float, default=2.0,
+        help="skip a benchmark for larger n once a run would take longer"
+        )
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help="do not measure peak memory"
+        )
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--output', help="JSON file for the results, printed if not given"
+        )
+    parser.add_argument(
+        '--compare', metavar='BASELINE',
+        help="JSON results of an earlier run to compare against"
+        )
+    parser.add_argument(
+        '--threshold', type=float, default=1.25,
+        help="slowdown ratio reported as a regression by --compare"
+        )
+    return parser.parse_args(argv)
+
+
+# Command line entry point
+# input:
+#   - (optional) argv = list of command line arguments
+# output:
+#   - exit status, 1 if --compare found a regression
+def main(argv=None) -> int:
+    arguments = parse_arguments(argv)
+    report = {
+        'metadata': metadata(arguments),
+        'results': run_benchmarks(arguments)
+        }
+
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    else:
+        print(json.dumps(report, indent=1))
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            baseline = json.load(file)['results']
+        lines, regressions = compare(
+            report['results'], baseline, arguments.threshold
+            )
+        print('\n'.join(lines), file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,432 @@
+"""
+Bipartite separability of statevectors.
+
+The Entanglement Criteria decides whether a state is a product of n single
+qubit states.  The functions in this module decide whether a state factors
+across one cut A|B of its qubits, |Psi> = |a>|b>, where A is any subset of the
+qubits and B the rest.
+
+Qubits follow the Qiskit ordering: qubit i is bit 2**i of a ket index, the
+character n - 1 - i of the bitstring, so qubit 0 is the rightmost character.
+
+The amplitudes are reshaped into a matrix M of shape (2**|A|, 2**|B|), with
+M[a, b] the amplitude of the ket with bits a on A and bits b on B.  The state
+factors across A|B exactly when M has rank 1, i.e. when its second largest
+singular value (Schmidt coefficient) is 0.  Amplitudes carry rounding errors,
+so the second singular value is compared with a tolerance relative to the
+largest one.  A single cut is one reshape and one singular value
+decomposition, and many cuts of the same size are decomposed in one batched
+call.
+
+Example:
+>>> import numpy as np
+>>> import bipartite
+>>> bell = np.array([1, 0, 0, 1])/np.sqrt(2)
+>>> state = np.kron(bell, [0.6, 0.8])       # qubits 2, 1 Bell pair, qubit 0
+>>> bipartite.is_separable(state, 3, [0])
+True
+>>> bipartite.is_separable(state, 3, [1])
+False
+>>> bipartite.separable_cuts(state, 3, [[0], [1], [2], [0, 1]])
+array([ True, False, False, False])
+
+clusters() finds the finest partition of the qubits into clusters that are
+mutually unentangled, |Psi> = |c_1>|c_2>...|c_k>, without testing all cuts:
+>>> ghz = np.zeros(8); ghz[[0, 7]] = 1
+>>> bipartite.clusters(np.kron(ghz, state), 6)
+[(0,), (1, 2), (3, 4, 5)]
+
+See (Entanglement Criteria module)
+"""
+
+import itertools
+
+import numpy as np
+
+# largest number of amplitudes decomposed in one batched call
+BATCH_AMPLITUDES = 2**20
+# smallest distance between the two qubit reduced density matrix of a pair and
+# the product of its one qubit reduced density matrices that counts as a
+# correlation in clusters()
+CORRELATION_TOLERANCE = 1e-8
+# smallest ratio of the second to the first eigenvalue of a reduced density
+# matrix that is taken as entangled without a singular value decomposition
+SCREENING_RATIO = 1e-8
+
+
+# Validate a subsystem of qubits
+# inputs:
+#   - number_qubits
+#   - subsystem = iterable of qubit indices
+# output:
+#   - sorted tuple of distinct qubit indices
+def check_subsystem(number_qubits: int, subsystem) -> tuple:
+    qubits = tuple(sorted({int(qubit) for qubit in subsystem}))
+    if qubits and (qubits[0] < 0 or qubits[-1] >= number_qubits):
+        raise ValueError(
+            f"qubits must be between 0 and {number_qubits - 1}, got "
+            f"{list(subsystem)}"
+            )
+    return qubits
+
+
+# Reshape amplitudes into the matrix of a cut A|B
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits, or of shape
+#       (batch, 2**number_qubits)
+#   - number_qubits
+#   - subsystem = qubits of A; B is the rest
+# output:
+#   - complex array of shape (2**|A|, 2**|B|) (or (batch, 2**|A|, 2**|B|)),
+#       with rows indexed by the bits on A and columns by the bits on B
+def cut_matrix(amplitudes, number_qubits: int, subsystem) -> np.ndarray:
+    qubits = check_subsystem(number_qubits, subsystem)
+    rest = [qubit for qubit in range(number_qubits) if qubit not in qubits]
+    batch_shape = amplitudes.shape[:-1]
+
+    # axis j of the (2,)*n tensor is qubit n - 1 - j, the highest bit first
+    tensor = amplitudes.reshape(batch_shape + (2,)*number_qubits)
+    axes = [number_qubits - 1 - qubit for qubit in reversed(qubits)]
+    axes += [number_qubits - 1 - qubit for qubit in reversed(rest)]
+    batch_axes = list(range(len(batch_shape)))
+    tensor = tensor.transpose(
+        batch_axes + [len(batch_shape) + axis for axis in axes]
+        )
+    return tensor.reshape(batch_shape + (2**len(qubits), 2**len(rest)))
+
+
+# Schmidt coefficients of a cut A|B, the singular values of its matrix
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - subsystem = qubits of A; B is the rest
+# output:
+#   - real array of singular values in decreasing order, of length
+#       min(2**|A|, 2**|B|)
+def schmidt_coefficients(amplitudes, number_qubits: int, subsystem
+                         ) -> np.ndarray:
+    return np.linalg.svd(
+        cut_matrix(amplitudes, number_qubits, subsystem), compute_uv=False
+        )
+
+
+# Decide separability from singular values
+# inputs:
+#   - singular_values = real array of shape (..., k), in decreasing order
+#   - (optional) tolerance = largest ratio of the second to the first
+#       singular value of a separable state, defaults to the numerical
+#       precision of the matrix
+#   - (optional) shape = shape of the matrices, for the default tolerance
+# output:
+#   - boolean array of shape (...), True where the rank is 1
+def rank_one(singular_values, tolerance=None, shape=(1, 1)) -> np.ndarray:
+    if tolerance is None:
+        tolerance = max(shape)*np.finfo(float).eps
+    if singular_values.shape[-1] < 2:
+        return np.ones(singular_values.shape[:-1], dtype=bool)
+    return singular_values[..., 1] <= tolerance*singular_values[..., 0]
+
+
+# Check whether a state factors across a cut A|B
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - subsystem = qubits of A; B is the rest
+#   - (optional) tolerance = see rank_one()
+# output:
+#   - True if the state is a product of a state of A and a state of B
+def is_separable(amplitudes, number_qubits: int, subsystem,
+                 tolerance=None) -> bool:
+    if not np.any(amplitudes):
+        raise ValueError("statevector has no nonzero amplitudes")
+    matrix = cut_matrix(amplitudes, number_qubits, subsystem)
+    singular_values = np.linalg.svd(matrix, compute_uv=False)
+    return bool(rank_one(singular_values, tolerance, matrix.shape))
+
+
+# Check whether a state factors across each of many cuts
+# Cuts with the same number of qubits in A give matrices of the same shape,
+# which are decomposed together in batched calls of at most BATCH_AMPLITUDES
+# amplitudes.
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - subsystems = iterable of subsystems A, one per cut
+#   - (optional) tolerance = see rank_one()
+# output:
+#   - boolean array, True where the state factors across the cut
+def separable_cuts(amplitudes, number_qubits: int, subsystems,
+                   tolerance=None) -> np.ndarray:
+    if not np.any(amplitudes):
+        raise ValueError("statevector has no nonzero amplitudes")
+    subsystems = [
+        check_subsystem(number_qubits, subsystem) for subsystem in subsystems
+        ]
+    results = np.ones(len(subsystems), dtype=bool)
+
+    # group cuts by the size of A
+    groups = {}
+    for position, qubits in enumerate(subsystems):
+        groups.setdefault(len(qubits), []).append(position)
+
+    per_call = max(1, BATCH_AMPLITUDES // len(amplitudes))
+    for size, positions in groups.items():
+        if size in (0, number_qubits):
+            continue
+        for start in range(0, len(positions), per_call):
+            chunk = positions[start:start + per_call]
+            matrices = np.stack([
+                cut_matrix(amplitudes, number_qubits, subsystems[position])
+                for position in chunk
+                ])
+            singular_values = np.linalg.svd(matrices, compute_uv=False)
+            results[chunk] = rank_one(
+                singular_values, tolerance, matrices.shape[1:]
+                )
+    return results
+
+
+# All cuts A|B with A a nonempty proper subset, each cut listed once (A never
+# contains the highest qubit, so A and its complement are not both listed)
+# input:
+#   - number_qubits
+# output:
+#   - list of subsystems A
+def all_cuts(number_qubits: int) -> list:
+    return [
+        tuple(qubit for qubit in range(number_qubits) if mask >> qubit & 1)
+        for mask in range(1, 2**(number_qubits - 1))
+        ]
+
+
+# Gram matrix M M^H of a matrix with few rows
+# A (2, N) or (4, N) product is several times faster as inner products of its
+# rows than as a matrix product.
+def gram(matrix) -> np.ndarray:
+    rows = len(matrix)
+    if rows > 4:
+        return matrix @ matrix.conj().T
+    result = np.empty((rows, rows), dtype=complex)
+    for i in range(rows):
+        for j in range(i, rows):
+            result[i, j] = np.vdot(matrix[j], matrix[i])
+            result[j, i] = np.conj(result[i, j])
+    return result
+
+
+# Check whether a state factors across a cut A|B, skipping the singular value
+# decomposition when the reduced density matrix of the smaller side is
+# clearly mixed
+# Its eigenvalues are the squares of the singular values, accurate to the
+# numerical precision, so a ratio well above it decides the cut alone.
+# inputs:
+#   - amplitudes, number_qubits, subsystem, tolerance = see is_separable()
+# output:
+#   - True if the state is a product of a state of A and a state of B
+def screened_separable(amplitudes, number_qubits: int, subsystem,
+                       tolerance=None) -> bool:
+    matrix = cut_matrix(amplitudes, number_qubits, subsystem)
+    if matrix.shape[0] > matrix.shape[1]:
+        matrix = matrix.T
+    if matrix.shape[0] == 1:
+        return True
+
+    eigenvalues = np.linalg.eigvalsh(gram(matrix))
+    screen = SCREENING_RATIO if tolerance is None else max(
+        SCREENING_RATIO, tolerance**2
+        )
+    if eigenvalues[-2] > screen*eigenvalues[-1]:
+        return False
+
+    # a wide matrix has the singular values of the triangular factor of its
+    # QR decomposition, which is much faster than decomposing it directly
+    shape = matrix.shape
+    if shape[1] > 8*shape[0]:
+        matrix = np.linalg.qr(matrix.T, mode='r')
+    singular_values = np.linalg.svd(matrix, compute_uv=False)
+    return bool(rank_one(singular_values, tolerance, shape))
+
+
+# Split a state that factors across a cut A|B into the states of A and B
+# The row and the column through the largest amplitude of the (rank 1) cut
+# matrix are the two factors, up to normalization.
+# inputs:
+#   - amplitudes, number_qubits, subsystem = see cut_matrix()
+# output:
+#   - tuple (state of A, state of B), each indexed by its own qubits in
+#       increasing order (the lowest qubit of A is bit 2**0 of the state of A)
+def factor_states(amplitudes, number_qubits: int, subsystem) -> tuple:
+    matrix = cut_matrix(amplitudes, number_qubits, subsystem)
+    row, column = np.unravel_index(
+        np.argmax(np.abs(matrix)), matrix.shape
+        )
+    return matrix[:, column].copy(), matrix[row].copy()
+
+
+# Check whether two qubits are correlated
+# Qubits in different clusters have a reduced density matrix rho_ij equal to
+# rho_i (x) rho_j.  Qubits of the same cluster usually do not, but a cluster
+# can have uncorrelated pairs (e.g. (|000> + |011> + |101> + |110>)/2).
+# The diagonals of rho_ij and rho_i (x) rho_j are the joint and independent
+# probabilities of the two bits, which are summed without copying the
+# amplitudes, so a pair with correlated bits is found without rho_ij.
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - pair = two distinct qubits
+#   - (optional) threshold = smallest Frobenius distance between rho_ij and
+#       rho_i (x) rho_j that counts as a correlation
+#   - (optional) probabilities = squared magnitudes of the amplitudes
+# output:
+#   - True if the pair is correlated
+def correlated(amplitudes, number_qubits: int, pair,
+               threshold=CORRELATION_TOLERANCE, probabilities=None) -> bool:
+    if probabilities is not None:
+        low, high = sorted(pair)
+        blocks = probabilities.reshape(
+            2**(number_qubits - 1 - high), 2, 2**(high - low - 1), 2, 2**low
+            )
+        joint = np.array([
+            [blocks[:, high_bit, :, low_bit, :].sum() for low_bit in (0, 1)]
+            for high_bit in (0, 1)
+            ])
+        joint /= joint.sum()
+        independent = np.outer(joint.sum(axis=1), joint.sum(axis=0))
+        if np.linalg.norm(joint - independent) > threshold:
+            return True
+
+    density = gram(cut_matrix(amplitudes, number_qubits, pair))
+    density /= np.trace(density).real
+
+    # rows are indexed by (bit of the higher qubit, bit of the lower qubit)
+    tensor = density.reshape(2, 2, 2, 2)
+    high = np.einsum('abcb->ac', tensor)
+    low = np.einsum('abad->bd', tensor)
+    return bool(np.linalg.norm(density - np.kron(high, low)) > threshold)
+
+
+# Connected component of a qubit in the graph of correlated pairs
+# The component grows one layer of neighbours at a time, and stops early when
+# a layer is complete and stop(component) is True.
+# inputs:
+#   - amplitudes, number_qubits, threshold = see correlated()
+#   - seed = qubit to start from
+#   - candidates = qubits that may join the component
+#   - (optional) stop = callable taking the sorted tuple of the component
+# output:
+#   - sorted tuple of the qubits of the component, including the seed
+def correlated_component(amplitudes, number_qubits: int, seed, candidates,
+                         threshold=CORRELATION_TOLERANCE, stop=None) -> tuple:
+    component = [seed]
+    layer = [seed]
+    unvisited = [qubit for qubit in candidates if qubit != seed]
+    probabilities = amplitudes.real**2 + amplitudes.imag**2
+    while layer and unvisited:
+        joined = [
+            qubit for qubit in unvisited if any(
+                correlated(amplitudes, number_qubits, (member, qubit),
+                           threshold, probabilities)
+                for member in layer
+                )
+            ]
+        component += joined
+        unvisited = [qubit for qubit in unvisited if qubit not in joined]
+        layer = joined
+        if joined and unvisited and stop is not None and stop(
+                tuple(sorted(component))
+                ):
+            break
+    return tuple(sorted(component))
+
+
+# Smallest set of qubits containing qubit 0 that factors out of a state
+# Every correlated pair lies inside one cluster, so the correlated component
+# of qubit 0 is part of its cluster, and the cluster is a union of correlated
+# components.  Unions with one more component at a time are tested until one
+# factors out; only states with correlations hidden from every pair need more
+# than the first test.
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - tolerance, threshold = see clusters()
+# output:
+#   - sorted tuple of the qubits of the cluster of qubit 0
+def _first_cluster(amplitudes, number_qubits: int, tolerance, threshold
+                   ) -> tuple:
+    qubits = range(number_qubits)
+
+    def factors(subsystem):
+        return screened_separable(amplitudes, number_qubits, subsystem,
+                                  tolerance)
+
+    if factors([0]):
+        return (0,)
+    first = correlated_component(amplitudes, number_qubits, 0, qubits,
+                                 threshold, stop=factors)
+    if len(first) == number_qubits or factors(first):
+        return first
+
+    components = []
+    remaining = [qubit for qubit in qubits if qubit not in first]
+    while remaining:
+        component = correlated_component(
+            amplitudes, number_qubits, remaining[0], remaining, threshold
+            )
+        components.append(component)
+        remaining = [qubit for qubit in remaining if qubit not in component]
+
+    # a union of all but one component factors exactly when that component
+    # does, so the largest unions tested leave out one component
+    for size in range(1, len(components) - 1):
+        for chosen in itertools.combinations(components, size):
+            union = tuple(sorted(first + sum(chosen, ())))
+            if factors(union):
+                return union
+    for component in components:
+        if factors(component):
+            return tuple(
+                qubit for qubit in qubits if qubit not in component
+                )
+    return tuple(qubits)
+
+
+# Finest partition of the qubits into mutually unentangled clusters
+# The cluster of the lowest remaining qubit is found with _first_cluster(),
+# then factored out, so the remaining state halves with every qubit removed.
+# Without hidden correlations this is a few cut tests per cluster and at most
+# one two qubit reduced density matrix per pair of qubits, instead of the
+# 2**(n - 1) - 1 cuts of all_cuts().
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - (optional) tolerance = see rank_one()
+#   - (optional) threshold = see correlated(), defaults to the larger of
+#       CORRELATION_TOLERANCE and the tolerance
+# output:
+#   - list of clusters, each a sorted tuple of qubits, ordered by their lowest
+#       qubit
+def clusters(amplitudes, number_qubits: int, tolerance=None,
+             threshold=None) -> list:
+    if not np.any(amplitudes):
+        raise ValueError("statevector has no nonzero amplitudes")
+    if threshold is None:
+        threshold = CORRELATION_TOLERANCE if tolerance is None else max(
+            CORRELATION_TOLERANCE, tolerance
+            )
+
+    # qubits[i] is the qubit of bit 2**i of the remaining state
+    qubits = list(range(number_qubits))
+    state = np.asarray(amplitudes, dtype=complex)
+    found = []
+    while qubits:
+        size = len(qubits)
+        cluster = _first_cluster(state, size, tolerance, threshold)
+        found.append(tuple(qubits[position] for position in cluster))
+        if len(cluster) == size:
+            break
+        state = factor_states(state, size, cluster)[1]
+        qubits = [
+            qubit for position, qubit in enumerate(qubits)
+            if position not in cluster
+            ]
+    return sorted(found)
@@ -11,18 +11,85 @@ The function get_amplitudes() generates statevectors via user input.
 The function normalized_random_statevector() generates random statevectors and
 normalizes the zero ket amplitiude to 1.
 
+Statevector dictionaries and random states are built with NumPy by default, in
+the same format as Qiskit, so Qiskit is only imported (which takes seconds)
+when backend='qiskit' is requested:
+>>> import create_statevector as cs
+>>> cs.init_statevector(2)
+{'00': (1+0j), '01': (1+0j), '10': (1+0j), '11': (1+0j)}
+>>> cs.init_statevector(2, backend='qiskit')
+{'00': np.complex128(1+0j), '01': np.complex128(1+0j), ...}
+>>> x = cs.normalize_random_statevector(3, seed=7)
+
+For test corpora and Monte Carlo runs, random_statevectors() draws many states
+at once into one (batch, 2**n) array, and iter_random_statevectors() streams
+them in chunks of bounded size:
+>>> states = cs.random_statevectors(10, 1000, seed=1, kind='mixed')
+>>> states.shape
+(1000, 1024)
+>>> for chunk in cs.iter_random_statevectors(20, 10**6, chunk_size=64, seed=1):
+...     verdicts = checker.entangled_batch(chunk)
+
 See (Qiskit Statevector documentation)
 See (Entanglement Criteria module)
 """
 
 import numpy as np
-from qiskit.quantum_info import Statevector
-from qiskit.quantum_info import random_statevector
+
+import entanglement_array
+
+BACKENDS = ('numpy', 'qiskit')
+
+# populations of random_statevectors()
+KINDS = ('haar', 'product', 'mixed')
+
+# how random_statevectors() scales each state
+NORMALIZATIONS = ('zero_ket', 'unit')
+
+
+# Import qiskit.quantum_info the first time a Qiskit object is needed
+# Importing Qiskit takes seconds, so it is never imported at module load
+def qiskit_quantum_info():
+    from qiskit import quantum_info
+    return quantum_info
+
+def check_backend(backend: str) -> None:
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+
+# All bitstrings of length number_qubits, in the order of a Qiskit Statevector
+# Dictionary
+def ket_strings(number_qubits: int) -> list:
+    return [
+        format(index, '0'+str(number_qubits)+'b')
+        for index in range(2**number_qubits)
+        ]
 
 # Initialize a nonzero Qiskit Statevector Dictionary
 # use np.ones() because Statevector(np.zeros()) returns an empty list    
-def init_statevector(number_qubits: int) -> dict:
-    return Statevector(np.ones(2**number_qubits)).to_dict()
+# The 'numpy' backend builds the same dictionary without Qiskit
+def init_statevector(number_qubits: int, backend='numpy') -> dict:
+    check_backend(backend)
+    if backend == 'qiskit':
+        Statevector = qiskit_quantum_info().Statevector
+        return Statevector(np.ones(2**number_qubits)).to_dict()
+
+    return dict.fromkeys(ket_strings(number_qubits), 1+0j)
+
+# Random statevector amplitudes, uniformly distributed over all states (Haar
+# measure): independent complex Gaussian amplitudes, scaled to unit length
+# inputs:
+#   - number_qubits
+#   - (optional) seed = seed or numpy.random.Generator, None for a random seed
+# output:
+#   - complex array of length 2**number_qubits
+def random_amplitudes(number_qubits: int, seed=None) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    amplitudes = (
+        rng.standard_normal(2**number_qubits)
+        + 1j*rng.standard_normal(2**number_qubits)
+        )
+    return amplitudes/np.linalg.norm(amplitudes)
 
 # Get amplitude of single ket via user input
 def get_amplitude(key: str, recursive=False):
@@ -67,17 +134,133 @@ def get_amplitudes(number_qubits: int):
 # Random Statevector Dictionary with normalized zero ket
 # TODO: implement the normalization step in the general
 #       algorithm per the Entanglement Criteria
-def normalize_random_statevector(n):
-    # generate Qiskit random statevector of dim 2**n
-    random_state = random_statevector(2**n, None)
+# inputs:
+#   - n = number of qubits
+#   - (optional) seed = seed or numpy.random.Generator, None for a random seed
+#   - (optional) backend = 'numpy', or 'qiskit' for Qiskit random_statevector()
+def normalize_random_statevector(n, seed=None, backend='numpy'):
+    check_backend(backend)
+    if backend == 'qiskit':
+        # generate Qiskit random statevector of dim 2**n
+        random_statevector = qiskit_quantum_info().random_statevector
+        random_state = random_statevector(2**n, seed)
 
-    # Normalize zero ket to have amplitude = 1
-    normalized_random_state = random_state/random_state[0]
+        # Normalize zero ket to have amplitude = 1
+        normalized_random_state = random_state/random_state[0]
 
-    # Convert normalized Statevector to dictionary:
-    statevector = normalized_random_state.to_dict()
+        # Convert normalized Statevector to dictionary:
+        statevector = normalized_random_state.to_dict()
 
-    return statevector
+        return statevector
+
+    amplitudes = random_amplitudes(n, seed)
+    return dict(zip(ket_strings(n), (amplitudes/amplitudes[0]).tolist()))
+
+# Many random statevectors at once, as rows of one contiguous array
+# States are drawn from a seeded numpy.random.Generator:
+# - 'haar': uniformly distributed over all states (complex Gaussian amplitudes)
+# - 'product': tensor products of uniformly distributed single qubit states,
+#     i.e. states that are not Entangled
+# - 'mixed': each state is a product state with probability product_fraction,
+#     otherwise a 'haar' state
+# With normalization='zero_ket' (as normalize_random_statevector()) product
+# states are built with the same products as the Entanglement Criteria
+# (entanglement_array.block_target_amplitudes()), so every check passes
+# exactly.  With normalization='unit' states have length 1, and rounding can
+# make a product state fail the exact equality checks.
+# inputs:
+#   - number_qubits
+#   - batch = number of statevectors
+#   - (optional) seed = seed or numpy.random.Generator, None for a random seed
+#   - (optional) kind = one of KINDS
+#   - (optional) product_fraction = share of product states for kind='mixed'
+#   - (optional) normalization = one of NORMALIZATIONS
+#   - (optional) out = C-contiguous complex array of shape
+#       (batch, 2**number_qubits) to fill instead of a new array, e.g. a
+#       np.memmap
+#   - (optional) return_kinds = True to also return which states are product
+#       states
+# output:
+#   - complex array of shape (batch, 2**number_qubits)
+#   - (if return_kinds is True) boolean array, True for product states
+def random_statevectors(number_qubits: int, batch: int, seed=None,
+                        kind='haar', product_fraction=0.5,
+                        normalization='zero_ket', out=None,
+                        return_kinds=False):
+    if kind not in KINDS:
+        raise ValueError(f"kind must be one of {KINDS}, got {kind!r}")
+    if normalization not in NORMALIZATIONS:
+        raise ValueError(
+            f"normalization must be one of {NORMALIZATIONS}, "
+            f"got {normalization!r}"
+            )
+    shape = (batch, 2**number_qubits)
+    if out is None:
+        out = np.empty(shape, dtype=complex)
+    elif (out.shape != shape or out.dtype != complex
+          or not out.flags.c_contiguous):
+        raise ValueError(
+            f"out must be a C-contiguous complex array of shape {shape}"
+            )
+
+    rng = np.random.default_rng(seed)
+    if kind == 'mixed':
+        products = rng.random(batch) < product_fraction
+    else:
+        products = np.full(batch, kind == 'product')
+
+    if not products.any():
+        # fill the output directly, real and imaginary parts side by side
+        rng.standard_normal(out=out.view(np.float64))
+        haar_rows = slice(None)
+    else:
+        haar_rows = np.flatnonzero(~products)
+        if len(haar_rows):
+            out[haar_rows] = rng.standard_normal(
+                (len(haar_rows), 2*shape[1])
+                ).view(complex)
+
+        # single qubit states (alpha, beta) with a nonzero alpha; divided by
+        # alpha, the basis ket amplitude of each qubit is beta/alpha
+        qubits = rng.standard_normal((products.sum(), number_qubits, 4))
+        qubits = qubits.view(complex)
+        out[products] = entanglement_array.block_target_amplitudes(
+            qubits[..., 1]/qubits[..., 0], 0, shape[1]
+            )
+
+    if normalization == 'zero_ket':
+        # z/z can round to 1 with a tiny imaginary part, so set it exactly
+        out[haar_rows] /= out[haar_rows, :1]
+        out[haar_rows, 0] = 1
+    else:
+        out /= np.linalg.norm(out, axis=1, keepdims=True)
+
+    if return_kinds:
+        return out, products
+    return out
+
+# Stream random statevectors in chunks, so memory stays bounded however many
+# states are drawn
+# All chunks come from one generator, so the same seed and chunk_size always
+# give the same states
+# inputs:
+#   - number_qubits
+#   - count = total number of statevectors
+#   - (optional) chunk_size = number of statevectors per chunk
+#   - (optional) seed, kind, product_fraction, normalization, return_kinds =
+#       see random_statevectors()
+# output:
+#   - generator of arrays of shape (chunk, 2**number_qubits), the last one
+#       possibly shorter (or tuples with the kinds, see random_statevectors())
+def iter_random_statevectors(number_qubits: int, count: int, chunk_size=1024,
+                             seed=None, kind='haar', product_fraction=0.5,
+                             normalization='zero_ket', return_kinds=False):
+    rng = np.random.default_rng(seed)
+    for start in range(0, count, chunk_size):
+        yield random_statevectors(
+            number_qubits, min(chunk_size, count - start), rng, kind,
+            product_fraction, normalization, return_kinds=return_kinds
+            )
 
 # Test statevector of length 16 with zero ket amplitude = 0 to test 
 # basis change methods
@@ -0,0 +1,225 @@
+"""
+Basis ket decompositions of all non-basis kets, as two flat arrays.
+
+The decomposition of a non-basis ket is the list of basis kets of its set
+bits, from the leftmost bit, e.g. '1011' -> ['1000', '0010', '0001'].  A
+DecompositionIndex holds the decompositions of all non-basis kets of n qubits
+in a CSR (compressed sparse row) layout:
+- 'positions', uint8, the positions of the basis kets of every non-basis ket
+    one after another, in increasing ket order.  Position p is the basis ket
+    of bit 2**(n-1-p), i.e. positions are indices into
+    entanglement_array.basis_indices() and Entangled.basis_kets
+- 'offsets', int64 of length (number of non-basis kets + 1), where the
+    decomposition of the i-th non-basis ket is positions[offsets[i]:
+    offsets[i+1]]
+The i-th non-basis ket is found from its index k as i = k - k.bit_length() - 1,
+so kets are not stored.  At n = 20 the index takes 19 MB, where a dictionary of
+lists of bitstrings takes over a GB.
+
+save() writes the arrays to a directory once, as .npy files, and load() maps
+them back read-only, so any number of processes that load the same index
+share its pages instead of each building its own.  shared_index() loads an
+index from a directory, building and saving it first if it is missing.
+
+Example:
+>>> import decomposition_index
+>>> index = decomposition_index.shared_index(4, 'indexes')
+>>> index.positions_of(0b1011)
+array([0, 2, 3], dtype=uint8)
+>>> index.decomposition(0b1011)
+[8, 2, 1]
+>>> len(index)
+11
+
+See (Entanglement Criteria module)
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+import entanglement_array
+
+# number of non-basis kets per block in build() and iter_decompositions()
+BLOCK_SIZE = 2**16
+# number of non-basis kets of the first block of iter_decompositions(), so
+# callers that stop early only read a few kets
+FIRST_BLOCK_SIZE = 64
+
+
+# Position of a non-basis ket among the non-basis kets, in increasing order
+# input:
+#   - ket = index of a non-basis ket
+# output:
+#   - position of the ket in DecompositionIndex.offsets
+def non_basis_position(ket: int) -> int:
+    return ket - ket.bit_length() - 1
+
+
+class DecompositionIndex:
+    # inputs:
+    #   - number_qubits
+    #   - offsets, positions = CSR arrays, see module docstring
+    def __init__(self, number_qubits: int, offsets, positions) -> None:
+        self.number_qubits = number_qubits
+        self.offsets = offsets
+        self.positions = positions
+
+    # Build the index of n qubits in memory
+    # Basis kets are visited from the leftmost bit, and each non-basis ket with
+    # that bit set appends its position after those of its higher bits.
+    # input:
+    #   - number_qubits
+    # output:
+    #   - DecompositionIndex
+    @classmethod
+    def build(cls, number_qubits: int):
+        kets = entanglement_array.non_basis_indices(number_qubits)
+        offsets = np.zeros(len(kets) + 1, dtype=np.int64)
+        np.cumsum(
+            np.bitwise_count(kets) if hasattr(np, 'bitwise_count')
+            else [int(ket).bit_count() for ket in kets.tolist()],
+            out=offsets[1:]
+            )
+
+        positions = np.empty(offsets[-1], dtype=np.uint8)
+        for start in range(0, len(kets), BLOCK_SIZE):
+            block = kets[start:start + BLOCK_SIZE]
+            filled = offsets[start:start + len(block)].copy()
+            for position in range(number_qubits):
+                is_set = (block >> (number_qubits - 1 - position) & 1) != 0
+                positions[filled[is_set]] = position
+                filled += is_set
+        return cls(number_qubits, offsets, positions)
+
+    # Paths of the files of the index of n qubits in a directory
+    # inputs:
+    #   - directory
+    #   - number_qubits
+    # output:
+    #   - tuple (offsets path, positions path)
+    @staticmethod
+    def paths(directory, number_qubits: int) -> tuple:
+        prefix = os.path.join(directory, f'decomposition-{number_qubits}')
+        return prefix + '-offsets.npy', prefix + '-positions.npy'
+
+    # Write the index to a directory
+    # Each file is written under a temporary name and renamed, positions
+    # first, so a process loading the index never reads a partial file.
+    # input:
+    #   - directory = directory of the .npy files, created if missing
+    def save(self, directory) -> None:
+        os.makedirs(directory, exist_ok=True)
+        offsets_path, positions_path = self.paths(
+            directory, self.number_qubits
+            )
+        for path, array in (
+            (positions_path, self.positions), (offsets_path, self.offsets)
+            ):
+            descriptor, temporary = tempfile.mkstemp(
+                dir=directory, suffix='.tmp'
+                )
+            try:
+                with os.fdopen(descriptor, 'wb') as stream:
+                    np.save(stream, array)
+                os.replace(temporary, path)
+            except BaseException:
+                os.remove(temporary)
+                raise
+
+    # Memory-map a saved index read-only
+    # inputs:
+    #   - directory = directory the index was saved to
+    #   - number_qubits
+    # output:
+    #   - DecompositionIndex
+    @classmethod
+    def load(cls, directory, number_qubits: int):
+        offsets_path, positions_path = cls.paths(directory, number_qubits)
+        offsets = np.load(offsets_path, mmap_mode='r')
+        positions = np.load(positions_path, mmap_mode='r')
+
+        expected = 2**number_qubits - number_qubits
+        if len(offsets) != expected or len(positions) != offsets[-1]:
+            raise ValueError(
+                f"{offsets_path} and {positions_path} are not the index of "
+                f"{number_qubits} qubits"
+                )
+        return cls(number_qubits, offsets, positions)
+
+    # Total size of the arrays in bytes
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.positions.nbytes
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    # Positions of the basis kets of a non-basis ket, see module docstring
+    # input:
+    #   - ket = index of a non-basis ket
+    # output:
+    #   - uint8 array, a read-only view of the index
+    def positions_of(self, ket: int) -> np.ndarray:
+        if not 0 < ket < 2**self.number_qubits or not ket & (ket - 1):
+            raise KeyError(ket)
+        row = non_basis_position(ket)
+        return self.positions[self.offsets[row]:self.offsets[row + 1]]
+
+    # Basis kets of a non-basis ket, from the leftmost bit
+    # input:
+    #   - ket = index of a non-basis ket
+    # output:
+    #   - list of basis ket indices
+    def decomposition(self, ket: int) -> list:
+        top = self.number_qubits - 1
+        return [1 << (top - position) for position in
+                self.positions_of(ket).tolist()]
+
+    # Decompositions of the non-basis kets in increasing order, read from the
+    # index one block at a time.  Blocks double in size from FIRST_BLOCK_SIZE
+    # to BLOCK_SIZE kets, and each block is mapped to basis kets at once.
+    # inputs:
+    #   - (optional) basis_kets = sequence of basis kets indexed by position,
+    #       e.g. Entangled.basis_kets, None for the positions themselves
+    #   - (optional) start, stop = range of positions of non-basis kets, see
+    #       non_basis_position()
+    # output:
+    #   - generator of lists of basis kets (or positions), one per non-basis
+    #       ket
+    def iter_decompositions(self, basis_kets=None, start=0, stop=None):
+        stop = len(self) if stop is None else stop
+        block_start, block_size = start, FIRST_BLOCK_SIZE
+        while block_start < stop:
+            block_stop = min(block_start + block_size, stop)
+            offsets = self.offsets[block_start:block_stop + 1]
+            offsets = (offsets - offsets[0]).tolist()
+            positions = self.positions[
+                self.offsets[block_start]:self.offsets[block_stop]
+                ].tolist()
+            if basis_kets is not None:
+                positions = [basis_kets[position] for position in positions]
+            for row in range(block_stop - block_start):
+                yield positions[offsets[row]:offsets[row + 1]]
+            block_start = block_stop
+            block_size = min(2*block_size, BLOCK_SIZE)
+
+
+# Index of n qubits, memory-mapped from a directory, or built and saved there
+# first if it is missing
+# inputs:
+#   - number_qubits
+#   - (optional) directory = directory of saved indexes, None to build the
+#       index in memory without saving it
+# output:
+#   - DecompositionIndex
+def shared_index(number_qubits: int, directory=None):
+    if directory is None:
+        return DecompositionIndex.build(number_qubits)
+    try:
+        return DecompositionIndex.load(directory, number_qubits)
+    except (OSError, ValueError):
+        pass
+    DecompositionIndex.build(number_qubits).save(directory)
+    return DecompositionIndex.load(directory, number_qubits)
@@ -0,0 +1,601 @@
+"""
+NumPy engine for the Entanglement Criteria.
+
+The functions in this module work with statevectors stored as complex NumPy
+arrays of length 2**n instead of Qiskit Statevector Dictionaries.  The index of
+an amplitude is the decimal value of its ket, e.g. the amplitude of |0110> is
+stored at index 6.  This is the 'decimal index' representation described in
+entangled.py:
+    - basis kets are the indices 2**0, 2**1, ..., 2**(n-1)
+    - non-basis kets are all other indices except 0 (the zero ket)
+    - the basis kets of a non-basis ket are the set bits of its index
+
+Rather than looking up each non-basis ket and its basis kets one at a time, the
+target amplitudes and equality checks of all kets are computed with whole-array
+operations.  The products are accumulated in the same order as
+Entangled.__basis_amplitude_product(), from the leftmost bit of a ket to the
+rightmost.  Target amplitudes can still differ from the 'dict' engine in the
+last bit, since NumPy's array loops may round complex products differently from
+Python scalars.
+
+See (Entanglement Criteria module)
+"""
+
+import os
+
+import numpy as np
+
+# default number of kets evaluated at a time by iter_criteria()
+BLOCK_SIZE = 2**16
+
+# ways to choose the ket that maps to the zero ket in a basis change, without
+# user input (see choose_source_index())
+SOURCE_POLICIES = ('first', 'largest', 'random')
+
+
+# Convert a statevector to an array of amplitudes indexed by ket
+# Dictionary keys may be bitstrings or decimal ket values.  Kets missing from a
+# statevector dictionary have amplitude 0, e.g. a Qiskit Statevector
+# Dictionary omits all kets with zero amplitude.  A path is opened with
+# load_statevector(), and memory-mapped complex128 arrays are returned as they
+# are, so they are never loaded into memory as a whole.
+# inputs:
+#   - statevector = statevector dictionary, array-like of amplitudes, or path
+#       to a statevector file
+#   - number_qubits = length of the kets in the statevector
+# output:
+#   - complex array of length 2**number_qubits
+def statevector_array(statevector, number_qubits: int) -> np.ndarray:
+    if isinstance(statevector, (str, os.PathLike)):
+        statevector = load_statevector(statevector, number_qubits)
+
+    if isinstance(statevector, dict):
+        amplitudes = np.zeros(2**number_qubits, dtype=complex)
+        indices = np.fromiter(
+            (key if isinstance(key, (int, np.integer)) else int(key, 2)
+             for key in statevector.keys()),
+            dtype=np.int64,
+            count=len(statevector)
+            )
+        amplitudes[indices] = np.fromiter(
+            statevector.values(), dtype=complex, count=len(statevector)
+            )
+    elif isinstance(statevector, np.memmap) and statevector.dtype == complex:
+        amplitudes = statevector
+    else:
+        amplitudes = np.asarray(statevector, dtype=complex)
+
+    if amplitudes.shape != (2**number_qubits,):
+        raise ValueError(
+            f"statevector must have {2**number_qubits} amplitudes for "
+            f"{number_qubits} qubits, got shape {amplitudes.shape}"
+            )
+    return amplitudes
+
+
+# Open a statevector file as a read-only memory-mapped array
+# Amplitudes are only read from disk when they are used, so statevectors larger
+# than memory can be checked one block at a time (see iter_range_criteria())
+# inputs:
+#   - path = a .npy file of complex128 amplitudes, or a raw file of complex128
+#       amplitudes in ket order (any other extension)
+#   - (optional) number_qubits = expected number of qubits
+# output:
+#   - read-only np.memmap of complex amplitudes indexed by ket
+def load_statevector(path, number_qubits=None) -> np.memmap:
+    if os.fspath(path).endswith('.npy'):
+        amplitudes = np.load(path, mmap_mode='r')
+    else:
+        amplitudes = np.memmap(path, dtype=complex, mode='r')
+
+    if amplitudes.dtype != complex or amplitudes.ndim != 1:
+        raise ValueError(
+            f"{os.fspath(path)} must hold a 1-D array of complex128 "
+            f"amplitudes, got {amplitudes.dtype} with shape {amplitudes.shape}"
+            )
+    size = len(amplitudes)
+    if size & (size - 1) or (
+        number_qubits is not None and size != 2**number_qubits
+        ):
+        raise ValueError(
+            f"{os.fspath(path)} holds {size} amplitudes, which is not 2**n"
+            + (f" for n = {number_qubits}" if number_qubits is not None
+               else "")
+            )
+    return amplitudes
+
+
+# Find the first ket with a nonzero amplitude, one block at a time
+# inputs:
+#   - amplitudes = complex array of length 2**n
+#   - (optional) block_size = number of kets per block
+# output:
+#   - index of the first nonzero amplitude
+def first_nonzero_index(amplitudes, block_size=BLOCK_SIZE) -> int:
+    for start in range(0, len(amplitudes), block_size):
+        nonzero = np.flatnonzero(amplitudes[start:start + block_size])
+        if len(nonzero):
+            return start + int(nonzero[0])
+    raise ValueError("statevector has no nonzero amplitudes")
+
+
+# Get array of basis ket indices, ordered as Entangled.basis_kets
+# input:
+#   - number_qubits
+# output:
+#   - array of powers of two from 2**(n-1) down to 2**0
+def basis_indices(number_qubits: int) -> np.ndarray:
+    return np.array(
+        [1 << (number_qubits - 1 - i) for i in range(number_qubits)],
+        dtype=np.int64
+        )
+
+
+# Get boolean mask of non-basis kets
+# A ket index k is a non-basis ket if it has at least two set bits, i.e.
+# clearing its lowest set bit, k & (k - 1), leaves a nonzero value
+# inputs:
+#   - number_qubits
+#   - (optional) start, stop = range of kets, defaults to all kets
+# output:
+#   - boolean array of length stop - start, True at non-basis kets
+def non_basis_mask(number_qubits: int, start=0, stop=None) -> np.ndarray:
+    if stop is None:
+        stop = 2**number_qubits
+    indices = np.arange(start, stop)
+    return (indices & (indices - 1)) != 0
+
+
+# Get array of non-basis ket indices in increasing order
+# input:
+#   - number_qubits
+# output:
+#   - array of all indices with at least two set bits
+def non_basis_indices(number_qubits: int) -> np.ndarray:
+    return np.flatnonzero(non_basis_mask(number_qubits))
+
+
+# Compute the target amplitude of every ket
+# The target amplitude of a ket is the product of the amplitudes of its basis
+# kets, e.g. targets[0b1101] = psi[0b1000]*psi[0b0100]*psi[0b0001].
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+# output:
+#   - complex array of target amplitudes, indexed by ket
+def target_amplitudes(amplitudes, number_qubits: int) -> np.ndarray:
+    basis_amplitudes = amplitudes[basis_indices(number_qubits)]
+    return block_target_amplitudes(basis_amplitudes, 0, 2**number_qubits)
+
+
+# Compute the target amplitudes of a block of consecutive kets
+# Only the n basis ket amplitudes are needed, so a block can be computed
+# without the rest of the statevector.  The block is split into aligned blocks
+# whose size is a power of two (a single block when start is a multiple of the
+# block size), see aligned_target_amplitudes().
+# inputs:
+#   - basis_amplitudes = amplitudes of the basis kets, ordered as
+#       basis_indices(), with shape (n,) or (batch, n) for many statevectors
+#   - start, stop = range of kets in the block
+# output:
+#   - complex array of target amplitudes of kets start to stop - 1, with shape
+#       (stop - start,) or (batch, stop - start)
+def block_target_amplitudes(basis_amplitudes, start: int, stop: int
+                            ) -> np.ndarray:
+    basis_amplitudes = np.asarray(basis_amplitudes, dtype=complex)
+    number_qubits = basis_amplitudes.shape[-1]
+    targets = np.empty(
+        basis_amplitudes.shape[:-1] + (stop - start,), dtype=complex
+        )
+
+    position = start
+    while position < stop:
+        # largest power of two that divides position and fits before stop
+        size = position & -position or 1 << number_qubits
+        while position + size > stop:
+            size >>= 1
+        targets[..., position - start:position - start + size] = (
+            aligned_target_amplitudes(basis_amplitudes, position, size)
+            )
+        position += size
+    return targets
+
+
+# Compute the target amplitudes of an aligned block of kets by dynamic
+# programming
+# The target amplitude of a ket is the target amplitude of the same ket with
+# its lowest set bit cleared, times the amplitude of the basis ket for that
+# bit.  The block is filled from its first ket, one bit at a time from the
+# highest bit below the block size, so every target is built from an earlier
+# target with a single multiplication: 2**c - 1 multiplications for a block of
+# size 2**c, instead of one per set bit of every ket.  Products are still
+# accumulated from the leftmost bit of a ket to the rightmost.
+# inputs:
+#   - basis_amplitudes = amplitudes of the basis kets, ordered as
+#       basis_indices(), with shape (n,) or (batch, n) for many statevectors
+#   - start = first ket in the block, a multiple of size
+#   - size = number of kets in the block, a power of two
+# output:
+#   - complex array of target amplitudes of kets start to start + size - 1,
+#       with shape (size,) or (batch, size)
+def aligned_target_amplitudes(basis_amplitudes, start: int, size: int
+                              ) -> np.ndarray:
+    batch_shape = basis_amplitudes.shape[:-1]
+    number_qubits = basis_amplitudes.shape[-1]
+    block_bits = size.bit_length() - 1
+
+    # the first ket in the block only has bits above the block size.  Its
+    # product uses array operations (of length 1) so it is rounded exactly as
+    # the rest of the block
+    targets = np.empty(batch_shape + (size,), dtype=complex)
+    targets[..., :1] = 1
+    for index in range(number_qubits - block_bits):
+        if start >> (number_qubits - 1 - index) & 1:
+            targets[..., :1] = (
+                targets[..., :1]*basis_amplitudes[..., index:index + 1]
+                )
+
+    # set each bit in every ket filled so far, from the highest bit
+    for bit in reversed(range(block_bits)):
+        kets = targets.reshape(batch_shape + (-1, 2 << bit))
+        kets[..., 1 << bit] = (
+            kets[..., 0]
+            * basis_amplitudes[..., number_qubits - 1 - bit, np.newaxis]
+            )
+    return targets
+
+
+# Check equality of every ket amplitude with its target amplitude
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - targets = complex array of target amplitudes
+# output:
+#   - boolean array, True where the amplitude equals the target amplitude
+def equality_flags(amplitudes, targets) -> np.ndarray:
+    return amplitudes == targets
+
+
+# Choose the ket that maps to the zero ket in a basis change
+# The statevector is read one block at a time, so memory-mapped statevectors
+# are never loaded as a whole.  The chosen ket always has a nonzero amplitude:
+#   - 'first' = the first ket with a nonzero amplitude
+#   - 'largest' = the first ket with the largest amplitude magnitude
+#   - 'random' = a uniformly random ket with a nonzero amplitude
+# inputs:
+#   - amplitudes = complex array of length 2**n
+#   - (optional) policy = one of SOURCE_POLICIES
+#   - (optional) rng = numpy.random.Generator for the 'random' policy
+#   - (optional) block_size = number of kets per block
+# output:
+#   - index of the chosen ket
+def choose_source_index(amplitudes, policy='first', rng=None,
+                        block_size=BLOCK_SIZE) -> int:
+    if policy == 'first':
+        return first_nonzero_index(amplitudes, block_size)
+
+    if policy == 'largest':
+        largest, source_index = 0, None
+        for start in range(0, len(amplitudes), block_size):
+            magnitudes = np.abs(amplitudes[start:start + block_size])
+            index = int(np.argmax(magnitudes))
+            if magnitudes[index] > largest:
+                largest, source_index = magnitudes[index], start + index
+        if source_index is None:
+            raise ValueError("statevector has no nonzero amplitudes")
+        return source_index
+
+    if policy == 'random':
+        if rng is None:
+            rng = np.random.default_rng()
+        # count nonzero amplitudes per block, then pick one of them
+        counts = [
+            np.count_nonzero(amplitudes[start:start + block_size])
+            for start in range(0, len(amplitudes), block_size)
+            ]
+        if sum(counts) == 0:
+            raise ValueError("statevector has no nonzero amplitudes")
+        choice = int(rng.integers(sum(counts)))
+        for block, count in enumerate(counts):
+            if choice < count:
+                start = block*block_size
+                nonzero = np.flatnonzero(amplitudes[start:start + block_size])
+                return start + int(nonzero[choice])
+            choice -= count
+
+    raise ValueError(
+        f"policy must be one of {SOURCE_POLICIES}, got {policy!r}"
+        )
+
+
+# Basis change: permute amplitudes so that source_index maps to the zero ket
+# The new amplitude of ket k is the old amplitude of ket k XOR source_index
+# inputs:
+#   - amplitudes = complex array of length 2**n
+#   - source_index = index of the ket that maps to the zero ket
+# output:
+#   - permuted complex array
+def basis_change(amplitudes, source_index: int) -> np.ndarray:
+    indices = np.arange(len(amplitudes))
+    return amplitudes[indices ^ source_index]
+
+
+# Normalize zero ket to have amplitude = 1
+# input:
+#   - amplitudes = complex array with nonzero zero ket amplitude
+# output:
+#   - complex array scaled so that the zero ket has amplitude 1
+def normalize(amplitudes) -> np.ndarray:
+    return amplitudes/amplitudes[0]
+
+
+# Entanglement Criteria over an array of amplitudes
+# The zero ket must already have a nonzero amplitude (see basis_change())
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+# output:
+#   - targets = complex array of target amplitudes, indexed by ket
+#   - equality = boolean array of equality checks, indexed by ket.  Only the
+#       entries at non-basis kets are part of the criteria
+def criteria(amplitudes, number_qubits: int) -> tuple:
+    if amplitudes[0] != 1:
+        amplitudes = normalize(amplitudes)
+
+    targets = target_amplitudes(amplitudes, number_qubits)
+    equality = equality_flags(amplitudes, targets)
+    return targets, equality
+
+
+# Entanglement Criteria over an array of amplitudes, one block at a time
+# Blocks are normalized and checked lazily, so a caller can stop as soon as a
+# block contains a failed check.  The zero ket must already have a nonzero
+# amplitude (see basis_change())
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - (optional) block_size = number of kets per block
+# output:
+#   - generator of (start, targets, equality) for each block of kets, where
+#       start is the index of the first ket in the block
+def iter_criteria(amplitudes, number_qubits: int, block_size=BLOCK_SIZE):
+    return iter_range_criteria(
+        amplitudes, number_qubits, block_size=block_size
+        )
+
+
+# Entanglement Criteria over a range of kets, one block at a time
+# Only the kets in the range, the basis kets and the zero ket are read, so
+# separate ranges of one statevector can be checked independently.  A basis
+# change is applied while reading: ket k is checked with the amplitude of
+# ket k XOR source_index, which must have a nonzero amplitude.  Blocks are
+# aligned to multiples of block_size.
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - (optional) start, stop = range of kets, defaults to all kets
+#   - (optional) source_index = ket that maps to the zero ket, 0 for no basis
+#       change
+#   - (optional) block_size = number of kets per block, a power of two
+# output:
+#   - generator of (start, targets, equality) for each block of kets, where
+#       start is the index of the first ket in the block
+def iter_range_criteria(amplitudes, number_qubits: int, start=0, stop=None,
+                        source_index=0, block_size=BLOCK_SIZE):
+    if stop is None:
+        stop = 2**number_qubits
+
+    zero_ket_amplitude = amplitudes[source_index]
+    basis_amplitudes = amplitudes[basis_indices(number_qubits) ^ source_index]
+    if zero_ket_amplitude != 1:
+        basis_amplitudes = basis_amplitudes/zero_ket_amplitude
+
+    block_start = start
+    while block_start < stop:
+        block_stop = min((block_start//block_size + 1)*block_size, stop)
+        if source_index:
+            block = amplitudes[
+                np.arange(block_start, block_stop) ^ source_index
+                ]
+        else:
+            block = np.asarray(amplitudes[block_start:block_stop])
+        if zero_ket_amplitude != 1:
+            block = block/zero_ket_amplitude
+
+        targets = block_target_amplitudes(
+            basis_amplitudes, block_start, block_stop
+            )
+        yield block_start, targets, equality_flags(block, targets)
+        block_start = block_stop
+
+
+# Find the first non-basis ket that fails the equality check
+# Stops at the first block containing a failed check
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - (optional) block_size = number of kets per block
+#   - (optional) start, stop, source_index = see iter_range_criteria()
+#   - (optional) should_stop = function with no arguments, called before each
+#       block; checking ends early (returning None) when it returns True
+# output:
+#   - index of the first failing non-basis ket, or None if all kets pass
+def first_violation(amplitudes, number_qubits: int, block_size=BLOCK_SIZE,
+                    start=0, stop=None, source_index=0, should_stop=None):
+    for block_start, targets, equality in iter_range_criteria(
+        amplitudes, number_qubits, start, stop, source_index, block_size
+        ):
+        failed = ~equality & non_basis_mask(
+            number_qubits, block_start, block_start + len(equality)
+            )
+        if failed.any():
+            return block_start + int(np.argmax(failed))
+        if should_stop is not None and should_stop():
+            return None
+    return None
+
+
+# Entanglement verdict from an array of equality checks
+# input:
+#   - equality = boolean array of equality checks, indexed by ket
+# output:
+#   - True if any non-basis ket fails the equality check
+def is_entangled(equality) -> bool:
+    number_qubits = len(equality).bit_length() - 1
+    return not equality[non_basis_mask(number_qubits)].all()
+
+
+# Convert many statevectors to a 2-D array of amplitudes
+# inputs:
+#   - statevectors = 2-D array-like of shape (batch, 2**number_qubits), or an
+#       iterable of statevector dictionaries or arrays
+#   - number_qubits
+# output:
+#   - complex array of shape (batch, 2**number_qubits), one row per statevector
+def statevector_batch(statevectors, number_qubits: int) -> np.ndarray:
+    if isinstance(statevectors, np.ndarray):
+        amplitudes = np.asarray(statevectors, dtype=complex)
+    else:
+        rows = [
+            statevector_array(statevector, number_qubits)
+            for statevector in statevectors
+            ]
+        if rows:
+            amplitudes = np.stack(rows)
+        else:
+            amplitudes = np.empty((0, 2**number_qubits), dtype=complex)
+
+    if amplitudes.ndim != 2 or amplitudes.shape[1] != 2**number_qubits:
+        raise ValueError(
+            f"statevectors must have shape (batch, {2**number_qubits}) for "
+            f"{number_qubits} qubits, got shape {amplitudes.shape}"
+            )
+    return amplitudes
+
+
+# Get the first ket with a nonzero amplitude in each statevector
+# input:
+#   - amplitudes = complex array of shape (..., 2**n)
+# output:
+#   - integer array of ket indices, one per statevector
+def first_nonzero(amplitudes) -> np.ndarray:
+    nonzero = amplitudes != 0
+    if not nonzero.any(axis=-1).all():
+        raise ValueError("statevector has no nonzero amplitudes")
+    return np.argmax(nonzero, axis=-1)
+
+
+# Choose the ket that maps to the zero ket for many statevectors, see
+# choose_source_index()
+# inputs:
+#   - amplitudes = complex array of shape (batch, 2**n)
+#   - (optional) policy = one of SOURCE_POLICIES
+#   - (optional) rng = numpy.random.Generator for the 'random' policy
+# output:
+#   - integer array of ket indices, one per statevector
+def batch_source_indices(amplitudes, policy='first', rng=None) -> np.ndarray:
+    if policy == 'first':
+        return first_nonzero(amplitudes)
+
+    nonzero = amplitudes != 0
+    if not nonzero.any(axis=-1).all():
+        raise ValueError("statevector has no nonzero amplitudes")
+
+    if policy == 'largest':
+        return np.argmax(np.abs(amplitudes), axis=-1)
+    if policy == 'random':
+        if rng is None:
+            rng = np.random.default_rng()
+        # the largest of uniform random weights is a uniform choice
+        return np.argmax(rng.random(amplitudes.shape)*nonzero, axis=-1)
+
+    raise ValueError(
+        f"policy must be one of {SOURCE_POLICIES}, got {policy!r}"
+        )
+
+
+# Basis change for many statevectors, see basis_change()
+# inputs:
+#   - amplitudes = complex array of shape (batch, 2**n)
+#   - source_indices = index of the ket that maps to the zero ket, one per row
+# output:
+#   - complex array of shape (batch, 2**n) with each row permuted
+def batch_basis_change(amplitudes, source_indices) -> np.ndarray:
+    indices = np.arange(amplitudes.shape[1])
+    return np.take_along_axis(
+        amplitudes,
+        indices ^ np.asarray(source_indices)[:, np.newaxis],
+        axis=1
+        )
+
+
+# Failed checks of one block of kets of some statevectors of a batch
+# Shared by batch_criteria() and monte_carlo.count_failing_kets(), so both
+# apply the same normalization and equality checks.
+# inputs:
+#   - amplitudes = complex array of shape (batch, 2**number_qubits)
+#   - rows = statevectors to check, an index array or a slice
+#   - zero_ket_amplitudes = column of their zero ket amplitudes
+#   - basis_amplitudes = their basis ket amplitudes divided by their zero ket
+#       amplitudes
+#   - number_qubits
+#   - start, stop = range of kets
+# output:
+#   - boolean array of shape (rows, stop - start), True where a non-basis ket
+#       fails the check
+def batch_block_failures(amplitudes, rows, zero_ket_amplitudes,
+                         basis_amplitudes, number_qubits: int, start: int,
+                         stop: int) -> np.ndarray:
+    block = amplitudes[rows, start:stop]/zero_ket_amplitudes
+    targets = block_target_amplitudes(basis_amplitudes, start, stop)
+    return ~equality_flags(block, targets) & non_basis_mask(
+        number_qubits, start, stop
+        )
+
+
+# Entanglement Criteria for many statevectors at once
+# Each statevector is normalized on the fly and checked one block of kets at a
+# time.  Statevectors stop being checked once a non-basis ket fails, and
+# statevectors are processed in groups so each block holds about block_size
+# amplitudes.  The zero ket of every statevector must already have a nonzero
+# amplitude (see batch_basis_change())
+# inputs:
+#   - amplitudes = complex array of shape (batch, 2**number_qubits)
+#   - number_qubits
+#   - (optional) block_size = number of amplitudes per block
+# output:
+#   - integer array with the first failing non-basis ket of each statevector,
+#       or -1 where every check passes (the state is not Entangled)
+def batch_criteria(amplitudes, number_qubits: int, block_size=BLOCK_SIZE
+                   ) -> np.ndarray:
+    batch = len(amplitudes)
+    witnesses = np.full(batch, -1, dtype=np.int64)
+
+    ket_block = min(block_size, 2**number_qubits)
+    row_block = max(1, block_size // ket_block)
+    basis = basis_indices(number_qubits)
+
+    for row_start in range(0, batch, row_block):
+        rows = np.arange(row_start, min(row_start + row_block, batch))
+        zero_ket_amplitudes = amplitudes[rows, :1]
+        basis_amplitudes = (
+            amplitudes[rows[:, np.newaxis], basis]/zero_ket_amplitudes
+            )
+
+        for start in range(0, 2**number_qubits, ket_block):
+            stop = min(start + ket_block, 2**number_qubits)
+            failed = batch_block_failures(
+                amplitudes, rows, zero_ket_amplitudes, basis_amplitudes,
+                number_qubits, start, stop
+                )
+
+            # record witnesses and drop statevectors that are decided
+            found = failed.any(axis=1)
+            witnesses[rows[found]] = start + np.argmax(failed[found], axis=1)
+            undecided = ~found
+            rows = rows[undecided]
+            if len(rows) == 0:
+                break
+            zero_ket_amplitudes = zero_ket_amplitudes[undecided]
+            basis_amplitudes = basis_amplitudes[undecided]
+
+    return witnesses
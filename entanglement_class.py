@@ -1,55 +1,73 @@
 """
 First version Entangled, the entanglement criteria as a class.
 
-An object of class Entangled initializes with the following attributes:
+An object of class Entangled has the following attributes:
 1. 'number_qubits', given by user input upon instantiation
 2. 'statevector', a Qiskit Statevector Dictionary of size 2**number_qubits, 
 	populated with np.ones() (np.zeros() will give an empty vector of length 0)
-3. 'kets', a list of all bitstrings of length 'number_qubits', derived from
-	statevector.keys(); list() is necessary because statevector.keys() is not
-	indexable per the error:
-		'TypeError: 'dict_keys' object is not subscriptable'
-4. 'basis_kets', a list of all basis kets of length 'number_qubits'
-5. 'non_basis_kets', a list of all non-basis kets of length 'number_qubits'
+3. 'kets', a tuple of all bitstrings of length 'number_qubits', in the same
+	order as statevector.keys()
+4. 'basis_kets', a tuple of all basis kets of length 'number_qubits'
+5. 'non_basis_kets', a tuple of all non-basis kets of length 'number_qubits'
 6. 'decomp_dict', a dictionary of all non-basis kets as keys and their basis ket
 	decompositions as values
 		- this attribute name will likely change
 
 Attributres 1 - 5 are meant to be static and global to the class.  Attribute 6
 is meant to be local to a user statevector.
-		
+
+Only 'number_qubits' is set when an object is created.  Attributes 2 - 6 each
+hold 2**number_qubits entries, so they are computed the first time they are
+accessed.  Attributes 3 - 6 are read-only (tuples, read-only arrays and
+dictionaries) and are cached once per process for each 'number_qubits', then
+shared by every object (see Entangled.structure_cache).
+
+The decompositions read by the 'dict' engine, iter_entangled(),
+check_single_ket() and 'decomp_dict' come from 'decomposition_index', a
+compact array index of the basis kets of every non-basis ket (see
+decomposition_index module).  Set Entangled.index_directory to a directory to
+write each index to disk once and memory-map it in every process that uses
+it:
+>>> entang.Entangled.index_directory = 'indexes'
+>>> entang.Entangled(20).decomposition_index
+<decomposition_index.DecompositionIndex object at 0x1031c2e90>
+
 Example:
 >>> import entanglement_class as entang
 >>> x = entang.Entangled(4)
 >>> x
 <entanglement_class.Entangled object at 0x102a9f190>
 >>> x.kets
-['0000', '0001', '0010', '0011', '0100', '0101', '0110', '0111', '1000', '1001',
-'1010', '1011', '1100', '1101', '1110', '1111']
+('0000', '0001', '0010', '0011', '0100', '0101', '0110', '0111', '1000', '1001',
+'1010', '1011', '1100', '1101', '1110', '1111')
 >>> x.statevector
 {'0000': (1+0j), '0001': (1+0j), '0010': (1+0j), '0011': (1+0j), '0100': (1+0j),
  '0101': (1+0j), '0110': (1+0j), '0111': (1+0j), '1000': (1+0j), '1001': (1+0j),
  '1010': (1+0j), '1011': (1+0j), '1100': (1+0j), '1101': (1+0j), '1110': (1+0j),
  '1111': (1+0j)}
 >>> x.basis_kets
-['1000', '0100', '0010', '0001']
+('1000', '0100', '0010', '0001')
 >>> x.non_basis_kets
-['0011', '0101', '0110', '0111', '1001', '1010', '1011', '1100', '1101', '1110',
- '1111']
+('0011', '0101', '0110', '0111', '1001', '1010', '1011', '1100', '1101', '1110',
+ '1111')
 >>> x.decomp_dict
-{'0011': {'basis_kets': ['0010', '0001']}, 
- '0101': {'basis_kets': ['0100', '0001']}, 
- '0110': {'basis_kets': ['0100', '0010']}, 
- '0111': {'basis_kets': ['0100', '0010', '0001']}, 
- '1001': {'basis_kets': ['1000', '0001']}, 
- '1010': {'basis_kets': ['1000', '0010']}, 
- '1011': {'basis_kets': ['1000', '0010', '0001']}, 
- '1100': {'basis_kets': ['1000', '0100']}, 
- '1101': {'basis_kets': ['1000', '0100', '0001']}, 
- '1110': {'basis_kets': ['1000', '0100', '0010']}, 
- '1111': {'basis_kets': ['1000', '0100', '0010', '0001']}}
-
->>> x.entangled(x.statevector)
+mappingproxy({'0011': mappingproxy({'basis_kets': ('0010', '0001')}), 
+ '0101': mappingproxy({'basis_kets': ('0100', '0001')}), 
+ '0110': mappingproxy({'basis_kets': ('0100', '0010')}), 
+ '0111': mappingproxy({'basis_kets': ('0100', '0010', '0001')}), 
+ '1001': mappingproxy({'basis_kets': ('1000', '0001')}), 
+ '1010': mappingproxy({'basis_kets': ('1000', '0010')}), 
+ '1011': mappingproxy({'basis_kets': ('1000', '0010', '0001')}), 
+ '1100': mappingproxy({'basis_kets': ('1000', '0100')}), 
+ '1101': mappingproxy({'basis_kets': ('1000', '0100', '0001')}), 
+ '1110': mappingproxy({'basis_kets': ('1000', '0100', '0010')}), 
+ '1111': mappingproxy({'basis_kets': ('1000', '0100', '0010', '0001')})})
+>>> x.decomp_dict['0011']['basis_kets'] = []
+Traceback (most recent call last):
+...
+TypeError: 'mappingproxy' object does not support item assignment
+
+>>> x.entangled(x.statevector).to_dict()
 |Psi> is not Entangled
 {'0011': {
 	'basis_kets': ['0010', '0001'], 
@@ -132,7 +150,7 @@ Enter an amplitude for 1111: 8
  '1010': (3+0j), '1011': (7+0j), '1100': (1+0j), '1101': (3+0j), '1110': (9+0j),
  '1111': (8+0j)}
 
->>> x.entangled(my_statevector)
+>>> x.entangled(my_statevector).to_dict()
 |Psi> is Entangled
 {'0011': {
 	'basis_kets': ['0010', '0001'], 
@@ -221,7 +239,7 @@ to the zero ket, or press Enter to choose a random ket):
 Random Choice: 0110
 |Psi> is Entangled
 
->>> entang.pprint.pprint(result)
+>>> entang.pprint.pprint(result.to_dict())
 {'0011': {'basis_kets': ['0010', '0001'],
           'equality': False,
           'target_amplitude': 0.0},
@@ -274,59 +292,371 @@ Random Choice: 0110
  '1101': '1011',
  '1110': '1000',
  '1111': '1001'}
+
+An optional 'engine' selects how entangled() applies the criteria:
+- 'dict' (default) checks one non-basis ket at a time in the statevector
+	dictionary
+- 'numpy' converts the statevector to a complex array of length
+	2**number_qubits and checks all kets with whole-array operations (see the
+	entanglement_array module).  The statevector may be a dictionary or an
+	array of amplitudes indexed by ket.
+- 'sparse' only reads the kets with nonzero amplitudes, given as a dictionary
+	or a tuple (indices, values), and decides the criteria in time
+	proportional to their number, basis change included (see the
+	entanglement_sparse module).  Nothing of length 2**number_qubits is
+	built, so states of up to 63 qubits can be checked, and entangled()
+	returns a SparseEntanglementResult that computes ket results on lookup.
+All engines return the same dictionary and verdict:
+>>> y = entang.Entangled(4, engine='numpy')
+>>> result = y.entangled(my_statevector)
+|Psi> is Entangled
+>>> z = entang.Entangled(40, engine='sparse', source_policy='first')
+>>> z.is_entangled({'0'*40: 1, '1'*40: 1})
+(True, '1111111111111111111111111111111111111111')
+>>> z.is_entangled(([0, 1, 2, 3], [1, 0.5, 2, 1]))
+(False, None)
+
+is_entangled() stops at the first non-basis ket that fails the check and
+returns the verdict with that ket as a witness, without printing:
+>>> x.is_entangled(my_statevector)
+(True, '0011')
+>>> x.is_entangled(x.statevector)
+(False, None)
+
+entangled_batch() checks many statevectors at once and returns one verdict per
+statevector, optionally with witnesses:
+>>> x.entangled_batch([my_statevector, x.statevector], witnesses=True)
+(array([ True, False]), ['0011', None])
+
+iter_entangled() yields the results of entangled() one ket at a time:
+>>> next(x.iter_entangled(my_statevector))
+('0011', {'basis_kets': ['0010', '0001'], 'target_amplitude': (0.375+0j), 
+'equality': False})
+
+An optional 'ket_format' selects how kets are represented:
+- 'str' (default) uses bitstrings such as '0110', and statevectors are Qiskit
+	Statevector Dictionaries
+- 'int' uses the decimal value of each ket, e.g. 6 for '0110'.  Statevectors are
+	complex arrays of length 2**number_qubits indexed by ket, 'kets',
+	'basis_kets' and 'non_basis_kets' are integer arrays, basis kets are bit
+	masks and decompositions and basis changes use bit operations.  Bitstrings
+	are only produced for printing, see ket_string().
+>>> z = entang.Entangled(4, ket_format='int')
+>>> z.basis_kets
+array([8, 4, 2, 1])
+>>> z.non_basis_kets
+array([ 3,  5,  6,  7,  9, 10, 11, 12, 13, 14, 15])
+>>> z.decomp_dict[13]['basis_kets']
+(8, 4, 1)
+>>> z.is_entangled(z.statevector)
+(False, None)
+
+An optional 'source_policy' selects the ket that maps to the zero ket when the
+zero ket amplitude is 0:
+- 'interactive' (default) asks the user with get_source_ket()
+- 'first' uses the first ket with a nonzero amplitude
+- 'largest' uses the ket with the largest amplitude magnitude
+- 'random' uses a random ket with a nonzero amplitude, drawn from a generator
+	seeded with the optional 'seed'
+The other policies never block on input(), so they can be used in batch jobs:
+>>> w = entang.Entangled(4, source_policy='largest')
+>>> w.is_entangled(y)
+(True, '0011')
+
+entangled() returns an EntanglementResult (see entanglement_result module), a
+read-only mapping with the same keys and values as the dictionaries above.  It
+stores the target amplitudes in an array and the equality checks as bits, and
+derives basis ket decompositions from the ket when they are read:
+>>> result = x.entangled(my_statevector)
+|Psi> is Entangled
+>>> result.entangled, result.witness
+(True, '0011')
+>>> result['1111']['target_amplitude']
+(1.40625+0j)
+
+An optional 'instrumentation' (see instrumentation module) times the phases of
+entangled(), is_entangled() and entangled_batch() (basis change, normalize,
+criteria, ...) and counts kets checked, kets failed and basis changes.  Each
+call is also sent to the subscribers of the Instrumentation object:
+>>> import instrumentation
+>>> metrics = instrumentation.Instrumentation(subscribers=[print])
+>>> v = entang.Entangled(4, source_policy='first', instrumentation=metrics)
+>>> result = v.entangled(y)
+|Psi> is Entangled
+{'method': 'entangled', 'number_qubits': 4, 'engine': 'dict', ...}
+>>> metrics.snapshot()['counters']
+{'statevectors': 1, 'kets_checked': 11, 'kets_failed': 7, 'basis_changes': 1}
+
+separable() checks whether a state factors across a cut A|B of its qubits,
+where qubit i is bit 2**i of a ket (qubit 0 is the rightmost character), and
+separable_cuts() checks many cuts at once (see bipartite module):
+>>> bell_pair = {'000': 1, '001': 1, '110': 1, '111': 1}
+>>> x3 = entang.Entangled(3)
+>>> x3.separable(bell_pair, [0])
+True
+>>> x3.separable_cuts(bell_pair)
+{(0,): True, (1,): False, (0, 1): False}
+
+clusters() finds the finest partition of the qubits into mutually
+unentangled clusters, without testing every cut:
+>>> x3.clusters(bell_pair)
+[(0,), (1, 2)]
+
+An optional 'result_cache' (see result_cache module) returns the cached result
+when entangled() checks a state it has seen before with the same settings.  A
+cache can be shared by many objects, and only the 'first' and 'largest'
+source policies are cached:
+>>> import result_cache
+>>> cache = result_cache.ResultCache()
+>>> u = entang.Entangled(4, engine='numpy', source_policy='first',
+...                      result_cache=cache)
+>>> result = u.entangled(my_statevector)
+|Psi> is Entangled
+>>> result = u.entangled(my_statevector)
+|Psi> is Entangled
+>>> cache.stats()['hits']
+1
 		  
 TODO next:
 - review which methods should be private vs public
-- convert kets, basis_kets, and non_basis_kets to tuples so they are immutable
 - rewrite docstrings as restructured text
 - test JSON output (see python json encoding tutorial)
-- create separate class for entangled() method output (e.g. including all the
-above data)
 """
 
 import numpy as np
-from qiskit.quantum_info import Statevector
-from qiskit.quantum_info import random_statevector
+import contextlib
+import functools
 import inspect
+import os
 import pprint
+import tempfile
+import types
+import bipartite
+import entanglement_array
+import entanglement_parallel
+import entanglement_result
+import entanglement_sparse
+import instrumentation
+import result_cache
+import sized_cache
+import create_statevector
+import decomposition_index
+
+# engines available to Entangled.entangled()
+ENGINES = ('dict', 'numpy', 'sparse')
+
+# ket representations available to Entangled
+KET_FORMATS = ('str', 'int')
+
+# ways to choose the source ket of a basis change: 'interactive' asks the user
+# (see get_source_ket()), the others are entanglement_array.SOURCE_POLICIES
+SOURCE_POLICIES = ('interactive',) + entanglement_array.SOURCE_POLICIES
+
+# default memory budget of Entangled.structure_cache, in bytes
+STRUCTURE_CACHE_BYTES = 2**29
 
 class Entangled:
-	def __init__(self, number_qubits) -> None:
+	# 'kets', 'basis_kets', 'non_basis_kets' and 'decomp_dict' only depend on
+	# 'number_qubits' and 'ket_format', so they are created once per process
+	# and shared by all objects.  Least recently used structures are evicted
+	# when the cache grows past its memory budget, which can be changed with
+	# Entangled.structure_cache.resize(max_bytes)
+	structure_cache = sized_cache.SizedLRUCache(STRUCTURE_CACHE_BYTES)
+
+	# directory where decomposition indexes are saved and memory-mapped from,
+	# None to build them in memory in each process
+	index_directory = None
+
+	# directory where entangled() writes the results of statevectors on disk
+	# while they are built, None for the system temporary directory
+	result_directory = None
+
+	def __init__(self, number_qubits, engine='dict', ket_format='str',
+			source_policy='interactive', seed=None, instrumentation=None,
+			result_cache=None) -> None:
+		if engine not in ENGINES:
+			raise ValueError(
+				f"engine must be one of {ENGINES}, got {engine!r}"
+				)
+		if ket_format not in KET_FORMATS:
+			raise ValueError(
+				f"ket_format must be one of {KET_FORMATS}, got {ket_format!r}"
+				)
+		if source_policy not in SOURCE_POLICIES:
+			raise ValueError(
+				f"source_policy must be one of {SOURCE_POLICIES}, "
+				f"got {source_policy!r}"
+				)
+
 		self.number_qubits = number_qubits
+		self.engine = engine
+		self.ket_format = ket_format
+
+		# how to choose the ket that maps to the zero ket in a basis change,
+		# and the random number generator for the 'random' policy
+		self.source_policy = source_policy
+		self.rng = np.random.default_rng(seed)
 
-		# initialize new statevector dictionary
-		self.statevector = self.init_statevector()
+		# optional instrumentation.Instrumentation that times and counts the
+		# work of each call, None to disable
+		self.instrumentation = instrumentation
 
-		# create list of all kets of length 'number_qubits'
-		self.kets = list(self.statevector.keys())
+		# optional result_cache.ResultCache of the results of entangled(),
+		# None to always check
+		self.result_cache = result_cache
 
-		# create list of basis kets of length 'number_qubits'
-		self.basis_kets = self.__powers_of_two(self.number_qubits, self.kets)
+		# zero ket, used to look up its amplitude in a statevector
+		if ket_format == 'int':
+			self.zero_ket = 0
+		else:
+			self.zero_ket = '0'*number_qubits
+
+		# 'statevector', 'kets', 'basis_kets', 'non_basis_kets' and
+		# 'decomp_dict' each hold 2**number_qubits entries, so they are
+		# computed on first access (see the properties below)
+
+	# initialize new statevector dictionary (or array for 'int' kets)
+	@functools.cached_property
+	def statevector(self):
+		return self.init_statevector()
+
+	# tuple of all kets of length 'number_qubits'
+	# ('int' kets: array of indices into the statevector array)
+	@property
+	def kets(self):
+		return self.__shared('kets', self.__build_kets)
+
+	# tuple of basis kets of length 'number_qubits'
+	@property
+	def basis_kets(self):
+		return self.__shared('basis_kets', self.__build_basis_kets)
+
+	# tuple of non-basis kets of length 'number_qubits'
+	@property
+	def non_basis_kets(self):
+		return self.__shared('non_basis_kets', self.__build_non_basis_kets)
+
+	# read-only dictionary of non-basis kets and their basis ket decompositions
+	@property
+	def decomp_dict(self):
+		return self.__shared('decomp_dict', self.__build_decomp_dict)
+
+	# index of the basis ket decompositions of all non-basis kets, shared by
+	# all objects with the same 'number_qubits' (see decomposition_index)
+	@property
+	def decomposition_index(self):
+		cache = type(self).structure_cache
+		key = (self.number_qubits, 'decomposition_index', self.index_directory)
+		index = cache.get(key)
+		if index is None:
+			index = decomposition_index.shared_index(
+				self.number_qubits, self.index_directory
+				)
+			cache.put(key, index, index.nbytes)
+		return index
 
-		# create list of non-basis kets of length 'number_qubits'
-		self.non_basis_kets = self.__non_basis_kets_list(
-			self.basis_kets, self.kets
+	# Get a read-only structure shared by all objects with the same
+	# 'number_qubits' and 'ket_format' from Entangled.structure_cache
+	# inputs:
+	#   - name = attribute name
+	#   - build = method that creates the structure when it is not cached
+	# output:
+	#   - cached structure
+	def __shared(self, name, build):
+		return type(self).structure_cache.get_or_create(
+			(self.number_qubits, self.ket_format, name), build
 			)
 
-		# create dictionary of non-basis kets and their basis ket decompositions
-		self.decomp_dict = self.__non_basis_kets_dict(
-				self.non_basis_kets, self.basis_kets
+	def __build_kets(self):
+		if self.ket_format == 'int':
+			return self.__read_only(np.arange(2**self.number_qubits))
+		return tuple(
+			self.ket_string(index) for index in range(2**self.number_qubits)
 			)
 
+	def __build_basis_kets(self):
+		if self.ket_format == 'int':
+			return self.__read_only(
+				entanglement_array.basis_indices(self.number_qubits)
+				)
+		return tuple(self.__powers_of_two(self.number_qubits))
+
+	def __build_non_basis_kets(self):
+		if self.ket_format == 'int':
+			return self.__read_only(
+				entanglement_array.non_basis_indices(self.number_qubits)
+				)
+		return tuple(self.__non_basis_kets_list(self.basis_kets, self.kets))
+
+	def __build_decomp_dict(self):
+		basis_kets = self.__basis_list()
+		non_basis_kets = self.non_basis_kets
+		if isinstance(non_basis_kets, np.ndarray):
+			# 'int' kets: use Python ints as keys
+			non_basis_kets = non_basis_kets.tolist()
+
+		return types.MappingProxyType({
+			ket: types.MappingProxyType({'basis_kets': tuple(decomposition)})
+			for ket, decomposition in zip(
+				non_basis_kets,
+				self.decomposition_index.iter_decompositions(basis_kets)
+				)
+			})
+
+	# Basis kets as a list, indexed by their position in the decomposition
+	# index
+	def __basis_list(self) -> list:
+		basis_kets = self.basis_kets
+		if isinstance(basis_kets, np.ndarray):
+			return basis_kets.tolist()
+		return list(basis_kets)
+
+	# Make an array read-only before sharing it
+	@staticmethod
+	def __read_only(array):
+		array.flags.writeable = False
+		return array
+
 	# Initialize a nonzero Qiskit Statevector Dictionary
 	# use np.ones() because Statevector(np.zeros()) returns an empty list    
-	def init_statevector(self) -> dict:
-		return Statevector(np.ones(2**self.number_qubits)).to_dict()
+	# With 'int' kets, initialize a complex array of ones instead
+	# input:
+	#   - (optional) backend = 'numpy' to build the dictionary without Qiskit,
+	#       or 'qiskit' (see create_statevector.init_statevector())
+	def init_statevector(self, backend='numpy') -> dict:
+		create_statevector.check_backend(backend)
+		if self.ket_format == 'int':
+			return np.ones(2**self.number_qubits, dtype=complex)
+		if backend == 'qiskit':
+			return create_statevector.init_statevector(
+				self.number_qubits, backend
+				)
+		return dict.fromkeys(self.kets, 1+0j)
+
+	# Convert a ket to its bitstring for printing
+	# input:
+	#   - ket = bitstring or decimal value of a ket
+	# output:
+	#   - bitstring of length 'number_qubits'
+	def ket_string(self, ket) -> str:
+		if isinstance(ket, str):
+			return ket
+		return format(int(ket), '0'+str(self.number_qubits)+'b')
+
+	# Get the ket at an index into the statevector, in the chosen ket format
+	def __ket(self, index):
+		if self.ket_format == 'int':
+			return int(index)
+		return self.ket_string(index)
 	
 	# Get list of powers of two as binary strings
 	# We refer to these values as 'basis-kets'
-	# inputs: 
+	# input: 
 	#   - n = length of bitstrings
-	#   - kets_list = a list of statevector.keys()
 	# output: 
 	#   - list of basis kets of length n powers of two from 2**0 to 2**(n-1)
-	def __powers_of_two(self, n, kets_list) -> list:
-		return [kets_list[2**(n-1-i)] for i in range(n)]
+	def __powers_of_two(self, n) -> list:
+		return [format(1 << (n - 1 - i), '0'+str(n)+'b') for i in range(n)]
 
 	# Get list of non powers of two as binary strings
 	# We refer to these values as 'non-basis kets'
@@ -337,44 +667,28 @@ class Entangled:
 	# output: 
 	#   - list of non-powers of two less than 2**(n-1)
 	def __non_basis_kets_list(self, powers, kets) -> list:
+		powers = set(powers)
 		return [ket for ket in kets[1:] if ket not in powers]
 
-	# Determine basis ket decomposition of a non-basis ket
-	# inputs:    
-	#   - ket = a non-basis ket of length 'n'
-	#   - powers = list of all basis kets of length 'n'
+	# Basis ket decomposition of a ket, read from the decomposition index for
+	# non-basis kets
+	# input:
+	#   - ket = a ket of length 'n'
 	# output:
-	#   - list of basis kets whose binary sum equals the non-basis ket
-	def __get_basis_kets(self, ket, powers) -> list:
-		basis_kets = [
-			powers[index] for index, bit in enumerate(ket) if bit == "1"
+	#   - list of basis kets whose binary sum equals the ket
+	def __decomposition(self, ket) -> list:
+		index = int(ket, 2) if isinstance(ket, str) else int(ket)
+		if not index & (index - 1):
+			return self.__generate_basis_kets(ket)
+
+		basis_kets = self.basis_kets
+		return [
+			int(basis_kets[position]) if self.ket_format == 'int'
+			else basis_kets[position]
+			for position in self.decomposition_index.positions_of(
+				index
+				).tolist()
 			]
-		return basis_kets
-
-	# Create a dictionary of non-basis kets and their corresponding basis kets
-	# inputs:
-	#   - list = list of non-basis kets
-	#   - powers = list of all basis kets of length n
-	# output:
-	#   - dictionary containing:
-	#       - keys: the non-basis kets from the above list
-	#       - values: dictionaries initialized with a list of their corresponding 
-	#                 basis kets
-	def __non_basis_kets_dict(self, list, powers) -> dict:
-		dict = {}
-
-		for ket in list:
-			basis_kets = self.__get_basis_kets(ket, powers)
-			dict[ket] = { 'basis_kets': basis_kets }
-
-		return dict
-
-		"""
-		can also use dictionary comprehension?
-		dict = {
-			ket: { 'basis_kets': self.get_basis_kets(ket, powers)}
-			for ket in list }
-		"""
 
 	# Compute the product of ket amplitudes
 	# inputs:
@@ -388,13 +702,21 @@ class Entangled:
 			product = product*statevector[index]
 		return product
 
-	# Generate basis kets corresponding to a specific non-basis ket
-	# Use with method check_single_ket when a list of basis kets is not provided
+	# Generate basis kets corresponding to a specific ket from its bits
+	# Used for the zero ket and basis kets, which are not in the decomposition
+	# index
 	# input:
 	#   - ket = bitstring representing a non-basis ket
 	# output:
 	#   a list of bitstrings representing the corresponding basis kets
 	def __generate_basis_kets(self, ket) -> list:
+		if not isinstance(ket, str):
+			# 'int' kets: isolate each set bit, from the leftmost
+			return [
+				1 << index for index in reversed(range(int(ket).bit_length()))
+				if ket >> index & 1
+				]
+
 		length = len(ket)
 		basis_kets = [format(1 << (length - 1 - index) | 0, '0'+str(length)+'b')
 				for index, bit in enumerate(ket) if bit == "1"]
@@ -404,7 +726,7 @@ class Entangled:
 	# corresponding basis ket amplitudes and store the results in a dictionary.
 	# This can be used separately to check the criteria on a specific ket 
 	# without running the algorithm over all kets.  Basis kets can be generated
-	# 'on the fly' when a preset list is not provided.
+	# from the decomposition index when a preset list is not provided.
 	# inputs:
 	#   - a statevector dictionary
 	#   - a non-basis ket
@@ -415,8 +737,8 @@ class Entangled:
 		dict = {}
 
 		if basis_kets == None:
-		# if basis kets not provided, generate them
-			basis_kets = self.__generate_basis_kets(ket)
+		# if basis kets not provided, read them from the index
+			basis_kets = self.__decomposition(ket)
 			dict['basis_kets'] = basis_kets
 
 		# get product of basis ket amplitudes
@@ -448,9 +770,9 @@ class Entangled:
 	# input:
 	#   - list of basis kets for a non-basis ket
 	def basis_product_string(self, list) -> str:
-		product = "Psi['"+list[0]+"']"
+		product = "Psi['"+self.ket_string(list[0])+"']"
 		for index in list[1:]:
-			product = product + "*Psi['"+index+"']"
+			product = product + "*Psi['"+self.ket_string(index)+"']"
 		return product
 
 	# Print Product of basis kets Amplitude
@@ -465,7 +787,7 @@ class Entangled:
 	#   - ket = text string reference to a non-basis ket amplitude
 	#   - amplitude = numerical value of amplitude
 	def print_ket_amplitude(self, ket, amplitude) -> None:
-		print("Psi['"+ket+"'] = " + str(amplitude))
+		print("Psi['"+self.ket_string(ket)+"'] = " + str(amplitude))
 
 
 	# Print True/False check statement
@@ -474,62 +796,746 @@ class Entangled:
 	#   - product of basis ket string
 	#   - boolean check value
 	def print_entanglement_equation(self, ket, basis_elements, bool) -> None:
-		print("Psi['"+ket+"']" + " == " + basis_elements + " is " + str(bool))
+		print(
+			"Psi['"+self.ket_string(ket)+"']" + " == " + basis_elements
+			+ " is " + str(bool)
+			)
 
 
 	# Entanglement Function
 	# input:
 	#   - statevector = Qiskit Statevector Dictionary
 	# output:
-	#   - dict = dictionary, where:
+	#   - EntanglementResult, a read-only mapping where:
 	#       - keys: all non-basis kets in the statevector
 	#       - values: dictionaries containing:
-	#           - corresponding basis kets
+	#           - corresponding basis kets, read from decomposition_index
 	#           - target amplitude (product of basis ket amplitudes) 
 	#           - boolean equality check
+	#     use to_dict() for a plain dictionary (see entanglement_result module).
+	#     The 'sparse' engine returns a SparseEntanglementResult
 	#   - print statement indicating whether or not the state is Entangled
+	# A memory-mapped array, or the path of a .npy or raw complex128 file, is
+	# read one block at a time with the 'numpy' engine functions, whatever the
+	# engine ('sparse' excepted), and each block of results is written to a
+	# file in Entangled.result_directory, so memory stays bounded.  The result
+	# is memory-mapped from that file and takes 17 bytes of disk per ket.
 	def entangled(self, statevector):
-		# initialize new decomposition dictionary for input statevector
-		dict = self.__non_basis_kets_dict(self.non_basis_kets, self.basis_kets)
+		with self.__record('entangled') as record:
+			key = None
+			if (self.result_cache is not None
+					and self.source_policy in result_cache.CACHEABLE_POLICIES):
+				statevector, key = self.__result_key(statevector, record)
+				with record.phase('cache'):
+					result = self.result_cache.get(key)
+				if result is not None:
+					record.count('statevectors')
+					return self.__conclude(result)
+
+			if self.engine != 'sparse' and isinstance(
+				statevector, (str, os.PathLike, np.memmap)
+				):
+				result = self.__entangled_blocks(statevector, record)
+			elif self.engine == 'numpy':
+				result = self.__entangled_numpy(statevector, record)
+			elif self.engine == 'sparse':
+				result = self.__entangled_sparse(statevector, record)
+			else:
+				result = self.__entangled_dict(statevector, record)
+			if key is not None:
+				with record.phase('cache'):
+					self.result_cache.put(key, result)
+
+			record.count('statevectors')
+			if self.instrumentation is not None:
+				if self.engine == 'sparse':
+					# only the kets of the support are checked one by one
+					non_basis = result.indices & (result.indices - 1) != 0
+					record.count('kets_checked', np.count_nonzero(non_basis))
+					record.count('kets_failed', len(result.failing_support()))
+				else:
+					record.count('kets_checked', len(result))
+					record.count('kets_failed', len(result.failing_kets()))
+
+		return self.__conclude(result)
+
+	# Print the conclusion of entangled() and return its result
+	@staticmethod
+	def __conclude(result):
+		if result.entangled:
+			print("|Psi> is Entangled")
+		else:
+			print("|Psi> is not Entangled")
+
+		return result
+
+	# Convert a statevector and hash it for the result cache
+	# The 'sparse' engine hashes the support of the statevector, the others
+	# its array of amplitudes, after the basis change of the source policy
+	# and divided by the zero ket amplitude (see result_cache module).  The
+	# converted statevector is returned so the engine does not convert it
+	# again, except for the 'dict' engine, which reads the statevector
+	# dictionary itself.
+	# inputs:
+	#   - statevector = see entangled()
+	#   - record = instrumentation record of the call
+	# output:
+	#   - statevector to check
+	#   - cache key, see result_cache.ResultCache.key()
+	def __result_key(self, statevector, record):
+		with record.phase('convert'):
+			if self.engine == 'sparse':
+				indices, values = entanglement_sparse.sparse_statevector(
+					statevector, self.number_qubits
+					)
+				converted = indices, values
+			else:
+				amplitudes = entanglement_array.statevector_array(
+					statevector, self.number_qubits
+					)
+				converted = statevector if self.engine == 'dict' else amplitudes
+
+		with record.phase('cache'):
+			if self.engine == 'sparse':
+				source_index = 0
+				if len(indices) and indices[0] != 0:
+					source_index = entanglement_sparse.choose_source_index(
+						indices, values, self.source_policy
+						)
+				digest = result_cache.support_digest(
+					indices, values, source_index
+					)
+			else:
+				digest = result_cache.amplitude_digest(
+					amplitudes, self.__source_index(amplitudes)
+					)
+			key = result_cache.ResultCache.key(
+				digest, self.number_qubits, self.engine, self.ket_format,
+				self.source_policy
+				)
+		return converted, key
+
+	# Entanglement Function, dict engine
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary
+	#   - record = instrumentation record of the call
+	# output:
+	#   - EntanglementResult, see entangled()
+	def __entangled_dict(self, statevector, record):
+		# change basis and normalize zero ket amplitude
+		statevector = self.__prepare_statevector(statevector, record)
+
+		with record.phase('decomposition'):
+			kets = self.kets
+			if isinstance(kets, np.ndarray):
+				kets = kets.tolist()
+			non_basis_kets = self.non_basis_kets
+			if isinstance(non_basis_kets, np.ndarray):
+				non_basis_kets = non_basis_kets.tolist()
+			basis_kets = self.__basis_list()
+			decompositions = self.decomposition_index
+
+		with record.phase('criteria'):
+			# initialize target amplitudes and equality checks indexed by ket;
+			# the zero ket and basis kets keep their own amplitudes and always
+			# pass
+			targets = np.array(
+				[statevector[ket] for ket in kets], dtype=complex
+				)
+			equality = np.ones(len(kets), dtype=bool)
+
+			# apply entanglement criteria for each ket, reading decompositions
+			# from the index one block at a time
+			for ket, decomposition in zip(
+				non_basis_kets, decompositions.iter_decompositions(basis_kets)
+				):
+				# get results from check single ket
+				ket_results = self.check_single_ket(
+					statevector, 
+					ket, 
+					decomposition
+					)
+				ket_index = int(ket, 2) if isinstance(ket, str) else ket
+				targets[ket_index] = ket_results['target_amplitude']
+				equality[ket_index] = ket_results['equality']
+
+		with record.phase('result'):
+			return entanglement_result.EntanglementResult(
+				self.number_qubits, targets, equality, self.ket_format,
+				decompositions
+				)
+
+	# Entanglement Function, NumPy engine
+	# Same output as entangled(), but the criteria is applied to all kets at
+	# once over an array of amplitudes
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary or array of amplitudes
+	#   - record = instrumentation record of the call
+	# output:
+	#   - EntanglementResult, see entangled()
+	def __entangled_numpy(self, statevector, record):
+		# convert statevector to array and change basis
+		amplitudes = self.__prepare_amplitudes(statevector, record)
+
+		with record.phase('normalize'):
+			if amplitudes[0] != 1:
+				amplitudes = entanglement_array.normalize(amplitudes)
+
+		# apply entanglement criteria to all kets
+		with record.phase('criteria'):
+			targets, equality = entanglement_array.criteria(
+				amplitudes, self.number_qubits
+				)
+
+		with record.phase('result'):
+			return entanglement_result.EntanglementResult(
+				self.number_qubits, targets, equality, self.ket_format,
+				self.decomposition_index
+				)
+
+	# Entanglement Function for a statevector on disk
+	# Same output as __entangled_numpy(), but normalization, the basis change
+	# and the criteria are applied one block of kets at a time (see
+	# entanglement_array.iter_range_criteria()), and each block is written to
+	# a result record in result_directory (see ResultWriter in the
+	# entanglement_result module).  The result is memory-mapped from the record, whose file is removed once
+	# it is mapped, so only one block of kets is held in memory.
+	# inputs:
+	#   - statevector = memory-mapped array or file path
+	#   - record = instrumentation record of the call
+	# output:
+	#   - EntanglementResult, see entangled()
+	def __entangled_blocks(self, statevector, record):
+		with record.phase('convert'):
+			amplitudes = entanglement_array.statevector_array(
+				statevector, self.number_qubits
+				)
+		with record.phase('basis_change'):
+			source_index = self.__source_index(amplitudes)
+		if source_index:
+			record.count('basis_changes')
+
+		descriptor, path = tempfile.mkstemp(
+			dir=self.result_directory, suffix='.ent'
+			)
+		os.close(descriptor)
+		try:
+			with record.phase('criteria'):
+				writer = entanglement_result.ResultWriter(
+					path, self.number_qubits, self.ket_format
+					)
+				for start, targets, equality in (
+					entanglement_array.iter_range_criteria(
+						amplitudes, self.number_qubits,
+						source_index=source_index
+						)
+					):
+					writer.write_block(start, targets, equality)
+
+			with record.phase('result'):
+				result = writer.close()
+				result.decompositions = self.decomposition_index
+		finally:
+			# the mapping stays valid once the file is removed; where a mapped
+			# file cannot be removed it is left in result_directory
+			with contextlib.suppress(OSError):
+				os.remove(path)
+		return result
+
+	# Entanglement Function, sparse engine
+	# Only the kets of the support are read, see entanglement_sparse
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary, tuple (indices, values)
+	#       of the kets with nonzero amplitudes, or array of amplitudes
+	#   - record = instrumentation record of the call
+	# output:
+	#   - SparseEntanglementResult, see entangled()
+	def __entangled_sparse(self, statevector, record):
+		indices, values, source_index = self.__prepare_support(
+			statevector, record
+			)
+
+		with record.phase('criteria'):
+			indices, values, basis_amplitudes, targets, equality = (
+				entanglement_sparse.criteria(
+					indices, values, self.number_qubits, source_index
+					)
+				)
+			witness = entanglement_sparse.witness_index(
+				indices, basis_amplitudes, equality
+				)
+
+		with record.phase('result'):
+			return entanglement_result.SparseEntanglementResult(
+				self.number_qubits, indices, values, basis_amplitudes, targets,
+				witness, self.ket_format
+				)
+
+	# Convert a statevector to its support and choose the source ket of a basis
+	# change for the 'sparse' engine
+	# inputs:
+	#   - statevector = see __entangled_sparse()
+	#   - (optional) record = instrumentation record of the call
+	# output:
+	#   - indices, values = support, see entanglement_sparse.sparse_statevector()
+	#   - source_index = ket that maps to the zero ket, 0 for no basis change
+	def __prepare_support(self, statevector,
+			record=instrumentation.NULL_RECORD):
+		with record.phase('convert'):
+			indices, values = entanglement_sparse.sparse_statevector(
+				statevector, self.number_qubits
+				)
+		if indices[0] == 0:
+			return indices, values, 0
+
+		with record.phase('basis_change'):
+			if self.source_policy == 'interactive':
+				source_ket = self.get_source_ket(
+					tuple(self.__ket(index) for index in indices.tolist())
+					)
+				source_index = (
+					int(source_ket, 2) if isinstance(source_ket, str)
+					else source_ket
+					)
+			else:
+				source_index = entanglement_sparse.choose_source_index(
+					indices, values, self.source_policy, self.rng
+					)
+		record.count('basis_changes')
+		return indices, values, source_index
+
+	# Instrumentation record of one call
+	# input:
+	#   - method = name of the method being recorded
+	# output:
+	#   - context manager giving an instrumentation.CallRecord, or
+	#       instrumentation.NULL_RECORD when instrumentation is disabled
+	def __record(self, method):
+		if self.instrumentation is None:
+			return contextlib.nullcontext(instrumentation.NULL_RECORD)
+		return self.instrumentation.record(
+			method, self.number_qubits, self.engine
+			)
+
+	# Check the entanglement criteria one non-basis ket at a time
+	# Results are generated lazily, so the caller can stop at any ket without
+	# evaluating the rest of the statevector
+	# input:
+	#   - statevector = Qiskit Statevector Dictionary (or array of amplitudes
+	#       with the 'numpy' engine, or tuple (indices, values) with the
+	#       'sparse' engine)
+	# output:
+	#   - generator of (ket, ket_results) for each non-basis ket, where
+	#       ket_results is a dictionary in the same format as the values of
+	#       entangled()
+	def iter_entangled(self, statevector):
+		if self.engine == 'sparse':
+			result = self.__entangled_sparse(
+				statevector, instrumentation.NULL_RECORD
+				)
+			for ket in result:
+				yield ket, result[ket]
+			return
+
+		# decompositions of the non-basis kets in order, see decomposition_index
+		basis_kets = self.__basis_list()
+		decompositions = self.decomposition_index.iter_decompositions(
+			basis_kets
+			)
+
+		if self.engine == 'numpy':
+			amplitudes = self.__prepare_amplitudes(statevector)
+			for start, targets, equality in entanglement_array.iter_criteria(
+				amplitudes, self.number_qubits
+				):
+				mask = entanglement_array.non_basis_mask(
+					self.number_qubits, start, start + len(equality)
+					)
+				for offset in np.flatnonzero(mask):
+					ket = self.__ket(start + offset)
+					yield ket, {
+						'basis_kets': next(decompositions),
+						'target_amplitude': targets[offset].item(),
+						'equality': bool(equality[offset])
+						}
+			return
+
+		statevector = self.__prepare_statevector(statevector)
+		non_basis_kets = self.non_basis_kets
+		if isinstance(non_basis_kets, np.ndarray):
+			non_basis_kets = non_basis_kets.tolist()
+
+		for ket in non_basis_kets:
+			decomposition = next(decompositions)
+			ket_results = {'basis_kets': decomposition}
+			ket_results.update(
+				self.check_single_ket(statevector, ket, decomposition)
+				)
+			yield ket, ket_results
+
+	# Short-circuit version of entangled()
+	# Stops at the first non-basis ket that fails the equality check, since
+	# a single failed check means the state is Entangled.  Nothing is printed.
+	# A memory-mapped array, or the path of a .npy or raw complex128 file, is
+	# checked with the 'numpy' engine functions one block at a time, so only
+	# a block of amplitudes is held in memory at once (see
+	# entanglement_array.load_statevector()).
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary (or array of amplitudes
+	#       with the 'numpy' engine, or tuple (indices, values) with the
+	#       'sparse' engine), memory-mapped array or file path
+	#   - (optional) processes = number of worker processes to split the kets
+	#       across (None for one per core), see entanglement_parallel.  The
+	#       statevector is checked with the 'numpy' engine functions, and the
+	#       witness is a failing ket but not necessarily the first one
+	# output:
+	#   - tuple (entangled, witness), where:
+	#       - entangled = True if the state is Entangled
+	#       - witness = the first non-basis ket that fails the check, or None
+	def is_entangled(self, statevector, processes=1) -> tuple:
+		with self.__record('is_entangled') as record:
+			index = self.__first_violation(statevector, processes, record)
+
+			record.count('statevectors')
+			if index is None:
+				record.count(
+					'kets_checked', 2**self.number_qubits - self.number_qubits - 1
+					)
+				return False, None
+			# non-basis kets up to and including the witness: the kets up to
+			# it, less the zero ket and the basis kets
+			record.count('kets_checked', index - index.bit_length())
+			record.count('kets_failed')
+			return True, self.__ket(index)
+
+	# Find a failing non-basis ket for is_entangled()
+	# inputs:
+	#   - statevector, processes = see is_entangled()
+	#   - record = instrumentation record of the call
+	# output:
+	#   - index of a failing non-basis ket, or None if all kets pass
+	def __first_violation(self, statevector, processes, record):
+		if self.engine == 'sparse':
+			indices, values, source_index = self.__prepare_support(
+				statevector, record
+				)
+			with record.phase('criteria'):
+				return entanglement_sparse.first_violation(
+					indices, values, self.number_qubits, source_index
+					)
+
+		if self.engine == 'numpy' or processes != 1 or not isinstance(
+			statevector, dict
+			):
+			with record.phase('convert'):
+				amplitudes = entanglement_array.statevector_array(
+					statevector, self.number_qubits
+					)
+			with record.phase('basis_change'):
+				source_index = self.__source_index(amplitudes)
+			if source_index:
+				record.count('basis_changes')
+
+			# normalization and the basis change are applied block by block
+			# while checking
+			with record.phase('criteria'):
+				if processes == 1:
+					return entanglement_array.first_violation(
+						amplitudes, self.number_qubits,
+						source_index=source_index
+						)
+				return entanglement_parallel.sharded_criteria(
+					amplitudes, self.number_qubits, processes,
+					source_index=source_index
+					)
+
+		statevector = self.__prepare_statevector(statevector, record)
+		with record.phase('criteria'):
+			non_basis_kets = self.non_basis_kets
+			if isinstance(non_basis_kets, np.ndarray):
+				non_basis_kets = non_basis_kets.tolist()
+			basis_kets = self.__basis_list()
+			decompositions = self.decomposition_index.iter_decompositions(
+				basis_kets
+				)
+
+			for ket in non_basis_kets:
+				ket_results = self.check_single_ket(
+					statevector, ket, next(decompositions)
+					)
+				if ket_results['equality'] == False:
+					return int(ket, 2) if isinstance(ket, str) else ket
+		return None
+
+	# Entanglement Function for many statevectors at once
+	# All statevectors are checked together with the entanglement_array
+	# functions, whatever the engine, and nothing is printed.  A statevector
+	# with zero ket amplitude 0 has its source ket chosen by the source policy,
+	# or its first ket with a nonzero amplitude for the 'interactive' policy.
+	# inputs:
+	#   - statevectors = 2-D array of shape (batch, 2**number_qubits), or an
+	#       iterable of statevector dictionaries or arrays
+	#   - (optional) witnesses = True to also return a witness ket for each
+	#       statevector
+	#   - (optional) processes = number of worker processes to split the batch
+	#       across (None for one per core), see entanglement_parallel.  Results
+	#       are identical to a serial check, and small batches are always
+	#       checked serially
+	# output:
+	#   - verdicts = boolean array, True where the statevector is Entangled
+	#   - (if witnesses is True) list of the first non-basis ket that fails the
+	#       check for each statevector, or None where it is not Entangled
+	def entangled_batch(self, statevectors, witnesses=False, processes=1):
+		with self.__record('entangled_batch') as record:
+			with record.phase('convert'):
+				amplitudes = entanglement_array.statevector_batch(
+					statevectors, self.number_qubits
+					)
+			with record.phase('basis_change'):
+				amplitudes = self.__prepare_batch(amplitudes, record)
+
+			# normalization is applied to each statevector while checking
+			with record.phase('criteria'):
+				if processes == 1:
+					witness_indices = entanglement_array.batch_criteria(
+						amplitudes, self.number_qubits
+						)
+				else:
+					witness_indices = (
+						entanglement_parallel.parallel_batch_criteria(
+							amplitudes, self.number_qubits, processes
+							)
+						)
+			verdicts = witness_indices >= 0
+
+			record.count('statevectors', len(verdicts))
+			record.count('kets_failed', np.count_nonzero(verdicts))
+			if not witnesses:
+				return verdicts
+			with record.phase('result'):
+				return verdicts, [
+					self.__ket(index) if index >= 0 else None
+					for index in witness_indices.tolist()
+					]
+
+	# Check whether a state factors across a cut A|B of its qubits
+	# Qubit i is bit 2**i of a ket, i.e. qubit 0 is the rightmost character of
+	# a bitstring.  The amplitudes are reshaped to a (2**|A|, 2**|B|) matrix,
+	# which has rank 1 exactly when the state factors (see bipartite module).
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary or array of amplitudes
+	#   - subsystem = qubits of A, e.g. [0, 2]; B is the rest
+	#   - (optional) tolerance = largest ratio of the second to the first
+	#       singular value of a separable state, defaults to the numerical
+	#       precision
+	# output:
+	#   - True if the state is a product of a state of A and a state of B
+	def separable(self, statevector, subsystem, tolerance=None) -> bool:
+		amplitudes = entanglement_array.statevector_array(
+			statevector, self.number_qubits
+			)
+		return bipartite.is_separable(
+			amplitudes, self.number_qubits, subsystem, tolerance
+			)
+
+	# Check whether a state factors across each of many cuts, see separable()
+	# Cuts of the same size are decomposed together in batched calls.
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary or array of amplitudes
+	#   - (optional) subsystems = iterable of subsystems A, defaults to every
+	#       cut (see bipartite.all_cuts())
+	#   - (optional) tolerance = see separable()
+	# output:
+	#   - dictionary {subsystem: True if the state factors across the cut},
+	#       with each subsystem as a sorted tuple of qubits
+	def separable_cuts(self, statevector, subsystems=None, tolerance=None
+			) -> dict:
+		amplitudes = entanglement_array.statevector_array(
+			statevector, self.number_qubits
+			)
+		if subsystems is None:
+			subsystems = bipartite.all_cuts(self.number_qubits)
+		subsystems = [
+			bipartite.check_subsystem(self.number_qubits, subsystem)
+			for subsystem in subsystems
+			]
+		results = bipartite.separable_cuts(
+			amplitudes, self.number_qubits, subsystems, tolerance
+			)
+		return dict(zip(subsystems, results.tolist()))
+
+	# Finest partition of the qubits into mutually unentangled clusters
+	# The statevector is first checked with the entanglement criteria (after a
+	# basis change if the zero ket amplitude is 0, with the 'first' source ket
+	# for the 'interactive' policy), and a state that is not Entangled is all
+	# single qubits.  Otherwise clusters are found from correlated pairs of
+	# qubits and factored out one at a time with single cut rank tests, which
+	# is far fewer than the 2**(n - 1) - 1 cuts of separable_cuts() (see
+	# bipartite.clusters()).  A basis change only flips bits, so it does not
+	# change the clusters.
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary or array of amplitudes
+	#   - (optional) tolerance = see separable()
+	# output:
+	#   - list of clusters, each a sorted tuple of qubits (qubit i is bit 2**i
+	#       of a ket), ordered by their lowest qubit
+	def clusters(self, statevector, tolerance=None) -> list:
+		with self.__record('clusters') as record:
+			with record.phase('convert'):
+				amplitudes = entanglement_array.statevector_array(
+					statevector, self.number_qubits
+					)
+			if not np.any(amplitudes):
+				raise ValueError("statevector has no nonzero amplitudes")
+
+			with record.phase('basis_change'):
+				source_index = 0
+				if amplitudes[0] == 0:
+					policy = self.source_policy
+					if policy == 'interactive':
+						policy = 'first'
+					source_index = entanglement_array.choose_source_index(
+						amplitudes, policy, self.rng
+						)
+					record.count('basis_changes')
+
+			record.count('statevectors')
+			with record.phase('criteria'):
+				index = entanglement_array.first_violation(
+					amplitudes, self.number_qubits, source_index=source_index
+					)
+			if index is None:
+				record.count(
+					'kets_checked', 2**self.number_qubits - self.number_qubits - 1
+					)
+				return [(qubit,) for qubit in range(self.number_qubits)]
+			record.count('kets_checked', index - index.bit_length())
+			record.count('kets_failed')
+
+			with record.phase('clusters'):
+				return bipartite.clusters(
+					amplitudes, self.number_qubits, tolerance
+					)
 
+	# Prepare a 2-D array of amplitudes for entangled_batch()
+	# inputs:
+	#   - amplitudes = complex array of shape (batch, 2**number_qubits)
+	#   - (optional) record = instrumentation record of the call
+	# output:
+	#   - complex array with a basis change applied to each row with zero ket
+	#       amplitude 0 (the input array is not modified)
+	def __prepare_batch(self, amplitudes, record=instrumentation.NULL_RECORD):
+		zero_rows = np.flatnonzero(amplitudes[:, 0] == 0)
+		record.count('basis_changes', len(zero_rows))
+		if len(zero_rows) == 0:
+			return amplitudes
+
+		# the 'interactive' policy cannot prompt once per statevector
+		policy = self.source_policy
+		if policy == 'interactive':
+			policy = 'first'
+
+		amplitudes = amplitudes.copy()
+		amplitudes[zero_rows] = entanglement_array.batch_basis_change(
+			amplitudes[zero_rows],
+			entanglement_array.batch_source_indices(
+				amplitudes[zero_rows], policy, self.rng
+				)
+			)
+		return amplitudes
+
+	# Prepare a statevector dictionary for the entanglement criteria
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary
+	#   - (optional) record = instrumentation record of the call
+	# output:
+	#   - statevector with a basis change applied if the zero ket amplitude is
+	#       0, and the zero ket amplitude normalized to 1
+	def __prepare_statevector(self, statevector,
+			record=instrumentation.NULL_RECORD):
 		# check if zero ket exists and perform change of basis if not
-		if statevector['0'*self.number_qubits] == 0:
-			valid_kets = self.get_valid_kets(statevector)
-			source_ket = self.get_source_ket(valid_kets)
-			statevector = self.basis_change_method_two(statevector, source_ket)
-			# get source ket
-			# basis change method
-			pass
+		if statevector[self.zero_ket] == 0:
+			with record.phase('basis_change'):
+				source_ket = self.__choose_source_ket(statevector)
+				statevector = self.basis_change_method_two(
+					statevector, source_ket
+					)
+			record.count('basis_changes')
 
 		# check zero ket amplitude and normalize if not equal to 1        
-		if statevector['0'*self.number_qubits] != 1:
-			statevector = self.normalize_statevector(statevector)
-
-		# initalize set of booleans
-		booleans = set()
-
-		# apply entanglement criteria for each ket
-		for ket in dict:
-			# get results from check single ket
-			ket_results = self.check_single_ket(
-				statevector, 
-				ket, 
-				dict[ket]['basis_kets']
+		if statevector[self.zero_ket] != 1:
+			with record.phase('normalize'):
+				statevector = self.normalize_statevector(statevector)
+
+		return statevector
+
+	# Prepare an array of amplitudes for the 'numpy' engine
+	# Normalization is left to the entanglement_array functions
+	# inputs:
+	#   - statevector = Qiskit Statevector Dictionary or array of amplitudes
+	#   - (optional) record = instrumentation record of the call
+	# output:
+	#   - complex array of amplitudes indexed by ket, with a basis change
+	#       applied if the zero ket amplitude is 0
+	def __prepare_amplitudes(self, statevector,
+			record=instrumentation.NULL_RECORD):
+		with record.phase('convert'):
+			amplitudes = entanglement_array.statevector_array(
+				statevector, self.number_qubits
 				)
-			# update dictionary with results
-			# faster way to do this?  items()?
-			dict[ket]['target_amplitude'] = ket_results['target_amplitude']
-			dict[ket]['equality'] = ket_results['equality']
 
-			booleans.add(dict[ket]['equality'])
+		# perform change of basis if the zero ket amplitude is 0
+		if amplitudes[0] == 0:
+			with record.phase('basis_change'):
+				amplitudes = entanglement_array.basis_change(
+					amplitudes, self.__source_index(amplitudes)
+					)
+			record.count('basis_changes')
 
-		# conclusion
-		if False in booleans:
-			print("|Psi> is Entangled")
-		else:
-			print("|Psi> is not Entangled")
+		return amplitudes
 
-		return dict
+	# Choose the ket that maps to the zero ket in a basis change
+	# input:
+	#   - amplitudes = complex array of amplitudes indexed by ket
+	# output:
+	#   - 0 if the zero ket amplitude is nonzero (no basis change), otherwise
+	#       the index of the ket chosen by the source policy
+	def __source_index(self, amplitudes) -> int:
+		if amplitudes[0] != 0:
+			return 0
+
+		policy = self.source_policy
+		if policy == 'interactive':
+			# a memory-mapped statevector is too large to list its nonzero
+			# kets, so it uses the first one found
+			if isinstance(amplitudes, np.memmap):
+				policy = 'first'
+			else:
+				valid_kets = tuple(
+					self.__ket(index) for index in np.flatnonzero(amplitudes)
+					)
+				source_ket = self.get_source_ket(valid_kets)
+				if self.ket_format == 'str':
+					return int(source_ket, 2)
+				return source_ket
+
+		return entanglement_array.choose_source_index(
+			amplitudes, policy, self.rng
+			)
+
+	# Choose the ket of a statevector dictionary that maps to the zero ket
+	# input:
+	#   - statevector = Qiskit Statevector Dictionary
+	# output:
+	#   - ket chosen by the source policy
+	def __choose_source_ket(self, statevector):
+		if self.source_policy == 'interactive':
+			return self.get_source_ket(self.get_valid_kets(statevector))
+
+		amplitudes = entanglement_array.statevector_array(
+			statevector, self.number_qubits
+			)
+		return self.__ket(self.__source_index(amplitudes))
 
 
 	# Get amplitude of single ket from user input
@@ -570,7 +1576,7 @@ class Entangled:
 		via user input
 		"""
 		
-		if statevector:
+		if statevector is not None and len(statevector) > 0:
 			# assign variable to user supplied statevector
 			new_statevector = statevector
 		else:
@@ -578,8 +1584,14 @@ class Entangled:
 			new_statevector = self.init_statevector()
 			
 		# update ket amplitudes
-		for key in new_statevector.keys():
-			new_statevector[key] = self.__get_amplitude(key)
+		if isinstance(new_statevector, dict):
+			for key in new_statevector.keys():
+				new_statevector[key] = self.__get_amplitude(key)
+		else:
+			for index in range(len(new_statevector)):
+				new_statevector[index] = self.__get_amplitude(
+					self.ket_string(index)
+					)
 
 		return new_statevector
 
@@ -591,6 +1603,10 @@ class Entangled:
 	# output:
 	#	- transformed target ket
 	def basis_change_ket(self, target_ket, source_ket):
+		if not isinstance(target_ket, str):
+			# 'int' kets: no conversion needed
+			return target_ket ^ source_ket
+
 		target_ket = format(
 			(int(target_ket,2))^(int(source_ket,2)), 
 			'0'+str(len(source_ket))+'b'
@@ -608,6 +1624,10 @@ class Entangled:
 	# output:
 	#	- transformed statevector
 	def basis_change_method_one(self, statevector, source_ket: str):
+		if isinstance(statevector, np.ndarray):
+			# arrays are indexed by ket, so a basis change permutes amplitudes
+			return entanglement_array.basis_change(statevector, source_ket)
+
 		new_statevector = {
 			self.basis_change_ket(key, source_ket): value
 			for (key, value) in statevector.items()
@@ -615,24 +1635,29 @@ class Entangled:
 		return new_statevector
 
 	# Basis Change Method 2: Map Amplitudes to New Statevector
-	# This will preserve ket order for convenience
+	# This will preserve ket order for convenience.  The amplitudes are
+	# permuted as an array, new[k] = old[k XOR source_ket], then matched with
+	# the kets in order, so no ket is converted with int() or format().
+	# Kets missing from the statevector have amplitude 0.
 	# inputs:
 	#	- statevector to be transformed
 	#	- source_ket that maps to zero ket
 	# output:
+	#	- transformed statevector (an array for array statevectors)
 	def basis_change_method_two(self, statevector, source_ket: str):
-		# create basis mapping dictionary
-		basis_change_dictionary = self.basis_change_dict(
-			statevector, 
-			source_ket
+		if isinstance(statevector, np.ndarray):
+			return entanglement_array.basis_change(statevector, source_ket)
+
+		# permute amplitudes as an array
+		amplitudes = entanglement_array.basis_change(
+			entanglement_array.statevector_array(
+				statevector, self.number_qubits
+				),
+			int(source_ket, 2)
 			)
 
 		# map amplitudes into new statevector
-		new_statevector = self.map_amplitudes(
-			statevector, 
-			basis_change_dictionary
-			)
-		return new_statevector
+		return dict(zip(self.kets, amplitudes.tolist()))
 
 	# Create dictionary of basis change mapping
 	# note: can this be done with Python map() method?
@@ -641,7 +1666,11 @@ class Entangled:
 	#	- source_ket that maps to zero ket
 	# output:
 	#	- dictionary {new_ket: old_ket} of basis change mapping 
+	#	  (an array of old kets indexed by new ket for array statevectors)
 	def basis_change_dict(self, statevector, source_ket: str) -> dict:
+		if isinstance(statevector, np.ndarray):
+			return np.arange(len(statevector)) ^ source_ket
+
 		dict = {
 			key: self.basis_change_ket(key, source_ket)
 			for key in statevector.keys()
@@ -656,9 +1685,12 @@ class Entangled:
 	# output:
 	#	- new_statevector = Transformed Statevector dictionary
 	def map_amplitudes(self, old_statevector, dict: dict) -> dict:
-		new_statevector = self.init_statevector()
-		for key in new_statevector.keys():
-			new_statevector[key] = old_statevector[dict[key]]
+		if isinstance(old_statevector, np.ndarray):
+			return old_statevector[dict]
+
+		new_statevector = {
+			key: old_statevector[dict[key]] for key in dict.keys()
+			}
 		return new_statevector
 
 	# Generate a list of kets for user to choose for basis transformation
@@ -667,6 +1699,9 @@ class Entangled:
 	# output:
 	#	- tuple of non-zero kets
 	def get_valid_kets(self, statevector) -> tuple:
+		if isinstance(statevector, np.ndarray):
+			return tuple(np.flatnonzero(statevector).tolist())
+
 		# generate a list of valid kets with non-zero amplitudes
 		valid_kets = [
 			key for (key, value) in statevector.items() if value != 0
@@ -684,6 +1719,10 @@ class Entangled:
 		""" get a ket string from user input
 		"""
 
+		# 'int' kets are shown and chosen as bitstrings
+		if self.ket_format == 'int':
+			valid_kets = tuple(self.ket_string(ket) for ket in valid_kets)
+
 		print(inspect.cleandoc(
 			"""Please choose a ket from the following list to map 
 			to the zero ket, or press Enter to choose a random ket): """
@@ -714,6 +1753,8 @@ class Entangled:
 			else:
 				break
 
+		if self.ket_format == 'int':
+			return int(source_ket, 2)
 		return source_ket
 	
 
@@ -724,8 +1765,12 @@ class Entangled:
 	#   - qiskit statevector dictionary with amplitudes scaled so that zero ket
 	#       has amplitude '1'
 	def normalize_statevector(self, statevector):
+		# arrays are indexed by ket, so the zero ket is at index 0
+		if isinstance(statevector, np.ndarray):
+			return statevector/statevector[0]
+
 		# get initial zero ket amplitude
-		zero_ket_amplitude = statevector['0'*self.number_qubits]
+		zero_ket_amplitude = statevector[self.zero_ket]
 
 		# divide all amplitudes by zero ket amplitude
 		normalized_statevector = { 
@@ -736,14 +1781,30 @@ class Entangled:
 
 
 	# Random Statevector Dictionary with normalized zero ket
-	def normalize_random_statevector(self):
-		# generate Qiskit random statevector of dim 2**number_qubits
-		random_state = random_statevector(2**self.number_qubits, None)
+	# The state is drawn from the generator seeded with 'seed'
+	# input:
+	#   - (optional) backend = 'numpy', or 'qiskit' for Qiskit
+	#       random_statevector() (see create_statevector)
+	def normalize_random_statevector(self, backend='numpy'):
+		create_statevector.check_backend(backend)
+		if backend == 'qiskit':
+			# generate Qiskit random statevector of dim 2**number_qubits
+			random_statevector = (
+				create_statevector.qiskit_quantum_info().random_statevector
+				)
+			amplitudes = random_statevector(
+				2**self.number_qubits, self.rng
+				).data
+		else:
+			amplitudes = create_statevector.random_amplitudes(
+				self.number_qubits, self.rng
+				)
 
 		# Normalize zero ket to have amplitude = 1
-		normalized_random_state = random_state/random_state[0]
+		amplitudes = amplitudes/amplitudes[0]
 
-		# Convert normalized Statevector to dictionary:
-		statevector = normalized_random_state.to_dict()
+		if self.ket_format == 'int':
+			return amplitudes
 
-		return statevector
\ No newline at end of file
+		# Convert normalized amplitudes to dictionary:
+		return dict(zip(self.kets, amplitudes.tolist()))
\ No newline at end of file
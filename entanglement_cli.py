@@ -0,0 +1,455 @@
+"""
+Command line entry point for the Entanglement Criteria.
+
+Reads statevectors as a stream and writes one verdict record per statevector
+as soon as its chunk is checked, so memory depends on the chunk size and not
+on the length of the input:
+- JSON lines (a file, or '-' for stdin), one statevector per line: a list of
+    amplitudes, or an object with "amplitudes", "data" (base64 complex128
+    bytes), "statevector" (a dictionary of kets) or "indices" and "values"
+    (kets with nonzero amplitudes, checked with the 'sparse' engine), and an
+    optional "id" copied to the record.  See the statevector_codec module for
+    the amplitude formats
+- .npy files of shape (2**n,) or (batch, 2**n), read one chunk at a time
+- .npz archives, each array checked as a .npy file (an array of an archive is
+    loaded as a whole when it is reached)
+
+Statevectors of the same qubit count are checked in chunks of --chunk-size
+with Entangled.entangled_batch(), across --processes worker processes (see
+entanglement_parallel), and nothing is printed by Entangled.  A statevector
+with zero ket amplitude 0 gets a basis change chosen by --source-policy.
+
+Records are JSON lines (or CSV with --format csv), in input order:
+{"index": 0, "id": "a", "number_qubits": 2, "entangled": true, "witness": "11"}
+{"index": 1, "number_qubits": 2, "entangled": false, "witness": null}
+{"index": 2, "error": "ValueError: ..."}
+A statevector that cannot be read or checked gets an error record, and the
+exit status is 1 if there was any.  A summary is written to stderr.
+
+Example:
+$ python entanglement_cli.py states.npy --chunk-size 4096 --processes 4
+$ cat states.jsonl | python entanglement_cli.py - --output verdicts.jsonl
+$ echo '[1, 0, 0, 1]' | python entanglement_cli.py -
+{"index": 0, "number_qubits": 2, "entangled": true, "witness": "11"}
+
+See (Entanglement Criteria module)
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+import entanglement_array
+import entanglement_class
+import entanglement_sparse
+import statevector_codec
+
+FORMATS = ('jsonl', 'csv')
+CSV_FIELDS = (
+    'index', 'id', 'number_qubits', 'entangled', 'witness', 'error'
+    )
+
+
+# Number of qubits of a statevector from its number of amplitudes
+# input:
+#   - size = number of amplitudes
+# output:
+#   - number of qubits
+def qubits_of(size: int) -> int:
+    if size < 2 or size & (size - 1):
+        raise ValueError(
+            f"a statevector has 2**n amplitudes, got {size} amplitudes"
+            )
+    return size.bit_length() - 1
+
+
+# Decode one JSON line into a statevector
+# inputs:
+#   - line = text of one JSON line
+#   - (optional) number_qubits = number of qubits when the line does not
+#       say, required for "indices" and "values"; the number of amplitudes
+#       of a dense statevector takes precedence
+# output:
+#   - tuple (id, number_qubits, statevector), where statevector is a complex
+#       array of amplitudes, or a tuple (indices, values) for the 'sparse'
+#       engine
+def decode_line(line: str, number_qubits=None) -> tuple:
+    record = json.loads(line)
+    if isinstance(record, list):
+        record = {'amplitudes': record}
+    if not isinstance(record, dict):
+        raise ValueError("a line must be a list of amplitudes or an object")
+
+    stated = record.get('number_qubits')
+    if stated is not None:
+        stated = int(stated)
+        if not 0 < stated <= entanglement_sparse.MAX_QUBITS:
+            raise ValueError(
+                f"number_qubits must be between 1 and "
+                f"{entanglement_sparse.MAX_QUBITS}, got {stated}"
+                )
+        number_qubits = stated
+    if 'indices' in record:
+        if number_qubits is None:
+            raise ValueError("sparse statevectors need number_qubits")
+        number_qubits = int(number_qubits)
+        statevector = (
+            statevector_codec.decode_indices(
+                record['indices'], number_qubits
+                ),
+            statevector_codec.decode_amplitudes(record['values'])
+            )
+        return record.get('id'), number_qubits, statevector
+
+    if 'statevector' in record:
+        kets = record['statevector']
+        if number_qubits is None:
+            number_qubits = len(next(iter(kets)))
+        statevector = entanglement_array.statevector_array(
+            statevector_codec.decode_kets(kets), int(number_qubits)
+            )
+    elif 'data' in record:
+        statevector = statevector_codec.decode_data(record['data'])
+    else:
+        statevector = statevector_codec.decode_amplitudes(
+            record['amplitudes']
+            )
+
+    size_qubits = qubits_of(len(statevector))
+    if stated is not None and stated != size_qubits:
+        raise ValueError(
+            f"statevector has {len(statevector)} amplitudes, not "
+            f"{2**stated}"
+            )
+    return record.get('id'), size_qubits, statevector
+
+
+# Statevectors of a JSON lines stream, one at a time
+# inputs:
+#   - stream = text stream
+#   - (optional) number_qubits = see decode_line()
+# output:
+#   - generator of (id, number_qubits, statevector) tuples, or of
+#       (None, None, exception) for lines that cannot be decoded
+def iter_jsonl(stream, number_qubits=None):
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield decode_line(line, number_qubits)
+        except statevector_codec.DECODE_ERRORS + (
+                StopIteration, RecursionError, MemoryError) as exception:
+            yield None, None, exception
+
+
+# Statevectors of an array of shape (2**n,) or (batch, 2**n), one chunk at a
+# time
+# inputs:
+#   - amplitudes = array, e.g. an array of a .npz archive
+#   - chunk_size = number of statevectors per chunk
+# output:
+#   - generator of (number_qubits, chunk), with chunk a complex array of shape
+#       (rows, 2**n)
+def iter_array(amplitudes, chunk_size: int):
+    if amplitudes.ndim == 1:
+        amplitudes = amplitudes[np.newaxis]
+    if amplitudes.ndim != 2:
+        raise ValueError(
+            f"arrays must have shape (2**n,) or (batch, 2**n), got "
+            f"{amplitudes.shape}"
+            )
+    number_qubits = qubits_of(amplitudes.shape[1])
+    for start in range(0, len(amplitudes), chunk_size):
+        yield number_qubits, np.asarray(
+            amplitudes[start:start + chunk_size], dtype=complex
+            )
+
+
+# Statevectors of a .npy file, read one chunk at a time
+# Chunks are read into fresh arrays rather than through a memory map, whose
+# pages would stay resident after being checked, so memory is bounded by the
+# chunk size for files of any length.  Fortran-ordered and object arrays are
+# left to iter_array() on a memory map.
+# inputs:
+#   - path = path of the .npy file
+#   - chunk_size = number of statevectors per chunk
+# output:
+#   - generator of (number_qubits, chunk), see iter_array()
+def iter_npy(path, chunk_size: int):
+    with open(path, 'rb') as stream:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            header = np.lib.format.read_array_header_1_0(stream)
+        elif version == (2, 0):
+            header = np.lib.format.read_array_header_2_0(stream)
+        else:
+            header = None, True, None
+        shape, fortran_order, dtype = header
+        if fortran_order or dtype.hasobject or len(shape) not in (1, 2):
+            yield from iter_array(np.load(path, mmap_mode='r'), chunk_size)
+            return
+
+        rows, size = (1, shape[0]) if len(shape) == 1 else shape
+        number_qubits = qubits_of(size)
+        for start in range(0, rows, chunk_size):
+            count = min(chunk_size, rows - start)
+            chunk = np.fromfile(stream, dtype=dtype, count=count*size)
+            if len(chunk) != count*size:
+                raise ValueError(f"{path} is truncated")
+            yield number_qubits, chunk.reshape(count, size).astype(
+                complex, copy=False
+                )
+
+
+# Checks statevectors chunk by chunk and writes their records in input order
+class Runner:
+    # inputs:
+    #   - writer = callable taking a record dictionary
+    #   - (optional) chunk_size, processes, source_policy, ket_format = see
+    #       parse_arguments()
+    def __init__(self, writer, chunk_size=1024, processes=1,
+                 source_policy='first', ket_format='str') -> None:
+        self.writer = writer
+        self.chunk_size = chunk_size
+        self.processes = processes
+        self.source_policy = source_policy
+        self.ket_format = ket_format
+        self.counts = {'statevectors': 0, 'entangled': 0, 'errors': 0}
+        self._checkers = {}
+        # statevectors of one qubit count waiting to be checked
+        self._ids = []
+        self._rows = []
+        self._number_qubits = None
+
+    # Warm Entangled object for an engine and a qubit count
+    def checker(self, number_qubits: int, engine='numpy'):
+        key = engine, number_qubits
+        if key not in self._checkers:
+            self._checkers[key] = entanglement_class.Entangled(
+                number_qubits, engine=engine, ket_format=self.ket_format,
+                source_policy=self.source_policy
+                )
+        return self._checkers[key]
+
+    # Queue one statevector, checking the queue when it is full or the qubit
+    # count changes
+    # inputs:
+    #   - record_id = id copied to the record, or None
+    #   - number_qubits
+    #   - statevector = complex array, tuple (indices, values), or an
+    #       exception to report
+    def add(self, record_id, number_qubits, statevector) -> None:
+        if isinstance(statevector, Exception) or isinstance(
+            statevector, tuple
+            ):
+            self.flush()
+            self._check_single(record_id, number_qubits, statevector)
+            return
+
+        if number_qubits != self._number_qubits:
+            self.flush()
+            self._number_qubits = number_qubits
+        self._ids.append(record_id)
+        self._rows.append(statevector)
+        if len(self._rows) >= self.chunk_size:
+            self.flush()
+
+    # Check a whole chunk of statevectors of one qubit count
+    # inputs:
+    #   - number_qubits
+    #   - chunk = complex array of shape (rows, 2**number_qubits)
+    #   - (optional) ids = id of each row
+    def add_chunk(self, number_qubits: int, chunk, ids=None) -> None:
+        self.flush()
+        if ids is None:
+            ids = [None]*len(chunk)
+        self._check_batch(number_qubits, chunk, ids)
+
+    # Check the queued statevectors
+    def flush(self) -> None:
+        if self._rows:
+            self._check_batch(
+                self._number_qubits, np.stack(self._rows), self._ids
+                )
+        self._ids = []
+        self._rows = []
+
+    def _check_batch(self, number_qubits, chunk, ids) -> None:
+        try:
+            verdicts, witnesses = self.checker(number_qubits).entangled_batch(
+                chunk, witnesses=True, processes=self.processes
+                )
+        except ValueError:
+            # one bad row fails the batch, so find it by checking one by one
+            for record_id, row in zip(ids, chunk):
+                self._check_single(record_id, number_qubits, row)
+            return
+        for record_id, verdict, witness in zip(
+            ids, verdicts.tolist(), witnesses
+            ):
+            self._write(record_id, number_qubits, verdict, witness)
+
+    def _check_single(self, record_id, number_qubits, statevector) -> None:
+        try:
+            if isinstance(statevector, Exception):
+                raise statevector
+            if isinstance(statevector, tuple):
+                verdict, witness = self.checker(
+                    number_qubits, 'sparse'
+                    ).is_entangled(statevector)
+            else:
+                verdicts, witnesses = self.checker(
+                    number_qubits
+                    ).entangled_batch([statevector], witnesses=True)
+                verdict, witness = bool(verdicts[0]), witnesses[0]
+        except statevector_codec.DECODE_ERRORS + (
+                StopIteration, RecursionError, MemoryError) as exception:
+            self._write_error(record_id, exception)
+            return
+        self._write(record_id, number_qubits, verdict, witness)
+
+    def _write(self, record_id, number_qubits, verdict, witness) -> None:
+        record = {'index': self.counts['statevectors']}
+        if record_id is not None:
+            record['id'] = record_id
+        record.update(
+            number_qubits=number_qubits, entangled=verdict, witness=witness
+            )
+        self.counts['statevectors'] += 1
+        self.counts['entangled'] += verdict
+        self.writer(record)
+
+    def _write_error(self, record_id, exception) -> None:
+        record = {'index': self.counts['statevectors']}
+        if record_id is not None:
+            record['id'] = record_id
+        record['error'] = f"{type(exception).__name__}: {exception}"
+        self.counts['statevectors'] += 1
+        self.counts['errors'] += 1
+        self.writer(record)
+
+
+# Feed one input to a Runner
+# inputs:
+#   - runner = Runner
+#   - source = path of a .npy, .npz or JSON lines file, or '-' for stdin
+#   - (optional) number_qubits = see decode_line()
+def run_source(runner, source: str, number_qubits=None) -> None:
+    extension = os.path.splitext(source)[1].lower()
+    if extension == '.npy':
+        for n, chunk in iter_npy(source, runner.chunk_size):
+            runner.add_chunk(n, chunk)
+    elif extension == '.npz':
+        with np.load(source) as archive:
+            for name in archive.files:
+                for n, chunk in iter_array(archive[name], runner.chunk_size):
+                    runner.add_chunk(n, chunk)
+    elif source == '-':
+        for item in iter_jsonl(sys.stdin, number_qubits):
+            runner.add(*item)
+    else:
+        with open(source) as stream:
+            for item in iter_jsonl(stream, number_qubits):
+                runner.add(*item)
+    runner.flush()
+
+
+# Record writer for an output stream
+# inputs:
+#   - stream = text stream
+#   - (optional) output_format = one of FORMATS
+# output:
+#   - callable taking a record dictionary
+def record_writer(stream, output_format='jsonl'):
+    if output_format == 'csv':
+        writer = csv.DictWriter(stream, CSV_FIELDS, lineterminator='\n')
+        writer.writeheader()
+        return writer.writerow
+
+    def write(record):
+        stream.write(json.dumps(record) + '\n')
+    return write
+
+
+# Command line arguments
+# input:
+#   - (optional) argv = list of arguments, defaults to sys.argv[1:]
+# output:
+#   - argparse.Namespace
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check statevectors with the Entanglement Criteria."
+        )
+    parser.add_argument(
+        'inputs', nargs='*', default=['-'],
+        help=".npy, .npz or JSON lines files, '-' for stdin (default)"
+        )
+    parser.add_argument(
+        '--output', '-o', default='-', help="output file, '-' for stdout"
+        )
+    parser.add_argument('--format', choices=FORMATS, default='jsonl')
+    parser.add_argument(
+        '--chunk-size', type=int, default=1024,
+        help="statevectors checked per batch"
+        )
+    parser.add_argument(
+        '--processes', type=int, default=1,
+        help="worker processes per batch, 0 for one per core"
+        )
+    parser.add_argument(
+        '--qubits', type=int,
+        help="number of qubits of JSON lines that do not say (needed for "
+        "sparse statevectors)"
+        )
+    parser.add_argument(
+        '--source-policy', choices=entanglement_array.SOURCE_POLICIES,
+        default='first'
+        )
+    parser.add_argument(
+        '--ket-format', choices=entanglement_class.KET_FORMATS, default='str'
+        )
+    return parser.parse_args(argv)
+
+
+# Command line entry point
+def main(argv=None) -> int:
+    arguments = parse_arguments(argv)
+    if arguments.chunk_size < 1:
+        raise SystemExit("--chunk-size must be at least 1")
+    output = (
+        sys.stdout if arguments.output == '-'
+        else open(arguments.output, 'w', newline='')
+        )
+    write = record_writer(output, arguments.format)
+
+    def write_and_flush(record):
+        write(record)
+        # flush once per record only when writing to a pipe or terminal
+        if output is sys.stdout:
+            output.flush()
+
+    runner = Runner(
+        write_and_flush, arguments.chunk_size,
+        arguments.processes or None, arguments.source_policy,
+        arguments.ket_format
+        )
+    start = time.perf_counter()
+    try:
+        for source in arguments.inputs:
+            run_source(runner, source, arguments.qubits)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    summary = dict(runner.counts, seconds=time.perf_counter() - start)
+    print(json.dumps(summary), file=sys.stderr)
+    return 1 if runner.counts['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
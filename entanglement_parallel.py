@@ -0,0 +1,302 @@
+"""
+Multi-core execution of the Entanglement Criteria.
+
+A single Python process only uses one core, so the functions in this module
+split work across a pool of worker processes.  Amplitudes and results are
+passed through shared memory (multiprocessing.shared_memory) rather than
+pickled, so each worker reads its part of the input in place and writes its
+results directly into a shared output array.  Every worker runs the same
+entanglement_array functions as a serial call, on a fixed slice of the input,
+so results are identical to serial runs and always come back in input order.
+
+Two kinds of work are split:
+- parallel_batch_criteria() checks many statevectors, one slice of the batch
+    per task
+- sharded_criteria() checks one very large statevector, one slice (shard) of
+    its 2**n kets per task.  Each shard only needs its own amplitudes plus the
+    n basis ket amplitudes and the zero ket amplitude, and all workers stop as
+    soon as any shard finds a failed check
+
+Small inputs are checked in the calling process, since starting workers costs
+more than the check itself.
+
+Example:
+>>> import numpy as np
+>>> import entanglement_parallel as par
+>>> amplitudes = np.ones((1000, 2**10), dtype=complex)
+>>> witnesses = par.parallel_batch_criteria(amplitudes, 10, processes=4)
+>>> int(witnesses.max())
+-1
+
+See (Entanglement Criteria module)
+See (entanglement_array module)
+"""
+
+import concurrent.futures
+import contextlib
+import mmap
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import entanglement_array
+
+# batches with fewer statevectors are checked in the calling process
+MIN_PARALLEL_BATCH = 64
+
+# number of slices per worker process, so faster workers can take more slices
+SLICES_PER_PROCESS = 4
+
+# statevectors with fewer amplitudes are checked in the calling process
+MIN_SHARDED_SIZE = 2**20
+
+
+# A NumPy array in a new block of shared memory
+# Use as a context manager so the shared memory is always released
+class SharedArray:
+    def __init__(self, shape, dtype) -> None:
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape))*self.dtype.itemsize)
+        self.memory = shared_memory.SharedMemory(create=True, size=size)
+        self.array = np.ndarray(self.shape, self.dtype, buffer=self.memory.buf)
+
+    # Description of the array that worker processes use to attach to it
+    @property
+    def spec(self) -> tuple:
+        return self.memory.name, self.shape, self.dtype.str
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        del self.array
+        self.memory.close()
+        self.memory.unlink()
+
+
+# Description of a memory-mapped array that worker processes can open
+# themselves, so a statevector on disk is never copied into shared memory
+# input:
+#   - array = any array
+# output:
+#   - tuple (filename, offset, shape, dtype) if the array is a memory-mapped
+#       file, otherwise None
+def memmap_spec(array):
+    # only whole mappings: slices of a np.memmap keep the offset of the file
+    if not isinstance(array, np.memmap) or not isinstance(
+        array.base, mmap.mmap
+        ):
+        return None
+    return array.filename, array.offset, array.shape, array.dtype.str
+
+
+# Attach to a SharedArray created by another process
+# The caller must close() the returned shared memory when done.  Only the
+# process that created the block unlinks it.
+# input:
+#   - spec = SharedArray.spec
+# output:
+#   - tuple (memory, array)
+def attach_shared_array(spec) -> tuple:
+    name, shape, dtype = spec
+    memory = shared_memory.SharedMemory(name=name)
+    return memory, np.ndarray(shape, np.dtype(dtype), buffer=memory.buf)
+
+
+# Open the input statevector of a shard worker
+# input:
+#   - spec = SharedArray.spec, or memmap_spec() of a memory-mapped file
+# output:
+#   - tuple (memory, array), where memory is None for a memory-mapped file
+def open_input(spec) -> tuple:
+    if len(spec) == 4:
+        filename, offset, shape, dtype = spec
+        return None, np.memmap(
+            filename, dtype=np.dtype(dtype), mode='r', offset=offset,
+            shape=shape
+            )
+    return attach_shared_array(spec)
+
+
+# Split range(length) into contiguous slices
+# inputs:
+#   - length = number of items
+#   - count = number of slices
+# output:
+#   - list of (start, stop) tuples in increasing order, without empty slices
+def split_range(length: int, count: int) -> list:
+    bounds = np.linspace(0, length, max(1, count) + 1).astype(int).tolist()
+    return [
+        (start, stop) for start, stop in zip(bounds[:-1], bounds[1:])
+        if start < stop
+        ]
+
+
+# Worker: run batch_criteria() on a slice of shared statevectors
+# inputs:
+#   - input_spec = SharedArray.spec of the (batch, 2**n) amplitudes
+#   - output_spec = SharedArray.spec of the (batch,) witness array
+#   - start, stop = range of statevectors to check
+#   - number_qubits
+def _batch_worker(input_spec, output_spec, start, stop, number_qubits) -> None:
+    input_memory, amplitudes = attach_shared_array(input_spec)
+    output_memory, witnesses = attach_shared_array(output_spec)
+    try:
+        witnesses[start:stop] = entanglement_array.batch_criteria(
+            amplitudes[start:stop], number_qubits
+            )
+    finally:
+        del amplitudes, witnesses
+        input_memory.close()
+        output_memory.close()
+
+
+# Entanglement Criteria for many statevectors across worker processes
+# Same inputs and output as entanglement_array.batch_criteria().  The zero ket
+# of every statevector must already have a nonzero amplitude.
+# inputs:
+#   - amplitudes = complex array of shape (batch, 2**number_qubits)
+#   - number_qubits
+#   - (optional) processes = number of worker processes, defaults to the
+#       number of cores
+#   - (optional) min_batch = smallest batch checked in parallel
+#   - (optional) executor = existing concurrent.futures.ProcessPoolExecutor
+#       to reuse instead of starting a new pool
+# output:
+#   - integer array with the first failing non-basis ket of each statevector,
+#       or -1 where every check passes
+def parallel_batch_criteria(amplitudes, number_qubits: int, processes=None,
+                            min_batch=MIN_PARALLEL_BATCH, executor=None
+                            ) -> np.ndarray:
+    if processes is None:
+        processes = os.cpu_count() or 1
+    batch = len(amplitudes)
+
+    # fall back to a serial check for small batches
+    if processes <= 1 or batch < max(min_batch, 2):
+        return entanglement_array.batch_criteria(amplitudes, number_qubits)
+
+    with SharedArray(amplitudes.shape, complex) as shared_input, \
+            SharedArray((batch,), np.int64) as shared_output:
+        shared_input.array[:] = amplitudes
+        slices = split_range(batch, processes*SLICES_PER_PROCESS)
+
+        pool = executor or concurrent.futures.ProcessPoolExecutor(processes)
+        try:
+            futures = [
+                pool.submit(
+                    _batch_worker, shared_input.spec, shared_output.spec,
+                    start, stop, number_qubits
+                    )
+                for start, stop in slices
+                ]
+            for future in futures:
+                future.result()
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+        return shared_output.array.copy()
+
+
+# Worker: run first_violation() on a shard of a shared statevector
+# Before each block the worker checks a shared stop flag, and sets it when it
+# finds a failed check so the other workers can stop early
+# inputs:
+#   - input_spec = SharedArray.spec or memmap_spec() of the 2**n amplitudes
+#   - flag_spec = SharedArray.spec of the one-element stop flag
+#   - start, stop = range of kets to check
+#   - number_qubits
+#   - source_index = ket that maps to the zero ket, 0 for no basis change
+#   - block_size = number of kets per block
+# output:
+#   - index of the first failing ket in the shard, or -1
+def _shard_worker(input_spec, flag_spec, start, stop, number_qubits,
+                  source_index, block_size) -> int:
+    input_memory, amplitudes = open_input(input_spec)
+    flag_memory, flag = attach_shared_array(flag_spec)
+    try:
+        if flag[0]:
+            return -1
+        index = entanglement_array.first_violation(
+            amplitudes, number_qubits, block_size, start, stop, source_index,
+            should_stop=lambda: bool(flag[0])
+            )
+        if index is None:
+            return -1
+        flag[0] = 1
+        return index
+    finally:
+        del amplitudes, flag
+        if input_memory is not None:
+            input_memory.close()
+        flag_memory.close()
+
+
+# Entanglement Criteria for one large statevector across worker processes
+# The 2**n kets are split into shards of whole blocks.  Workers check their
+# shards in parallel and stop once any worker finds a failed check, so the
+# witness is a failing ket but not necessarily the first one; the verdict is
+# always the same as a serial check.  A memory-mapped statevector file is opened
+# by each worker instead of being copied into shared memory.
+# inputs:
+#   - amplitudes = complex array of length 2**number_qubits
+#   - number_qubits
+#   - (optional) processes = number of worker processes, defaults to the
+#       number of cores
+#   - (optional) source_index = ket that maps to the zero ket, 0 for no basis
+#       change (see entanglement_array.iter_range_criteria())
+#   - (optional) block_size = number of kets per block, a power of two
+#   - (optional) min_size = smallest statevector checked in parallel
+#   - (optional) executor = existing concurrent.futures.ProcessPoolExecutor
+#       to reuse instead of starting a new pool
+# output:
+#   - index of a failing non-basis ket, or None if all kets pass
+def sharded_criteria(amplitudes, number_qubits: int, processes=None,
+                     source_index=0, block_size=entanglement_array.BLOCK_SIZE,
+                     min_size=MIN_SHARDED_SIZE, executor=None):
+    if processes is None:
+        processes = os.cpu_count() or 1
+    size = 2**number_qubits
+    blocks = -(-size//block_size)
+
+    # fall back to a serial check for small statevectors
+    if processes <= 1 or size < min_size or blocks < 2:
+        return entanglement_array.first_violation(
+            amplitudes, number_qubits, block_size, source_index=source_index
+            )
+
+    input_spec = memmap_spec(amplitudes)
+    with contextlib.ExitStack() as stack:
+        if input_spec is None:
+            shared_input = stack.enter_context(SharedArray((size,), complex))
+            shared_input.array[:] = amplitudes
+            input_spec = shared_input.spec
+        shared_flag = stack.enter_context(SharedArray((1,), np.int8))
+        shared_flag.array[0] = 0
+        shards = [
+            (start*block_size, min(stop*block_size, size))
+            for start, stop in split_range(blocks, processes*SLICES_PER_PROCESS)
+            ]
+
+        pool = executor or concurrent.futures.ProcessPoolExecutor(processes)
+        try:
+            futures = [
+                pool.submit(
+                    _shard_worker, input_spec, shared_flag.spec,
+                    start, stop, number_qubits, source_index, block_size
+                    )
+                for start, stop in shards
+                ]
+            witnesses = [future.result() for future in futures]
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+    # reduce the partial verdicts
+    found = [index for index in witnesses if index >= 0]
+    if found:
+        return min(found)
+    return None
@@ -0,0 +1,654 @@
+"""
+Compact output of Entangled.entangled().
+
+An EntanglementResult holds the outcome of the entanglement criteria for one
+statevector in a few arrays instead of one dictionary per non-basis ket:
+1. 'number_qubits'
+2. 'entangled', the verdict: True if any non-basis ket fails the check
+3. 'target_amplitudes', a complex array of length 2**number_qubits indexed by
+    ket.  Non-basis kets hold the product of their basis ket amplitudes; the
+    zero ket and the basis kets hold their own (normalized) amplitudes
+4. 'equality_bits', the equality checks of all kets packed eight to a byte
+    (little-endian bit order, see numpy.packbits()).  The zero ket and the
+    basis kets always pass
+5. 'witness', the first non-basis ket that fails the check, or None
+
+Basis ket decompositions are not stored in the result; they are read from the
+DecompositionIndex of its number of qubits when the result was built with one
+(as Entangled does, see decomposition_index module), and are otherwise derived
+from the bits of the ket.  At n = 20 this is about 17 MB per result, instead of
+a million dictionaries and several million strings.
+
+EntanglementResult is a read-only mapping with the same keys and values as the
+dictionary entangled() used to return, so existing code that reads
+result[ket]['equality'] keeps working, and to_dict() builds that dictionary:
+>>> result = x.entangled(my_statevector)
+|Psi> is Entangled
+>>> result
+<EntanglementResult: 4 qubits, Entangled, 11 of 11 non-basis kets fail>
+>>> result['0011']
+{'basis_kets': ['0010', '0001'], 'target_amplitude': (0.375+0j),
+'equality': False}
+>>> result.to_dict() == {ket: result[ket] for ket in result}
+True
+
+SparseEntanglementResult is the output of the 'sparse' engine, the same
+mapping built from the support of the statevector (see entanglement_sparse
+module).  Results of single kets are computed when they are looked up, so a 40
+qubit state with two nonzero amplitudes takes a few hundred bytes:
+>>> s = entang.Entangled(40, engine='sparse')
+>>> result = s.entangled({'0'*40: 1, '1'*40: 1})
+|Psi> is Entangled
+>>> result
+<SparseEntanglementResult: 40 qubits, Entangled, 2 kets in the support>
+>>> result.witness
+'1111111111111111111111111111111111111111'
+
+Results are archived with save_result() in a binary record: a short header
+(the number of qubits, the verdict and the witness) followed by the arrays as
+raw bytes, so writing one is a copy of its arrays.  load_result() memory-maps
+the arrays back without reading them, and records written one after another
+to a stream are read back with iter_results().  JSON output is only for small
+results (up to JSON_MAX_QUBITS qubits):
+>>> entanglement_result.save_result(result, 'result.ent')
+>>> entanglement_result.load_result('result.ent')
+<EntanglementResult: 4 qubits, Entangled, 11 of 11 non-basis kets fail>
+>>> entanglement_result.save_result(result, 'result.json', 'json')
+
+See (Entanglement Criteria module)
+"""
+
+import json
+import os
+from collections.abc import Mapping
+
+import numpy as np
+
+import entanglement_array
+import entanglement_sparse
+
+
+# Read-only mapping from non-basis kets to their results, shared by
+# EntanglementResult and SparseEntanglementResult
+class KetResults(Mapping):
+    __slots__ = ('number_qubits', 'ket_format', 'entangled', '_witness')
+
+    # The first non-basis ket that fails the check, or None
+    @property
+    def witness(self):
+        if self._witness < 0:
+            return None
+        return self.ket(self._witness)
+
+    # Convert a ket index to a key in the ket format of this result
+    def ket(self, index: int):
+        if self.ket_format == 'int':
+            return int(index)
+        return format(int(index), '0'+str(self.number_qubits)+'b')
+
+    # Convert a key in either ket format to a ket index
+    def index(self, ket) -> int:
+        if isinstance(ket, str):
+            if len(ket) != self.number_qubits:
+                raise KeyError(ket)
+            return int(ket, 2)
+        return int(ket)
+
+    # Basis ket decomposition of a ket, derived from its set bits
+    # input:
+    #   - ket = bitstring or decimal ket
+    # output:
+    #   - list of basis kets, from the leftmost bit
+    def decomposition(self, ket) -> list:
+        index = self.index(ket)
+        return [
+            self.ket(1 << bit) for bit in reversed(range(self.number_qubits))
+            if index >> bit & 1
+            ]
+
+    # Index of a non-basis ket, raising KeyError for any other key
+    def _non_basis_index(self, ket) -> int:
+        try:
+            index = self.index(ket)
+        except ValueError:
+            raise KeyError(ket) from None
+        if not 0 < index < 2**self.number_qubits or not index & (index - 1):
+            raise KeyError(ket)
+        return index
+
+    # Non-basis kets in increasing order
+    def __iter__(self):
+        for index in range(3, 2**self.number_qubits):
+            if index & (index - 1):
+                yield self.ket(index)
+
+    def __len__(self) -> int:
+        return 2**self.number_qubits - self.number_qubits - 1
+
+
+class EntanglementResult(KetResults):
+    __slots__ = ('target_amplitudes', 'equality_bits', 'decompositions')
+
+    # inputs:
+    #   - number_qubits
+    #   - target_amplitudes = complex array of length 2**number_qubits
+    #   - equality = boolean array of equality checks of length
+    #       2**number_qubits; the checks of the zero ket and basis kets are
+    #       ignored and stored as True
+    #   - (optional) ket_format = 'str' for bitstring keys or 'int' for
+    #       decimal keys, as in Entangled
+    #   - (optional) decompositions = DecompositionIndex of number_qubits to
+    #       read basis ket decompositions from, None to derive them from bits
+    def __init__(self, number_qubits: int, target_amplitudes, equality,
+                 ket_format='str', decompositions=None) -> None:
+        # only non-basis kets decide the verdict; the zero ket and the basis
+        # kets pass whatever their checks hold
+        equality = np.asarray(equality, dtype=bool) | ~(
+            entanglement_array.non_basis_mask(number_qubits)
+            )
+        failed = np.flatnonzero(~equality)
+
+        self.number_qubits = number_qubits
+        self.ket_format = ket_format
+        self.target_amplitudes = np.asarray(target_amplitudes, dtype=complex)
+        self.equality_bits = np.packbits(equality, bitorder='little')
+        self.decompositions = decompositions
+        self.entangled = len(failed) > 0
+        self._witness = int(failed[0]) if len(failed) else -1
+
+    # Build a result from arrays without repacking the equality checks
+    # inputs:
+    #   - number_qubits, target_amplitudes, ket_format, decompositions = see
+    #       __init__()
+    #   - equality_bits = packed equality checks, see numpy.packbits()
+    #   - witness = index of the first failing ket, or -1
+    # output:
+    #   - EntanglementResult
+    @classmethod
+    def from_packed(cls, number_qubits: int, target_amplitudes, equality_bits,
+                    witness: int, ket_format='str', decompositions=None):
+        result = cls.__new__(cls)
+        result.number_qubits = number_qubits
+        result.ket_format = ket_format
+        result.target_amplitudes = target_amplitudes
+        result.equality_bits = equality_bits
+        result.decompositions = decompositions
+        result.entangled = witness >= 0
+        result._witness = witness
+        return result
+
+    # Total size of the arrays in bytes
+    @property
+    def nbytes(self) -> int:
+        return self.target_amplitudes.nbytes + self.equality_bits.nbytes
+
+    # Basis ket decomposition of a ket, read from the decomposition index
+    # when there is one
+    # input:
+    #   - ket = bitstring or decimal ket
+    # output:
+    #   - list of basis kets, from the leftmost bit
+    def decomposition(self, ket) -> list:
+        index = self.index(ket)
+        if self.decompositions is None or not index & (index - 1):
+            return super().decomposition(index)
+        return [
+            self.ket(basis)
+            for basis in self.decompositions.decomposition(index)
+            ]
+
+    # Equality checks of all kets, unpacked
+    # output:
+    #   - boolean array of length 2**number_qubits, indexed by ket
+    def equality(self) -> np.ndarray:
+        return np.unpackbits(
+            self.equality_bits, count=2**self.number_qubits, bitorder='little'
+            ).astype(bool)
+
+    # Indices of the non-basis kets that fail the check
+    # output:
+    #   - integer array in increasing order
+    def failing_kets(self) -> np.ndarray:
+        return np.flatnonzero(~self.equality())
+
+    # Result of a single non-basis ket, in the format of entangled()
+    def __getitem__(self, ket) -> dict:
+        index = self._non_basis_index(ket)
+        return {
+            'basis_kets': self.decomposition(index),
+            'target_amplitude': self.target_amplitudes[index].item(),
+            'equality': bool(
+                self.equality_bits[index >> 3] >> (index & 7) & 1
+                )
+            }
+
+    def __repr__(self) -> str:
+        verdict = "Entangled" if self.entangled else "not Entangled"
+        failed = int(np.count_nonzero(~self.equality()))
+        return (
+            f"<EntanglementResult: {self.number_qubits} qubits, {verdict}, "
+            f"{failed} of {len(self)} non-basis kets fail>"
+            )
+
+    # Convert to the nested dictionary that entangled() used to return
+    # output:
+    #   - dictionary, where:
+    #       - keys: all non-basis kets
+    #       - values: dictionaries containing:
+    #           - corresponding basis kets
+    #           - target amplitude (product of basis ket amplitudes)
+    #           - boolean equality check
+    def to_dict(self) -> dict:
+        equality = self.equality().tolist()
+        targets = self.target_amplitudes.tolist()
+        if self.decompositions is None:
+            decompositions = (self.decomposition(index) for index in self)
+        else:
+            # read the index one block at a time, see decomposition_index
+            top = self.number_qubits - 1
+            decompositions = self.decompositions.iter_decompositions([
+                self.ket(1 << (top - position))
+                for position in range(self.number_qubits)
+                ])
+        return {
+            ket: {
+                'basis_kets': decomposition,
+                'target_amplitude': targets[index],
+                'equality': equality[index]
+                }
+            for ket, index, decomposition in zip(
+                self, entanglement_array.non_basis_indices(
+                    self.number_qubits
+                    ).tolist(),
+                decompositions
+                )
+            }
+
+
+class SparseEntanglementResult(KetResults):
+    __slots__ = ('indices', 'amplitudes', 'basis_amplitudes', 'targets')
+
+    # inputs:
+    #   - number_qubits
+    #   - indices, amplitudes, basis_amplitudes, targets, equality = output
+    #       of entanglement_sparse.criteria()
+    #   - witness = index of the first failing non-basis ket, or None
+    #   - (optional) ket_format = see EntanglementResult
+    def __init__(self, number_qubits: int, indices, amplitudes,
+                 basis_amplitudes, targets, witness, ket_format='str'
+                 ) -> None:
+        self.number_qubits = number_qubits
+        self.ket_format = ket_format
+        self.indices = indices
+        self.amplitudes = amplitudes
+        self.basis_amplitudes = basis_amplitudes
+        self.targets = targets
+        self.entangled = witness is not None
+        self._witness = -1 if witness is None else int(witness)
+
+    # Total size of the arrays in bytes
+    @property
+    def nbytes(self) -> int:
+        return (
+            self.indices.nbytes + self.amplitudes.nbytes
+            + self.basis_amplitudes.nbytes + self.targets.nbytes
+            )
+
+    # Non-basis kets of the support that fail the check (other failing kets
+    # have amplitude 0 and a nonzero target)
+    # output:
+    #   - integer array in increasing order
+    def failing_support(self) -> np.ndarray:
+        failed = (self.amplitudes != self.targets) & (
+            (self.indices & (self.indices - 1)) != 0
+            )
+        return self.indices[failed]
+
+    # Result of a single non-basis ket, in the format of entangled()
+    def __getitem__(self, ket) -> dict:
+        index = self._non_basis_index(ket)
+        amplitude = entanglement_sparse.lookup(
+            self.indices, self.amplitudes, [index]
+            )[0]
+        target = entanglement_sparse.target_amplitudes(
+            [index], self.basis_amplitudes
+            )[0]
+        return {
+            'basis_kets': self.decomposition(index),
+            'target_amplitude': target.item(),
+            'equality': bool(amplitude == target)
+            }
+
+    def __repr__(self) -> str:
+        verdict = "Entangled" if self.entangled else "not Entangled"
+        return (
+            f"<SparseEntanglementResult: {self.number_qubits} qubits, "
+            f"{verdict}, {len(self.indices)} kets in the support>"
+            )
+
+    # Convert to the nested dictionary that entangled() used to return, one
+    # entry per non-basis ket (only practical for small states)
+    def to_dict(self) -> dict:
+        return {ket: self[ket] for ket in self}
+
+
+# Binary records of results
+# A record is laid out as:
+#   - RECORD_MAGIC
+#   - length of the header in bytes, as a little-endian uint64
+#   - header, JSON text holding the class, number of qubits, verdict, witness
+#       and the dtype, shape and offset of each array, padded with spaces to a
+#       multiple of RECORD_ALIGNMENT
+#   - arrays, as raw bytes, each padded with zeros to a multiple of
+#       RECORD_ALIGNMENT
+# Array offsets are from the end of the header, so records can be
+# concatenated.
+RECORD_MAGIC = b'ENTRES\x01\x00'
+RECORD_ALIGNMENT = 64
+RESULT_ARRAYS = {
+    'EntanglementResult': ('target_amplitudes', 'equality_bits'),
+    'SparseEntanglementResult': (
+        'indices', 'amplitudes', 'basis_amplitudes', 'targets'
+        )
+    }
+RESULT_FORMATS = ('binary', 'json')
+# largest number of qubits of a result written as JSON
+JSON_MAX_QUBITS = 12
+
+
+# Number of zero bytes that pad size to a multiple of RECORD_ALIGNMENT
+def _padding(size: int) -> int:
+    return -size % RECORD_ALIGNMENT
+
+
+# Write a result as a binary record to an open binary stream
+# inputs:
+#   - stream = binary stream, e.g. open(path, 'wb') or one record after another
+#       to open(path, 'ab')
+#   - result = EntanglementResult or SparseEntanglementResult
+# output:
+#   - number of bytes written
+def write_result(stream, result) -> int:
+    kind = type(result).__name__
+    if kind not in RESULT_ARRAYS:
+        raise TypeError(f"cannot write a {kind}")
+    arrays = {
+        name: np.ascontiguousarray(getattr(result, name))
+        for name in RESULT_ARRAYS[kind]
+        }
+    header = {
+        'class': kind,
+        'number_qubits': result.number_qubits,
+        'ket_format': result.ket_format,
+        'entangled': bool(result.entangled),
+        'witness': result._witness,
+        'arrays': {
+            name: {'dtype': array.dtype.str, 'shape': list(array.shape)}
+            for name, array in arrays.items()
+            }
+        }
+
+    offset = 0
+    for spec, array in zip(header['arrays'].values(), arrays.values()):
+        spec['offset'] = offset
+        offset += array.nbytes + _padding(array.nbytes)
+    text = json.dumps(header).encode()
+    prefix = len(RECORD_MAGIC) + 8
+    text += b' '*_padding(prefix + len(text))
+
+    stream.write(RECORD_MAGIC)
+    stream.write(len(text).to_bytes(8, 'little'))
+    stream.write(text)
+    for array in arrays.values():
+        stream.write(memoryview(array).cast('B'))
+        stream.write(bytes(_padding(array.nbytes)))
+    return prefix + len(text) + offset
+
+
+# Write an EntanglementResult record one block of kets at a time
+# The arrays are memory-mapped from the file and each block is written into
+# them, so building a result of 2**n kets only holds one block in memory.  The
+# header is written last, once the verdict and the witness are known, in
+# space reserved for the largest witness.
+# Example:
+# >>> writer = entanglement_result.ResultWriter('result.ent', 20)
+# >>> for start, targets, equality in blocks:
+# ...     writer.write_block(start, targets, equality)
+# >>> result = writer.close()
+class ResultWriter:
+    # inputs:
+    #   - path = path of the record file, replaced if it exists
+    #   - number_qubits
+    #   - (optional) ket_format = see EntanglementResult
+    def __init__(self, path, number_qubits: int, ket_format='str') -> None:
+        size = 2**number_qubits
+        self.path = path
+        self.number_qubits = number_qubits
+        self.ket_format = ket_format
+        self.witness = -1
+
+        self.header = {
+            'class': 'EntanglementResult',
+            'number_qubits': number_qubits,
+            'ket_format': ket_format,
+            'entangled': False,
+            'witness': size,
+            'arrays': {
+                'target_amplitudes': {
+                    'dtype': '<c16', 'shape': [size], 'offset': 0
+                    },
+                'equality_bits': {
+                    'dtype': '|u1', 'shape': [-(-size//8)],
+                    'offset': 16*size + _padding(16*size)
+                    }
+                }
+            }
+        # the header is the longest with entangled False and the largest
+        # witness, so it always fits in the space reserved here
+        prefix = len(RECORD_MAGIC) + 8
+        length = len(json.dumps(self.header).encode())
+        self.header_length = length + _padding(prefix + length)
+        self.data = prefix + self.header_length
+
+        bits = self.header['arrays']['equality_bits']
+        end = self.data + bits['offset'] + bits['shape'][0]
+        with open(path, 'wb') as stream:
+            stream.truncate(end + _padding(end))
+        self.target_amplitudes = np.memmap(
+            path, dtype='<c16', mode='r+', offset=self.data, shape=(size,)
+            )
+        self.equality_bits = np.memmap(
+            path, dtype=np.uint8, mode='r+',
+            offset=self.data + bits['offset'], shape=tuple(bits['shape'])
+            )
+
+    # Write the results of a block of kets; blocks are written in increasing
+    # order of kets
+    # inputs:
+    #   - start = first ket of the block, a multiple of 8 (blocks of
+    #       entanglement_array.iter_range_criteria() always are)
+    #   - targets, equality = target amplitudes and equality checks of the
+    #       kets of the block; checks of the zero ket and basis kets are
+    #       ignored, see EntanglementResult
+    def write_block(self, start: int, targets, equality) -> None:
+        if start % 8:
+            raise ValueError(
+                f"blocks must start at a multiple of 8, got {start}"
+                )
+        stop = start + len(targets)
+        non_basis = entanglement_array.non_basis_mask(
+            self.number_qubits, start, stop
+            )
+        equality = np.asarray(equality, dtype=bool) | ~non_basis
+        if self.witness < 0 and not equality.all():
+            self.witness = start + int(np.argmin(equality))
+
+        self.target_amplitudes[start:stop] = targets
+        self.equality_bits[start//8:start//8 + -(-len(equality)//8)] = (
+            np.packbits(equality, bitorder='little')
+            )
+
+    # Write the header and map the finished record back read-only
+    # output:
+    #   - EntanglementResult, see load_result()
+    def close(self):
+        self.target_amplitudes.flush()
+        self.equality_bits.flush()
+        del self.target_amplitudes, self.equality_bits
+
+        header = dict(
+            self.header, entangled=self.witness >= 0, witness=self.witness
+            )
+        text = json.dumps(header).encode()
+        text += b' '*(self.header_length - len(text))
+        with open(self.path, 'r+b') as stream:
+            stream.write(RECORD_MAGIC)
+            stream.write(len(text).to_bytes(8, 'little'))
+            stream.write(text)
+        return load_result(self.path)
+
+
+# Read the header of the record at an offset of a file
+# inputs:
+#   - stream = binary stream of the file
+#   - offset = start of the record
+# output:
+#   - header dictionary
+#   - offset of the end of the header, where the arrays start
+def _read_header(stream, offset: int) -> tuple:
+    stream.seek(offset)
+    prefix = stream.read(len(RECORD_MAGIC) + 8)
+    if len(prefix) < 16 or prefix[:len(RECORD_MAGIC)] != RECORD_MAGIC:
+        raise ValueError(f"no result record at byte {offset}")
+    length = int.from_bytes(prefix[len(RECORD_MAGIC):], 'little')
+    header = json.loads(stream.read(length))
+    if header.get('class') not in RESULT_ARRAYS:
+        raise ValueError(f"unknown result class {header.get('class')!r}")
+    return header, offset + len(prefix) + length
+
+
+# Build a result from a record header and its arrays
+def _from_record(header, arrays, ket_format):
+    number_qubits = header['number_qubits']
+    witness = header['witness']
+    if header['class'] == 'EntanglementResult':
+        return EntanglementResult.from_packed(
+            number_qubits, arrays['target_amplitudes'],
+            arrays['equality_bits'], witness, ket_format
+            )
+    return SparseEntanglementResult(
+        number_qubits, arrays['indices'], arrays['amplitudes'],
+        arrays['basis_amplitudes'], arrays['targets'],
+        None if witness < 0 else witness, ket_format
+        )
+
+
+# Read the record at an offset of a file
+# inputs:
+#   - path = path of the file
+#   - (optional) offset = start of the record
+#   - (optional) ket_format = ket format of the result, defaults to the one it
+#       was written with
+#   - (optional) mmap = True to memory-map the arrays read-only (nothing is
+#       read until a ket is looked up), False to read them into memory
+# output:
+#   - tuple (result, offset of the next record)
+def read_result(path, offset=0, ket_format=None, mmap=True) -> tuple:
+    with open(path, 'rb') as stream:
+        header, data = _read_header(stream, offset)
+        size = os.fstat(stream.fileno()).st_size
+
+        specs = {}
+        end = data
+        for name in RESULT_ARRAYS[header['class']]:
+            spec = header['arrays'][name]
+            dtype = np.dtype(spec['dtype'])
+            shape = tuple(spec['shape'])
+            start = data + spec['offset']
+            nbytes = int(np.prod(shape))*dtype.itemsize
+            specs[name] = dtype, shape, start
+            end = max(end, start + nbytes + _padding(nbytes))
+        if end > size:
+            raise ValueError(f"result record at byte {offset} is truncated")
+
+        arrays = {}
+        for name, (dtype, shape, start) in specs.items():
+            if mmap and np.prod(shape):
+                arrays[name] = np.memmap(
+                    path, dtype=dtype, mode='r', offset=start, shape=shape
+                    )
+            else:
+                stream.seek(start)
+                arrays[name] = np.fromfile(
+                    stream, dtype=dtype, count=int(np.prod(shape))
+                    ).reshape(shape)
+
+    result = _from_record(
+        header, arrays, ket_format or header.get('ket_format', 'str')
+        )
+    return result, end
+
+
+# Memory-map the first result of a file, see read_result()
+def load_result(path, ket_format=None, mmap=True):
+    return read_result(path, 0, ket_format, mmap)[0]
+
+
+# Results of a file of records written one after another, see read_result()
+# output:
+#   - generator of results, in the order they were written
+def iter_results(path, ket_format=None, mmap=True):
+    offset = 0
+    size = os.path.getsize(path)
+    while offset < size:
+        result, offset = read_result(path, offset, ket_format, mmap)
+        yield result
+
+
+# Convert a small result to JSON-compatible types, complex numbers as
+# [real, imaginary] pairs
+# input:
+#   - result = EntanglementResult or SparseEntanglementResult of at most
+#       JSON_MAX_QUBITS qubits
+# output:
+#   - dictionary with 'number_qubits', 'entangled', 'witness' and 'kets', the
+#       dictionary of to_dict()
+def result_json(result) -> dict:
+    if result.number_qubits > JSON_MAX_QUBITS:
+        raise ValueError(
+            f"JSON output is for results of up to {JSON_MAX_QUBITS} qubits, "
+            f"got {result.number_qubits}; use the binary format"
+            )
+    kets = {}
+    for ket, value in result.to_dict().items():
+        target = value['target_amplitude']
+        kets[str(ket)] = dict(
+            value, target_amplitude=[target.real, target.imag]
+            )
+    return {
+        'number_qubits': result.number_qubits,
+        'entangled': bool(result.entangled),
+        'witness': result.witness,
+        'kets': kets
+        }
+
+
+# Save a result to a file
+# inputs:
+#   - result = EntanglementResult or SparseEntanglementResult
+#   - path = path of the file
+#   - (optional) output_format = 'binary' for a record read back with
+#       load_result(), or 'json' for small results, see result_json()
+def save_result(result, path, output_format='binary') -> None:
+    if output_format == 'json':
+        document = result_json(result)
+        with open(path, 'w') as stream:
+            json.dump(document, stream)
+    elif output_format == 'binary':
+        with open(path, 'wb') as stream:
+            write_result(stream, result)
+    else:
+        raise ValueError(
+            f"output_format must be one of {RESULT_FORMATS}, "
+            f"got {output_format!r}"
+            )
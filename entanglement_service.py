@@ -0,0 +1,667 @@
+"""
+Local asyncio service for the Entanglement Criteria.
+
+An EntanglementService answers is_entangled() requests over a TCP socket, one
+JSON object per line in each direction (JSON lines), and keeps a warm Entangled
+object per qubit count, so the kets and basis kets are never rebuilt and
+nothing is printed:
+- requests for the same qubit count that arrive within max_delay seconds of
+    each other are coalesced into one entangled_batch() call of at most
+    max_batch statevectors
+- the criteria runs in an executor (a thread pool by default), so the event
+    loop keeps reading requests while a batch is checked
+- at most max_pending requests are queued or running; any more are answered
+    at once with an 'overloaded' error, and replies are written with
+    StreamWriter.drain(), so a client that does not read its replies stops
+    being read from
+- statevectors given by their nonzero kets as 'indices' and 'values' are
+    checked one at a time with the 'sparse' engine, for up to 63 qubits
+
+Requests:
+{"id": 1, "number_qubits": 2, "amplitudes": [[0.5, 0], [0.5, 0], ...]}
+{"id": 2, "number_qubits": 2, "statevector": {"00": [1, 0], "11": [1, 0]}}
+{"id": 3, "number_qubits": 2, "data": "AAAAAAAA8D8AAAAAAAAAAA..."}
+{"id": 4, "number_qubits": 40, "indices": [0, 1099511627775],
+ "values": [[1, 0], [1, 0]]}
+{"id": 5, "method": "stats"}
+Statevectors are encoded as in the statevector_codec module; "data", the base64
+encoded bytes of a complex128 array, is the fastest (EntanglementClient uses
+it).  "id" is any JSON value, returned with the reply so clients can
+pipeline requests.
+
+Replies:
+{"id": 1, "entangled": false, "witness": null}
+{"id": 2, "entangled": true, "witness": "11"}
+{"id": 6, "error": "overloaded", "overloaded": true}
+{"id": 5, "stats": {"requests": 4, "batches": 1, ...}}
+
+Everything runs on localhost, and EntanglementClient and load_test() drive a
+server for tests and load tests:
+$ python entanglement_service.py serve --port 8765
+$ python entanglement_service.py load --port 8765 --qubits 10 --requests 10000
+
+>>> import asyncio, entanglement_service as service
+>>> async def demo():
+...     server = service.EntanglementService()
+...     host, port = await server.start()
+...     client = await service.EntanglementClient.connect(host, port)
+...     reply = await client.check(2, [1, 0, 0, 1])
+...     await client.close()
+...     await server.close()
+...     return reply
+>>> asyncio.run(demo())
+{'id': 0, 'entangled': True, 'witness': '11'}
+
+See (Entanglement Criteria module)
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import itertools
+import json
+import statistics
+import sys
+import time
+
+import numpy as np
+
+import create_statevector
+import entanglement_array
+import entanglement_class
+import entanglement_sparse
+import statevector_codec
+from statevector_codec import (
+    decode_amplitudes, decode_data, decode_indices, encode_amplitudes,
+    encode_data
+    )
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+# largest request line in bytes, about a 20 qubit statevector of [re, im] pairs
+MAX_LINE_BYTES = 2**26
+
+
+# Raised by EntanglementService.check() when max_pending requests are already
+# queued or running
+class Overloaded(Exception):
+    pass
+
+
+# Check the qubit count of a request
+# inputs:
+#   - number_qubits
+#   - largest = largest qubit count allowed
+def check_qubits(number_qubits: int, largest: int) -> None:
+    if not 0 < number_qubits <= largest:
+        raise ValueError(
+            f"number_qubits must be between 1 and {largest}, got "
+            f"{number_qubits}"
+            )
+
+
+class EntanglementService:
+    # inputs:
+    #   - (optional) max_batch = largest number of statevectors per batch
+    #   - (optional) max_delay = seconds a request waits for others to join
+    #       its batch
+    #   - (optional) max_pending = largest number of requests queued or
+    #       running before new ones are rejected
+    #   - (optional) max_qubits = largest qubit count of amplitude and
+    #       statevector requests (sparse requests allow up to
+    #       entanglement_sparse.MAX_QUBITS)
+    #   - (optional) executor = concurrent.futures executor for the criteria,
+    #       None for the default thread pool of the event loop
+    #   - (optional) processes = worker processes per batch, see
+    #       Entangled.entangled_batch()
+    #   - (optional) source_policy = source policy of the Entangled objects;
+    #       'interactive' is not allowed, since nobody can answer the prompt
+    #   - (optional) ket_format = ket format of the witnesses
+    #   - (optional) instrumentation = instrumentation.Instrumentation shared
+    #       by the Entangled objects
+    def __init__(self, max_batch=256, max_delay=0.002, max_pending=4096,
+                 max_qubits=20, executor=None, processes=1,
+                 source_policy='first', ket_format='str',
+                 instrumentation=None) -> None:
+        if source_policy == 'interactive':
+            raise ValueError(
+                "the service cannot use source_policy='interactive'"
+                )
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.max_qubits = max_qubits
+        self.executor = executor
+        self.processes = processes
+        self.source_policy = source_policy
+        self.ket_format = ket_format
+        self.instrumentation = instrumentation
+
+        # warm Entangled objects, keyed by (engine, number_qubits)
+        self._checkers = {}
+        # queue and batching task per qubit count
+        self._queues = {}
+        self._batchers = {}
+        self._server = None
+        # open connections, closed by close()
+        self._connections = {}
+        self.pending = 0
+        self.counters = dict.fromkeys(
+            ('requests', 'batches', 'batched_statevectors', 'sparse',
+             'overloaded', 'errors'),
+            0
+            )
+
+    # Warm Entangled object for an engine and a qubit count
+    def checker(self, number_qubits: int, engine='numpy'):
+        key = engine, number_qubits
+        if key not in self._checkers:
+            self._checkers[key] = entanglement_class.Entangled(
+                number_qubits, engine=engine, ket_format=self.ket_format,
+                source_policy=self.source_policy,
+                instrumentation=self.instrumentation
+                )
+        return self._checkers[key]
+
+    # Check one statevector, coalesced with concurrent checks of the same
+    # qubit count
+    # inputs:
+    #   - number_qubits
+    #   - amplitudes = complex array of length 2**number_qubits
+    # output:
+    #   - tuple (entangled, witness), as Entangled.is_entangled()
+    async def check(self, number_qubits: int, amplitudes) -> tuple:
+        check_qubits(number_qubits, self.max_qubits)
+        amplitudes = entanglement_array.statevector_array(
+            amplitudes, number_qubits
+            )
+        if not np.any(amplitudes):
+            raise ValueError("statevector has no nonzero amplitudes")
+
+        async with self._slot():
+            future = asyncio.get_running_loop().create_future()
+            self._queue(number_qubits).put_nowait((amplitudes, future))
+            return await future
+
+    # Check one statevector given by its nonzero kets, with the 'sparse'
+    # engine in the executor
+    # inputs:
+    #   - number_qubits
+    #   - indices, values = kets with nonzero amplitudes and their amplitudes;
+    #       indices are checked with decode_indices()
+    # output:
+    #   - tuple (entangled, witness), as Entangled.is_entangled()
+    async def check_sparse(self, number_qubits: int, indices, values
+                           ) -> tuple:
+        # checked before a checker is created, so requests cannot grow the
+        # warm checkers without bound
+        check_qubits(number_qubits, entanglement_sparse.MAX_QUBITS)
+        indices = decode_indices(indices, number_qubits)
+        checker = self.checker(number_qubits, 'sparse')
+        async with self._slot():
+            self.counters['sparse'] += 1
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, checker.is_entangled, (indices, values)
+                )
+
+    # Reserve one of max_pending places for a request
+    # output:
+    #   - async context manager; raises Overloaded if no place is free
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        if self.pending >= self.max_pending:
+            self.counters['overloaded'] += 1
+            raise Overloaded()
+        self.pending += 1
+        self.counters['requests'] += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+    # Queue of a qubit count, starting its batching task on first use
+    def _queue(self, number_qubits: int) -> asyncio.Queue:
+        if number_qubits not in self._queues:
+            self._queues[number_qubits] = asyncio.Queue()
+            self._batchers[number_qubits] = asyncio.create_task(
+                self._batcher(number_qubits)
+                )
+        return self._queues[number_qubits]
+
+    # Collect queued checks of one qubit count into batches and run them;
+    # when the task is cancelled, the checks of the current batch are too
+    async def _batcher(self, number_qubits: int) -> None:
+        queue = self._queues[number_qubits]
+        checker = self.checker(number_qubits)
+        while True:
+            batch = []
+            try:
+                await self._collect(queue, batch)
+                # requests whose client went away are not checked
+                batch = [item for item in batch if not item[1].done()]
+                if batch:
+                    await self._run_batch(checker, batch)
+            except asyncio.CancelledError:
+                for _, future in batch:
+                    future.cancel()
+                raise
+
+    # Add queued checks to a batch, waiting at most max_delay after the first
+    # one for others to arrive
+    # inputs:
+    #   - queue = queue of (amplitudes, future) of one qubit count
+    #   - batch = list to add the checks to
+    async def _collect(self, queue, batch) -> None:
+        loop = asyncio.get_running_loop()
+        batch.append(await queue.get())
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                return
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                return
+
+    # Check a batch with entangled_batch() in the executor and resolve the
+    # futures of its checks
+    # inputs:
+    #   - checker = warm Entangled object of the qubit count
+    #   - batch = list of (amplitudes, future)
+    async def _run_batch(self, checker, batch) -> None:
+        amplitudes = np.stack([item[0] for item in batch])
+        self.counters['batches'] += 1
+        self.counters['batched_statevectors'] += len(batch)
+        run = functools.partial(
+            checker.entangled_batch, amplitudes, witnesses=True,
+            processes=self.processes
+            )
+        try:
+            verdicts, witnesses = await asyncio.get_running_loop(
+                ).run_in_executor(self.executor, run)
+        except Exception as exception:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exception)
+            return
+        for (_, future), verdict, witness in zip(
+            batch, verdicts.tolist(), witnesses
+            ):
+            if not future.done():
+                future.set_result((verdict, witness))
+
+    # Answer one decoded request
+    # input:
+    #   - request = dictionary, see the module docstring
+    # output:
+    #   - reply dictionary
+    async def handle(self, request) -> dict:
+        reply = {'id': request.get('id')}
+        try:
+            if request.get('method', 'is_entangled') == 'stats':
+                reply['stats'] = self.stats()
+                return reply
+            if request.get('method', 'is_entangled') != 'is_entangled':
+                raise ValueError(f"unknown method {request.get('method')!r}")
+
+            number_qubits = int(request['number_qubits'])
+            if 'indices' in request:
+                verdict, witness = await self.check_sparse(
+                    number_qubits, request['indices'],
+                    decode_amplitudes(request['values'])
+                    )
+            elif 'data' in request:
+                verdict, witness = await self.check(
+                    number_qubits, decode_data(request['data'])
+                    )
+            elif 'statevector' in request:
+                statevector = statevector_codec.decode_kets(
+                    request['statevector']
+                    )
+                verdict, witness = await self.check(
+                    number_qubits, entanglement_array.statevector_array(
+                        statevector, number_qubits
+                        )
+                    )
+            else:
+                verdict, witness = await self.check(
+                    number_qubits, decode_amplitudes(request['amplitudes'])
+                    )
+        except Overloaded:
+            reply.update(error='overloaded', overloaded=True)
+        except statevector_codec.DECODE_ERRORS as exception:
+            self.counters['errors'] += 1
+            reply['error'] = f"{type(exception).__name__}: {exception}"
+        except Exception as exception:
+            # any other failure still gets a reply, so no client waits forever
+            self.counters['errors'] += 1
+            reply['error'] = (
+                f"internal error: {type(exception).__name__}: {exception}"
+                )
+        else:
+            reply.update(entangled=verdict, witness=witness)
+        return reply
+
+    # Serve one connection: each line is handled in its own task, so replies
+    # may come back in a different order than the requests
+    async def _connection(self, reader, writer) -> None:
+        lock = asyncio.Lock()
+        tasks = set()
+        self._connections[writer] = asyncio.current_task()
+
+        async def answer(line):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except (ValueError, RecursionError) as exception:
+                self.counters['errors'] += 1
+                reply = {'id': None, 'error': f"invalid request: {exception}"}
+            else:
+                reply = await self.handle(request)
+            async with lock:
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self._connections.pop(writer, None)
+
+    # Start listening
+    # inputs:
+    #   - (optional) host
+    #   - (optional) port = 0 for any free port
+    # output:
+    #   - tuple (host, port) the server listens on
+    async def start(self, host=DEFAULT_HOST, port=0) -> tuple:
+        self._server = await asyncio.start_server(
+            self._connection, host, port, limit=MAX_LINE_BYTES
+            )
+        return self._server.sockets[0].getsockname()[:2]
+
+    # Serve until cancelled
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+    # Stop listening, close the connections and stop the batching tasks;
+    # requests still queued or running are cancelled
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        for task in self._batchers.values():
+            task.cancel()
+        await asyncio.gather(*self._batchers.values(), return_exceptions=True)
+        for queue in self._queues.values():
+            while not queue.empty():
+                queue.get_nowait()[1].cancel()
+        self._queues.clear()
+        self._batchers.clear()
+
+        # closing a connection ends its reads, so its task returns
+        connections = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*connections, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+
+    # Service counters, with the instrumentation totals if any
+    # output:
+    #   - dictionary of counters, the number of pending requests, the mean
+    #       batch size and the warm qubit counts
+    def stats(self) -> dict:
+        result = dict(self.counters)
+        result['pending'] = self.pending
+        result['mean_batch'] = (
+            self.counters['batched_statevectors']/self.counters['batches']
+            if self.counters['batches'] else 0.0
+            )
+        result['warm'] = sorted(
+            f"{engine}:{n}" for engine, n in self._checkers
+            )
+        if self.instrumentation is not None:
+            result['instrumentation'] = self.instrumentation.snapshot()
+        return result
+
+
+# Client for an EntanglementService, sending requests over one connection
+# Requests are pipelined: any number can be awaited at once, and replies are
+# matched to them by id.
+class EntanglementClient:
+    def __init__(self, reader, writer) -> None:
+        self._reader = reader
+        self._writer = writer
+        self._ids = itertools.count()
+        self._replies = {}
+        self._task = asyncio.create_task(self._read_replies())
+
+    # Open a connection
+    # inputs:
+    #   - (optional) host, port
+    # output:
+    #   - EntanglementClient
+    @classmethod
+    async def connect(cls, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        reader, writer = await asyncio.open_connection(
+            host, port, limit=MAX_LINE_BYTES
+            )
+        return cls(reader, writer)
+
+    async def _read_replies(self) -> None:
+        try:
+            while line := await self._reader.readline():
+                reply = json.loads(line)
+                future = self._replies.pop(reply.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(reply)
+        finally:
+            for future in self._replies.values():
+                if not future.done():
+                    future.set_exception(
+                        ConnectionError("connection closed by the service")
+                        )
+
+    # Send a request and wait for its reply
+    # input:
+    #   - request = dictionary without 'id', see the module docstring
+    # output:
+    #   - reply dictionary
+    async def request(self, request) -> dict:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._replies[request_id] = future
+        self._writer.write(
+            json.dumps(dict(request, id=request_id)).encode() + b'\n'
+            )
+        await self._writer.drain()
+        return await future
+
+    # Check a statevector
+    # inputs:
+    #   - number_qubits
+    #   - amplitudes = array-like of 2**number_qubits amplitudes, or a
+    #       statevector dictionary
+    # output:
+    #   - reply dictionary with 'entangled' and 'witness', or 'error'
+    async def check(self, number_qubits: int, amplitudes) -> dict:
+        if isinstance(amplitudes, dict):
+            return await self.request({
+                'number_qubits': number_qubits,
+                'statevector': {
+                    str(ket): [complex(value).real, complex(value).imag]
+                    for ket, value in amplitudes.items()
+                    }
+                })
+        return await self.request({
+            'number_qubits': number_qubits, 'data': encode_data(amplitudes)
+            })
+
+    # Check a statevector given by its nonzero kets
+    # inputs:
+    #   - number_qubits
+    #   - indices, values = kets with nonzero amplitudes and their amplitudes
+    # output:
+    #   - reply dictionary
+    async def check_sparse(self, number_qubits: int, indices, values) -> dict:
+        return await self.request({
+            'number_qubits': number_qubits,
+            'indices': [int(index) for index in indices],
+            'values': encode_amplitudes(values)
+            })
+
+    async def stats(self) -> dict:
+        return (await self.request({'method': 'stats'}))['stats']
+
+    async def close(self) -> None:
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+# Send many requests to a service and measure latency and throughput
+# inputs:
+#   - (optional) host, port = address of the service
+#   - (optional) number_qubits
+#   - (optional) requests = total number of requests
+#   - (optional) concurrency = requests in flight at once
+#   - (optional) connections = number of client connections
+#   - (optional) seed = seed of the statevectors, half of them product states
+#       (see create_statevector.random_statevectors())
+# output:
+#   - dictionary with the number of replies, Entangled verdicts, overloaded
+#       and other errors, total seconds, requests per second and latency
+#       percentiles in milliseconds
+async def load_test(host=DEFAULT_HOST, port=DEFAULT_PORT, number_qubits=10,
+                    requests=1000, concurrency=64, connections=4,
+                    seed=None) -> dict:
+    states = create_statevector.random_statevectors(
+        number_qubits, min(requests, 256), seed=seed, kind='mixed'
+        )
+    payloads = [encode_data(state) for state in states]
+    clients = [
+        await EntanglementClient.connect(host, port)
+        for _ in range(connections)
+        ]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    replies = []
+
+    async def one(position):
+        async with semaphore:
+            start = time.perf_counter()
+            reply = await clients[position % connections].request({
+                'number_qubits': number_qubits,
+                'data': payloads[position % len(payloads)]
+                })
+            latencies.append(time.perf_counter() - start)
+            replies.append(reply)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(position) for position in range(requests)))
+    seconds = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    overloaded = sum(1 for reply in replies if reply.get('overloaded'))
+    return {
+        'replies': len(replies),
+        'entangled': sum(1 for reply in replies if reply.get('entangled')),
+        'overloaded': overloaded,
+        'errors': sum(1 for reply in replies if 'error' in reply) - overloaded,
+        'seconds': seconds,
+        'requests_per_second': len(replies)/seconds,
+        'latency_ms': {
+            'median': 1000*statistics.median(latencies),
+            'p95': 1000*latencies[int(0.95*(len(latencies) - 1))],
+            'max': 1000*latencies[-1]
+            }
+        }
+
+
+# Command line arguments
+# input:
+#   - (optional) argv = list of arguments, defaults to sys.argv[1:]
+# output:
+#   - argparse.Namespace
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Local service for the Entanglement Criteria."
+        )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve = commands.add_parser('serve', help="run the service")
+    serve.add_argument('--host', default=DEFAULT_HOST)
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--max-batch', type=int, default=256)
+    serve.add_argument('--max-delay', type=float, default=0.002)
+    serve.add_argument('--max-pending', type=int, default=4096)
+    serve.add_argument('--max-qubits', type=int, default=20)
+    serve.add_argument('--processes', type=int, default=1)
+
+    load = commands.add_parser('load', help="load test a running service")
+    load.add_argument('--host', default=DEFAULT_HOST)
+    load.add_argument('--port', type=int, default=DEFAULT_PORT)
+    load.add_argument('--qubits', type=int, default=10)
+    load.add_argument('--requests', type=int, default=1000)
+    load.add_argument('--concurrency', type=int, default=64)
+    load.add_argument('--connections', type=int, default=4)
+    load.add_argument('--seed', type=int)
+    return parser.parse_args(argv)
+
+
+# Command line entry point
+def main(argv=None) -> int:
+    arguments = parse_arguments(argv)
+    if arguments.command == 'load':
+        print(json.dumps(asyncio.run(load_test(
+            arguments.host, arguments.port, arguments.qubits,
+            arguments.requests, arguments.concurrency, arguments.connections,
+            arguments.seed
+            )), indent=1))
+        return 0
+
+    async def serve():
+        service = EntanglementService(
+            arguments.max_batch, arguments.max_delay, arguments.max_pending,
+            arguments.max_qubits, processes=arguments.processes
+            )
+        host, port = await service.start(arguments.host, arguments.port)
+        print(f"serving on {host}:{port}", file=sys.stderr, flush=True)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
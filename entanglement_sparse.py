@@ -0,0 +1,263 @@
+"""
+Sparse engine for the Entanglement Criteria.
+
+The functions in this module work with statevectors stored by their support,
+the kets with a nonzero amplitude, as a sorted integer array of ket indices
+and a complex array of their amplitudes (COO format).  Kets missing from the
+support have amplitude 0, as in a Qiskit Statevector Dictionary.  GHZ-like,
+few-excitation and post-selected states have a handful of nonzero amplitudes
+out of 2**n, and are checked in time proportional to the size of their
+support, without ever building an array of length 2**n.
+
+After normalizing the zero ket amplitude to 1, let B be the set of qubits whose
+basis ket has a nonzero amplitude.  The target amplitude of a ket is 0 when
+one of its bits is outside B, and nonzero (up to underflow) when all its bits
+are in B.  So only two kinds of non-basis kets can fail the check:
+    - kets in the support, whose amplitudes are compared with their targets
+    - kets whose bits are all in B, but which are missing from the support.
+      Subsets of B are visited in increasing order, and all but the last one
+      visited are in the support, so at most len(support) + 1 are visited
+Every other ket has amplitude 0 and target 0, and passes.
+
+Ket indices are int64, so up to MAX_QUBITS qubits.  Target amplitudes are
+accumulated from the leftmost bit of a ket to the rightmost with NumPy
+operations, so they are identical to those of the entanglement_array module.
+
+Example:
+>>> import numpy as np
+>>> import entanglement_sparse as sparse
+>>> ghz = {'0'*40: 1, '1'*40: 1}
+>>> indices, values = sparse.sparse_statevector(ghz, 40)
+>>> sparse.first_violation(indices, values, 40)
+1099511627775
+>>> product = (np.array([0, 1, 2, 3]), np.array([1, 0.5, 2, 1]))
+>>> sparse.first_violation(*product, 40) is None
+True
+
+See (Entanglement Criteria module)
+"""
+
+import numpy as np
+
+import entanglement_array
+
+# largest number of qubits of a ket index stored as int64
+MAX_QUBITS = 63
+
+
+# Convert a statevector to its support
+# inputs:
+#   - statevector = statevector dictionary (bitstring or decimal keys), tuple
+#       (indices, values) of the kets with nonzero amplitudes, array-like of
+#       amplitudes indexed by ket, or path to a statevector file
+#   - number_qubits = length of the kets in the statevector
+# output:
+#   - indices = sorted int64 array of the kets with a nonzero amplitude
+#   - values = complex array of their amplitudes
+def sparse_statevector(statevector, number_qubits: int) -> tuple:
+    if not 0 < number_qubits <= MAX_QUBITS:
+        raise ValueError(
+            f"the sparse engine supports 1 to {MAX_QUBITS} qubits, got "
+            f"{number_qubits}"
+            )
+
+    if isinstance(statevector, dict):
+        indices = np.fromiter(
+            (key if isinstance(key, (int, np.integer)) else int(key, 2)
+             for key in statevector.keys()),
+            dtype=np.int64,
+            count=len(statevector)
+            )
+        values = np.fromiter(
+            statevector.values(), dtype=complex, count=len(statevector)
+            )
+    elif isinstance(statevector, tuple) and len(statevector) == 2:
+        indices = np.asarray(statevector[0], dtype=np.int64)
+        values = np.asarray(statevector[1], dtype=complex)
+        if indices.shape != values.shape or indices.ndim != 1:
+            raise ValueError(
+                f"indices and values must be 1-D arrays of the same length, "
+                f"got shapes {indices.shape} and {values.shape}"
+                )
+    else:
+        amplitudes = entanglement_array.statevector_array(
+            statevector, number_qubits
+            )
+        indices = np.flatnonzero(amplitudes).astype(np.int64)
+        values = np.asarray(amplitudes[indices], dtype=complex)
+
+    if len(indices) and (
+        indices.min() < 0 or indices.max() >= 2**number_qubits
+        ):
+        raise ValueError(
+            f"kets must be between 0 and {2**number_qubits - 1} for "
+            f"{number_qubits} qubits"
+            )
+
+    order = np.argsort(indices, kind='stable')
+    indices, values = indices[order], values[order]
+    if np.any(indices[1:] == indices[:-1]):
+        raise ValueError("statevector lists a ket more than once")
+
+    nonzero = values != 0
+    if not nonzero.any():
+        raise ValueError("statevector has no nonzero amplitudes")
+    return indices[nonzero], values[nonzero]
+
+
+# Look up the amplitudes of kets in a support
+# inputs:
+#   - indices, values = support, see sparse_statevector()
+#   - kets = integer array of ket indices
+# output:
+#   - complex array of amplitudes, 0 for kets missing from the support
+def lookup(indices, values, kets) -> np.ndarray:
+    kets = np.asarray(kets, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(indices, kets), len(indices) - 1)
+    found = indices[positions] == kets
+    return np.where(found, values[positions], 0)
+
+
+# Choose the ket that maps to the zero ket in a basis change, with the same
+# choice as entanglement_array.choose_source_index() on the dense statevector
+# inputs:
+#   - indices, values = support, see sparse_statevector()
+#   - (optional) policy = one of entanglement_array.SOURCE_POLICIES
+#   - (optional) rng = numpy.random.Generator for the 'random' policy
+# output:
+#   - index of the chosen ket
+def choose_source_index(indices, values, policy='first', rng=None) -> int:
+    if policy == 'first':
+        return int(indices[0])
+    if policy == 'largest':
+        return int(indices[np.argmax(np.abs(values))])
+    if policy == 'random':
+        if rng is None:
+            rng = np.random.default_rng()
+        return int(indices[rng.integers(len(indices))])
+
+    raise ValueError(
+        f"policy must be one of {entanglement_array.SOURCE_POLICIES}, "
+        f"got {policy!r}"
+        )
+
+
+# Basis change: map source_index to the zero ket
+# The new amplitude of ket k is the old amplitude of ket k XOR source_index,
+# so each ket of the support moves to its index XOR source_index
+# inputs:
+#   - indices, values = support, see sparse_statevector()
+#   - source_index = index of the ket that maps to the zero ket
+# output:
+#   - indices, values = support after the basis change
+def basis_change(indices, values, source_index: int) -> tuple:
+    indices = indices ^ source_index
+    order = np.argsort(indices)
+    return indices[order], values[order]
+
+
+# Compute the target amplitudes of some kets
+# inputs:
+#   - kets = integer array of ket indices
+#   - basis_amplitudes = amplitudes of the basis kets, ordered as
+#       entanglement_array.basis_indices()
+# output:
+#   - complex array of target amplitudes, one per ket
+def target_amplitudes(kets, basis_amplitudes) -> np.ndarray:
+    kets = np.asarray(kets, dtype=np.int64)
+    number_qubits = len(basis_amplitudes)
+    targets = np.ones(len(kets), dtype=complex)
+    for index in range(number_qubits):
+        bit = number_qubits - 1 - index
+        is_set = (kets >> bit & 1).astype(bool)
+        targets[is_set] = targets[is_set]*basis_amplitudes[index:index + 1]
+    return targets
+
+
+# Entanglement Criteria over a support
+# A basis change is applied first if source_index is nonzero, then the zero
+# ket amplitude is normalized to 1
+# inputs:
+#   - indices, values = support, see sparse_statevector()
+#   - number_qubits
+#   - (optional) source_index = ket that maps to the zero ket, 0 for no basis
+#       change; it must be in the support
+# output:
+#   - indices = sorted ket indices of the support after the basis change
+#   - values = their normalized amplitudes
+#   - basis_amplitudes = normalized amplitudes of the basis kets, ordered as
+#       entanglement_array.basis_indices()
+#   - targets = target amplitudes of the kets of the support
+#   - equality = boolean array, True where a ket of the support passes the
+#       check.  Only the entries at non-basis kets are part of the criteria
+def criteria(indices, values, number_qubits: int, source_index=0) -> tuple:
+    if source_index:
+        indices, values = basis_change(indices, values, source_index)
+    if not len(indices) or indices[0] != 0:
+        raise ValueError("zero ket amplitude must be nonzero")
+
+    basis_amplitudes = lookup(
+        indices, values, entanglement_array.basis_indices(number_qubits)
+        )
+    if values[0] != 1:
+        basis_amplitudes = basis_amplitudes/values[0]
+        values = values/values[0]
+
+    targets = target_amplitudes(indices, basis_amplitudes)
+    return indices, values, basis_amplitudes, targets, values == targets
+
+
+# Find the first non-basis ket missing from a support that fails the check
+# inputs:
+#   - indices = sorted ket indices of the support, with the zero ket
+#   - basis_amplitudes = normalized amplitudes of the basis kets
+#   - (optional) stop = only kets below stop are visited
+# output:
+#   - index of the first failing missing ket, or None
+def first_missing_violation(indices, basis_amplitudes, stop=None):
+    number_qubits = len(basis_amplitudes)
+    mask = 0
+    for index, amplitude in enumerate(basis_amplitudes.tolist()):
+        if amplitude != 0:
+            mask |= 1 << (number_qubits - 1 - index)
+
+    # visit the subsets of the mask in increasing order; each one is in the
+    # support or ends the search
+    support = set(indices.tolist())
+    subset = (0 - mask) & mask
+    while subset:
+        if stop is not None and subset >= stop:
+            return None
+        if subset & (subset - 1) and subset not in support:
+            if target_amplitudes([subset], basis_amplitudes)[0] != 0:
+                return subset
+        subset = (subset - mask) & mask
+    return None
+
+
+# First failing non-basis ket from the output of criteria(), in the support
+# or missing from it
+# inputs:
+#   - indices, basis_amplitudes, equality = see criteria()
+# output:
+#   - index of the first failing non-basis ket, or None if all kets pass
+def witness_index(indices, basis_amplitudes, equality):
+    failed = ~equality & ((indices & (indices - 1)) != 0)
+    witness = int(indices[np.argmax(failed)]) if failed.any() else None
+
+    missing = first_missing_violation(indices, basis_amplitudes, witness)
+    return witness if missing is None else missing
+
+
+# Find the first non-basis ket that fails the equality check
+# inputs:
+#   - indices, values = support, see sparse_statevector()
+#   - number_qubits
+#   - (optional) source_index = see criteria()
+# output:
+#   - index of the first failing non-basis ket, or None if all kets pass
+def first_violation(indices, values, number_qubits: int, source_index=0):
+    indices, values, basis_amplitudes, targets, equality = criteria(
+        indices, values, number_qubits, source_index
+        )
+    return witness_index(indices, basis_amplitudes, equality)
@@ -0,0 +1,208 @@
+"""
+Opt-in instrumentation of the Entanglement Criteria.
+
+An Instrumentation object passed to Entangled(..., instrumentation=...) times
+the phases of every entangled(), is_entangled(), entangled_batch() and
+clusters() call and counts the work done.  Without one, Entangled uses
+NULL_RECORD, whose timers and counters do nothing, so the only cost is a few
+method calls per statevector (never per ket).
+
+Phases (wall-clock seconds, time.perf_counter()):
+- 'convert', statevector dictionaries converted to arrays
+- 'decomposition', the kets and basis ket decompositions read by the 'dict'
+    engine (built on first use, then shared, see Entangled.structure_cache)
+- 'basis_change', choosing a source ket and changing basis when the zero ket
+    amplitude is 0.  With source_policy='interactive' this includes waiting for
+    input()
+- 'normalize', dividing by the zero ket amplitude
+- 'criteria', the entanglement criteria itself
+- 'result', building the EntanglementResult or witnesses
+- 'clusters', finding the clusters of an Entangled state in clusters()
+- 'cache', hashing a statevector and looking up or storing its result in the
+    result cache of entangled() (see result_cache module)
+
+Counters:
+- 'statevectors', statevectors checked
+- 'kets_checked', non-basis kets checked by entangled(), is_entangled() and
+    clusters().  is_entangled() and clusters() stop at the first failing ket,
+    so they count the non-basis kets up to and including it.
+    entangled_batch() does not count kets, and entangled() with the 'sparse'
+    engine only counts the non-basis kets with nonzero amplitudes
+- 'kets_failed', non-basis kets that fail the check (for is_entangled(),
+    clusters() and entangled_batch(), the number of Entangled statevectors,
+    since each stops at its first failing ket; for the 'sparse' engine, the
+    failing kets with nonzero amplitudes)
+- 'basis_changes', statevectors with zero ket amplitude 0
+
+After every call each subscriber is called with an event dictionary:
+{'method': 'entangled', 'number_qubits': 4, 'engine': 'dict',
+ 'seconds': 0.0004, 'phases': {'decomposition': 1.2e-06, ...},
+ 'counters': {'statevectors': 1, 'kets_checked': 11, ...}, 'error': None}
+The Instrumentation object also keeps running totals, see snapshot().
+Subscribers run in the calling thread, so a slow exporter slows the caller;
+an exception raised by a subscriber propagates to the caller.
+
+Example:
+>>> import entanglement_class as entang
+>>> import instrumentation
+>>> metrics = instrumentation.Instrumentation()
+>>> metrics.subscribe(print)
+>>> x = entang.Entangled(4, engine='numpy', instrumentation=metrics)
+>>> result = x.entangled(x.statevector)
+|Psi> is not Entangled
+{'method': 'entangled', 'number_qubits': 4, 'engine': 'numpy', ...}
+>>> metrics.snapshot()['counters']
+{'statevectors': 1, 'kets_checked': 11, 'kets_failed': 0, 'basis_changes': 0}
+
+See (Entanglement Criteria module)
+"""
+
+import contextlib
+import threading
+import time
+
+PHASES = (
+    'convert', 'decomposition', 'basis_change', 'normalize', 'criteria',
+    'result', 'clusters', 'cache'
+    )
+COUNTERS = ('statevectors', 'kets_checked', 'kets_failed', 'basis_changes')
+
+
+# Timers and counters of a single call, passed to the subscribers when the
+# call ends
+class CallRecord:
+    __slots__ = ('method', 'number_qubits', 'engine', 'phases', 'counters')
+
+    def __init__(self, method: str, number_qubits: int, engine: str) -> None:
+        self.method = method
+        self.number_qubits = number_qubits
+        self.engine = engine
+        self.phases = {}
+        self.counters = dict.fromkeys(COUNTERS, 0)
+
+    # Time a phase, adding to its total if the phase runs more than once
+    # input:
+    #   - name = one of PHASES
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (
+                self.phases.get(name, 0.0) + time.perf_counter() - start
+                )
+
+    # Add to a counter
+    # inputs:
+    #   - name = one of COUNTERS
+    #   - (optional) value = amount to add
+    def count(self, name: str, value=1) -> None:
+        self.counters[name] += int(value)
+
+
+# CallRecord that records nothing, used when instrumentation is disabled
+class NullRecord:
+    __slots__ = ()
+
+    _context = contextlib.nullcontext()
+
+    def phase(self, name: str):
+        return self._context
+
+    def count(self, name: str, value=1) -> None:
+        pass
+
+
+NULL_RECORD = NullRecord()
+
+
+class Instrumentation:
+    # input:
+    #   - (optional) subscribers = callables that receive an event dictionary
+    #       after every call
+    def __init__(self, subscribers=()) -> None:
+        self.subscribers = list(subscribers)
+        self._lock = threading.Lock()
+        self.reset()
+
+    # Add a callable that receives an event dictionary after every call
+    def subscribe(self, callback) -> None:
+        self.subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        self.subscribers.remove(callback)
+
+    # Record one call
+    # inputs:
+    #   - method = name of the Entangled method
+    #   - number_qubits
+    #   - engine = engine of the Entangled object
+    # output:
+    #   - context manager giving a CallRecord; when it exits the record is
+    #       added to the totals and sent to the subscribers, with the name of
+    #       the exception in 'error' if the call failed
+    @contextlib.contextmanager
+    def record(self, method: str, number_qubits: int, engine: str):
+        record = CallRecord(method, number_qubits, engine)
+        error = None
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException as exception:
+            error = type(exception).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self._finish(record, seconds, error)
+
+    # Add a finished record to the totals and send it to the subscribers
+    def _finish(self, record: CallRecord, seconds: float, error) -> None:
+        with self._lock:
+            self.calls[record.method] = self.calls.get(record.method, 0) + 1
+            self.seconds[record.method] = (
+                self.seconds.get(record.method, 0.0) + seconds
+                )
+            for name, value in record.phases.items():
+                self.phases[name] = self.phases.get(name, 0.0) + value
+            for name, value in record.counters.items():
+                self.counters[name] += value
+            if error is not None:
+                self.errors += 1
+
+        if not self.subscribers:
+            return
+        event = {
+            'method': record.method,
+            'number_qubits': record.number_qubits,
+            'engine': record.engine,
+            'seconds': seconds,
+            'phases': dict(record.phases),
+            'counters': dict(record.counters),
+            'error': error
+            }
+        for callback in list(self.subscribers):
+            callback(event)
+
+    # Running totals since the last reset()
+    # output:
+    #   - dictionary with the number of calls and total seconds per method,
+    #       total seconds per phase, counters and the number of failed calls
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'calls': dict(self.calls),
+                'seconds': dict(self.seconds),
+                'phases': dict(self.phases),
+                'counters': dict(self.counters),
+                'errors': self.errors
+                }
+
+    # Set all totals to zero, keeping the subscribers
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = {}
+            self.seconds = {}
+            self.phases = {}
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.errors = 0
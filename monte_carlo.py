@@ -0,0 +1,448 @@
+"""
+Monte Carlo statistics of the Entanglement Criteria.
+
+Estimates what fraction of the states of an ensemble the criteria finds
+Entangled, and how failing kets are distributed, by streaming states through
+the entanglement_array functions in chunks:
+- EntanglementStatistics keeps running totals: verdict counts, basis changes,
+    failing kets by Hamming weight (number of set bits, i.e. number of basis
+    kets in the decomposition) and a histogram of the fraction of non-basis
+    kets that fail per state.  confidence_interval() gives a Wilson score
+    interval for the fraction of Entangled states.
+- MonteCarlo draws states with create_statevector.random_statevectors() (or
+    takes chunks from any other source, see process()) and updates the
+    statistics.  Its state, including the state of the random generator, can
+    be saved to a JSON file after every chunk, so a run that is stopped resumes
+    where it left off and draws the same states as an uninterrupted run.
+
+Memory is bounded by the chunk size: states are checked in blocks of about
+entanglement_array.BLOCK_SIZE amplitudes, and only totals are kept.
+
+Unlike entangled_batch(), every non-basis ket of every state is checked, since
+the histograms need all failing kets and not only the first one.
+
+Example:
+>>> import monte_carlo
+>>> run = monte_carlo.MonteCarlo(8, seed=1, kind='mixed')
+>>> run.run(10000)
+>>> run.statistics.summary()['fraction_entangled']
+0.4954
+>>> run.statistics.confidence_interval()
+(0.48560424270619695, 0.5051992900788131)
+
+From the command line, resuming from run.json if it exists:
+$ python monte_carlo.py 8 100000 --kind mixed --seed 1 --state run.json
+
+See (Entanglement Criteria module)
+See (create_statevector module)
+"""
+
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+
+import numpy as np
+
+import create_statevector
+import entanglement_array
+
+# number of bins of the failing fraction histogram
+FRACTION_BINS = 20
+
+
+# Number of set bits of each ket index
+# inputs:
+#   - start, stop = range of kets
+# output:
+#   - integer array of length stop - start
+def hamming_weights(start: int, stop: int) -> np.ndarray:
+    indices = np.arange(start, stop)
+    weights = np.zeros(stop - start, dtype=np.int64)
+    while indices.any():
+        weights += indices & 1
+        indices >>= 1
+    return weights
+
+
+# Running totals of the Entanglement Criteria over many statevectors
+class EntanglementStatistics:
+    # inputs:
+    #   - number_qubits
+    #   - (optional) bins = number of bins of the failing fraction histogram
+    def __init__(self, number_qubits: int, bins=FRACTION_BINS) -> None:
+        self.number_qubits = number_qubits
+        self.states = 0
+        self.entangled = 0
+        self.basis_changes = 0
+
+        # failing non-basis kets, indexed by Hamming weight
+        self.failing_by_weight = np.zeros(number_qubits + 1, dtype=np.int64)
+
+        # states by the fraction of their non-basis kets that fail, in equal
+        # bins from 0 to 1; states where no ket fails are in the first bin
+        self.fraction_histogram = np.zeros(bins, dtype=np.int64)
+
+    # Number of non-basis kets of one state
+    @property
+    def non_basis_kets(self) -> int:
+        return 2**self.number_qubits - self.number_qubits - 1
+
+    @property
+    def fraction_entangled(self) -> float:
+        if self.states == 0:
+            return math.nan
+        return self.entangled/self.states
+
+    # Wilson score interval for the fraction of Entangled states
+    # input:
+    #   - (optional) confidence = confidence level
+    # output:
+    #   - tuple (low, high), (0.0, 1.0) before any state is counted
+    def confidence_interval(self, confidence=0.95) -> tuple:
+        if self.states == 0:
+            return 0.0, 1.0
+        z = statistics.NormalDist().inv_cdf(0.5 + confidence/2)
+        p = self.entangled/self.states
+        n = self.states
+        denominator = 1 + z**2/n
+        center = (p + z**2/(2*n))/denominator
+        half_width = z*math.sqrt(p*(1 - p)/n + z**2/(4*n**2))/denominator
+        return max(0.0, center - half_width), min(1.0, center + half_width)
+
+    # Number of kets of each Hamming weight over all states counted
+    def kets_by_weight(self) -> np.ndarray:
+        return self.states*np.array(
+            [math.comb(self.number_qubits, w)
+             for w in range(self.number_qubits + 1)],
+            dtype=np.int64
+            )
+
+    # Fraction of kets of each Hamming weight that fail, nan for the zero ket
+    # and basis kets (weights 0 and 1), which are not checked
+    def failing_rate_by_weight(self) -> np.ndarray:
+        rates = np.full(self.number_qubits + 1, np.nan)
+        kets = self.kets_by_weight()
+        checked = kets > 0
+        checked[:2] = False
+        rates[checked] = self.failing_by_weight[checked]/kets[checked]
+        return rates
+
+    # Add the results of a chunk of states
+    # inputs:
+    #   - failing_by_weight = failing kets of the chunk by Hamming weight
+    #   - failing_per_state = number of failing kets of each state
+    #   - (optional) basis_changes = states of the chunk that needed a basis
+    #       change
+    def add(self, failing_by_weight, failing_per_state, basis_changes=0
+            ) -> None:
+        failing_per_state = np.asarray(failing_per_state)
+        bins = len(self.fraction_histogram)
+
+        self.states += len(failing_per_state)
+        self.entangled += int(np.count_nonzero(failing_per_state))
+        self.basis_changes += int(basis_changes)
+        self.failing_by_weight += failing_by_weight
+        fractions = failing_per_state/max(self.non_basis_kets, 1)
+        self.fraction_histogram += np.bincount(
+            np.minimum((fractions*bins).astype(np.int64), bins - 1),
+            minlength=bins
+            )
+
+    # Add the totals of another EntanglementStatistics, e.g. from another
+    # process
+    def merge(self, other) -> None:
+        if (other.number_qubits != self.number_qubits
+                or len(other.fraction_histogram)
+                != len(self.fraction_histogram)):
+            raise ValueError("statistics have different qubits or bins")
+        self.states += other.states
+        self.entangled += other.entangled
+        self.basis_changes += other.basis_changes
+        self.failing_by_weight += other.failing_by_weight
+        self.fraction_histogram += other.fraction_histogram
+
+    # Summary for reporting
+    # input:
+    #   - (optional) confidence = confidence level of the interval
+    # output:
+    #   - dictionary of plain Python values
+    def summary(self, confidence=0.95) -> dict:
+        rates = self.failing_rate_by_weight()
+        return {
+            'number_qubits': self.number_qubits,
+            'states': self.states,
+            'entangled': self.entangled,
+            'not_entangled': self.states - self.entangled,
+            'fraction_entangled': self.fraction_entangled,
+            'confidence': confidence,
+            'confidence_interval': list(self.confidence_interval(confidence)),
+            'basis_changes': self.basis_changes,
+            'failing_by_weight': self.failing_by_weight.tolist(),
+            'failing_rate_by_weight': [
+                None if math.isnan(rate) else rate for rate in rates.tolist()
+                ],
+            'fraction_histogram': self.fraction_histogram.tolist()
+            }
+
+    # Totals as a dictionary of plain Python values, see from_dict()
+    def to_dict(self) -> dict:
+        return {
+            'number_qubits': self.number_qubits,
+            'states': self.states,
+            'entangled': self.entangled,
+            'basis_changes': self.basis_changes,
+            'failing_by_weight': self.failing_by_weight.tolist(),
+            'fraction_histogram': self.fraction_histogram.tolist()
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        result = cls(data['number_qubits'], len(data['fraction_histogram']))
+        result.states = data['states']
+        result.entangled = data['entangled']
+        result.basis_changes = data['basis_changes']
+        result.failing_by_weight[:] = data['failing_by_weight']
+        result.fraction_histogram[:] = data['fraction_histogram']
+        return result
+
+
+# Check every non-basis ket of a chunk of statevectors
+# The zero ket of every statevector must already have a nonzero amplitude.
+# Statevectors are normalized and checked in blocks of about block_size
+# amplitudes with entanglement_array.batch_block_failures(), the checks of
+# entanglement_array.batch_criteria(), so a state has failing kets exactly
+# when batch_criteria() finds it Entangled.
+# inputs:
+#   - amplitudes = complex array of shape (batch, 2**number_qubits)
+#   - number_qubits
+#   - (optional) block_size = number of amplitudes per block
+# output:
+#   - failing_by_weight = failing kets by Hamming weight
+#   - failing_per_state = number of failing kets of each statevector
+def count_failing_kets(amplitudes, number_qubits: int,
+                       block_size=entanglement_array.BLOCK_SIZE) -> tuple:
+    batch = len(amplitudes)
+    failing_by_weight = np.zeros(number_qubits + 1, dtype=np.int64)
+    failing_per_state = np.zeros(batch, dtype=np.int64)
+
+    ket_block = min(block_size, 2**number_qubits)
+    row_block = max(1, block_size // ket_block)
+    basis = entanglement_array.basis_indices(number_qubits)
+
+    for ket_start in range(0, 2**number_qubits, ket_block):
+        ket_stop = min(ket_start + ket_block, 2**number_qubits)
+        weights = hamming_weights(ket_start, ket_stop)
+
+        for row_start in range(0, batch, row_block):
+            rows = slice(row_start, row_start + row_block)
+            zero_ket_amplitudes = amplitudes[rows, :1]
+            failing = entanglement_array.batch_block_failures(
+                amplitudes, rows, zero_ket_amplitudes,
+                amplitudes[rows][:, basis]/zero_ket_amplitudes,
+                number_qubits, ket_start, ket_stop
+                )
+
+            failing_per_state[rows] += failing.sum(axis=1)
+            failing_by_weight += np.bincount(
+                weights, weights=failing.sum(axis=0),
+                minlength=number_qubits + 1
+                ).astype(np.int64)
+
+    return failing_by_weight, failing_per_state
+
+
+class MonteCarlo:
+    # inputs:
+    #   - number_qubits
+    #   - (optional) seed = seed of the random generator
+    #   - (optional) kind, product_fraction = population of the states, see
+    #       create_statevector.random_statevectors()
+    #   - (optional) chunk_size = number of states drawn and checked at once
+    #   - (optional) source_policy = ket that maps to the zero ket when the
+    #       zero ket amplitude is 0, one of entanglement_array.SOURCE_POLICIES
+    #   - (optional) bins = number of bins of the failing fraction histogram
+    def __init__(self, number_qubits: int, seed=None, kind='haar',
+                 product_fraction=0.5, chunk_size=1024, source_policy='first',
+                 bins=FRACTION_BINS) -> None:
+        if kind not in create_statevector.KINDS:
+            raise ValueError(
+                f"kind must be one of {create_statevector.KINDS}, got {kind!r}"
+                )
+        if source_policy not in entanglement_array.SOURCE_POLICIES:
+            raise ValueError(
+                f"source_policy must be one of "
+                f"{entanglement_array.SOURCE_POLICIES}, got {source_policy!r}"
+                )
+
+        self.number_qubits = number_qubits
+        # kept to check the settings of a resumed run; a Generator is not
+        self.seed = (
+            int(seed) if isinstance(seed, (int, np.integer)) else None
+            )
+        self.kind = kind
+        self.product_fraction = product_fraction
+        self.chunk_size = chunk_size
+        self.source_policy = source_policy
+        self.rng = np.random.default_rng(seed)
+        self.statistics = EntanglementStatistics(number_qubits, bins)
+
+    # Check a chunk of states and add them to the statistics
+    # Use this to feed states from any source instead of run()
+    # input:
+    #   - statevectors = 2-D array of shape (batch, 2**number_qubits), or an
+    #       iterable of statevector dictionaries or arrays
+    def process(self, statevectors) -> None:
+        amplitudes = entanglement_array.statevector_batch(
+            statevectors, self.number_qubits
+            )
+
+        # perform change of basis on states with zero ket amplitude 0
+        zero_rows = np.flatnonzero(amplitudes[:, 0] == 0)
+        if len(zero_rows):
+            amplitudes = amplitudes.copy()
+            amplitudes[zero_rows] = entanglement_array.batch_basis_change(
+                amplitudes[zero_rows],
+                entanglement_array.batch_source_indices(
+                    amplitudes[zero_rows], self.source_policy, self.rng
+                    )
+                )
+
+        failing_by_weight, failing_per_state = count_failing_kets(
+            amplitudes, self.number_qubits
+            )
+        self.statistics.add(
+            failing_by_weight, failing_per_state, len(zero_rows)
+            )
+
+    # Draw and check random states until 'count' states have been counted
+    # States already counted (e.g. by a resumed run) count towards 'count'
+    # inputs:
+    #   - count = total number of states
+    #   - (optional) state_path = JSON file to save the state to after every
+    #       chunk, see save()
+    def run(self, count: int, state_path=None) -> None:
+        while self.statistics.states < count:
+            size = min(self.chunk_size, count - self.statistics.states)
+            self.process(create_statevector.random_statevectors(
+                self.number_qubits, size, self.rng, self.kind,
+                self.product_fraction
+                ))
+            if state_path is not None:
+                self.save(state_path)
+
+    # Settings, statistics and random generator state, see from_dict()
+    def to_dict(self) -> dict:
+        return {
+            'number_qubits': self.number_qubits,
+            'seed': self.seed,
+            'kind': self.kind,
+            'product_fraction': self.product_fraction,
+            'chunk_size': self.chunk_size,
+            'source_policy': self.source_policy,
+            'rng_state': self.rng.bit_generator.state,
+            'statistics': self.statistics.to_dict()
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        statistics = EntanglementStatistics.from_dict(data['statistics'])
+        run = cls(
+            data['number_qubits'], seed=data.get('seed'), kind=data['kind'],
+            product_fraction=data['product_fraction'],
+            chunk_size=data['chunk_size'],
+            source_policy=data['source_policy'],
+            bins=len(statistics.fraction_histogram)
+            )
+        run.rng.bit_generator.state = data['rng_state']
+        run.statistics = statistics
+        return run
+
+    # Save the state to a JSON file
+    # The file is replaced in one step, so a run stopped while saving keeps
+    # the previous state
+    def save(self, path) -> None:
+        temporary_path = str(path) + '.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(self.to_dict(), file)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Monte Carlo statistics of the Entanglement Criteria."
+        )
+    parser.add_argument('number_qubits', type=int)
+    parser.add_argument('count', type=int, help="total number of states")
+    # settings default to None, so a resumed run can tell the ones given
+    # from the defaults
+    parser.add_argument(
+        '--kind', choices=create_statevector.KINDS,
+        help="population of the states (default: haar)"
+        )
+    parser.add_argument(
+        '--product-fraction', type=float, help="default: 0.5"
+        )
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--chunk-size', type=int, help="default: 1024")
+    parser.add_argument('--confidence', type=float, default=0.95)
+    parser.add_argument(
+        '--state', help="JSON file to save to after every chunk, and to "
+        "resume from if it exists"
+        )
+    return parser.parse_args(argv)
+
+
+# Settings given on the command line that differ from those of a resumed run
+# inputs:
+#   - run = MonteCarlo loaded from the state file
+#   - arguments = see parse_arguments()
+# output:
+#   - list of descriptions of the conflicting settings, e.g. "kind 'haar'"
+def resume_conflicts(run, arguments) -> list:
+    conflicts = []
+    for name in ('number_qubits', 'seed', 'kind', 'product_fraction',
+                 'chunk_size'):
+        given = getattr(arguments, name)
+        if given is not None and given != getattr(run, name):
+            conflicts.append(
+                f"{name.replace('_', ' ')} {getattr(run, name)!r}"
+                )
+    return conflicts
+
+
+# Command line entry point, prints the summary as JSON
+# A run resumed from --state keeps its own settings; any setting given that
+# differs from them is an error, since the states would come from another
+# population
+def main(argv=None) -> int:
+    arguments = parse_arguments(argv)
+    if arguments.state and os.path.exists(arguments.state):
+        run = MonteCarlo.load(arguments.state)
+        conflicts = resume_conflicts(run, arguments)
+        if conflicts:
+            raise SystemExit(
+                f"{arguments.state} is a run with {', '.join(conflicts)}"
+                )
+    else:
+        run = MonteCarlo(
+            arguments.number_qubits, arguments.seed, arguments.kind or 'haar',
+            0.5 if arguments.product_fraction is None
+            else arguments.product_fraction,
+            arguments.chunk_size or 1024
+            )
+
+    run.run(arguments.count, arguments.state)
+    print(json.dumps(run.statistics.summary(arguments.confidence), indent=1))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
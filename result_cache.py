@@ -0,0 +1,225 @@
+"""
+A content-addressed cache of Entangled.entangled() results.
+
+States are often checked more than once: identical circuit outputs, retries,
+re-runs of a notebook.  A ResultCache keys each result by a hash of the
+amplitude buffer of the statevector and by the settings that change the
+result (number of qubits, engine, ket format and source policy), so checking
+a state again returns its cached result instead of running the criteria.
+Results are kept in memory in a SizedLRUCache (see sized_cache module), which
+evicts the least recently used ones past 'max_bytes', and are optionally also
+saved in a directory as binary records (see entanglement_result module) that
+are memory-mapped back when they are missing from memory.
+
+The key hashes the amplitudes the criteria actually checks: after the basis
+change of the source policy and divided by the zero ket amplitude.  States
+that differ only by a global factor, such as 2*state or 1j*state, therefore
+share a key whenever the division rounds to the same amplitudes, and states
+that differ in any normalized amplitude, even by rounding, are checked on
+their own.  Only the 'first' and 'largest' source policies choose the same
+basis change for the same state, so states checked with the 'interactive' or
+'random' policies are never cached.
+
+Example:
+>>> cache = result_cache.ResultCache(max_bytes=2**28, directory='results')
+>>> x = entang.Entangled(16, engine='numpy', source_policy='first',
+...                      result_cache=cache)
+>>> result = x.entangled(state)
+|Psi> is Entangled
+>>> result = x.entangled(state)
+|Psi> is Entangled
+>>> cache.stats()
+{'hits': 1, 'disk_hits': 0, 'misses': 1, 'evictions': 0, 'entries': 1,
+'nbytes': 532504}
+
+See (Entanglement Criteria module)
+"""
+
+import copy
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+import entanglement_array
+import entanglement_result
+import entanglement_sparse
+import sized_cache
+
+# default memory budget of a ResultCache, in bytes
+RESULT_CACHE_BYTES = 2**28
+
+# source policies that always choose the same basis change for a state
+CACHEABLE_POLICIES = ('first', 'largest')
+
+# size in bytes of the BLAKE2b digests of the amplitude buffers
+DIGEST_SIZE = 16
+
+
+# Hash of the buffers of one or more arrays
+# input:
+#   - arrays = NumPy arrays, hashed with their dtype and shape
+# output:
+#   - hexadecimal digest
+def buffer_digest(*arrays) -> str:
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    for array in arrays:
+        _update(digest, array)
+    return digest.hexdigest()
+
+
+# Hash of an array of amplitudes as the criteria checks it: after the basis
+# change and divided by the zero ket amplitude
+# The amplitudes are read one block at a time, so a memory-mapped statevector
+# is hashed in bounded memory.
+# inputs:
+#   - amplitudes = complex array of length 2**n
+#   - (optional) source_index = ket that maps to the zero ket, 0 for no basis
+#       change
+#   - (optional) block_size = number of amplitudes hashed at a time
+# output:
+#   - hexadecimal digest
+def amplitude_digest(amplitudes, source_index=0,
+                     block_size=entanglement_array.BLOCK_SIZE) -> str:
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    digest.update(f"<c16({len(amplitudes)},)".encode())
+    zero_ket_amplitude = complex(amplitudes[source_index])
+    buffer = np.empty(min(block_size, len(amplitudes)), dtype=complex)
+    for start in range(0, len(amplitudes), block_size):
+        stop = min(start + block_size, len(amplitudes))
+        if source_index:
+            block = amplitudes[np.arange(start, stop) ^ source_index]
+        else:
+            block = amplitudes[start:stop]
+        block = np.divide(block, zero_ket_amplitude, out=buffer[:stop - start])
+        # adding 0 turns -0.0 into 0.0, which compare equal
+        block += 0
+        digest.update(memoryview(block).cast('B'))
+    return digest.hexdigest()
+
+
+# Hash of the support of a statevector as the criteria checks it, see
+# amplitude_digest()
+# inputs:
+#   - indices, values = support, see entanglement_sparse.sparse_statevector()
+#   - (optional) source_index = ket that maps to the zero ket, 0 for no basis
+#       change
+# output:
+#   - hexadecimal digest
+def support_digest(indices, values, source_index=0) -> str:
+    if source_index:
+        indices, values = entanglement_sparse.basis_change(
+            indices, values, source_index
+            )
+    values = np.asarray(values, dtype=complex)
+    if len(values):
+        values = values/values[0] + 0
+    return buffer_digest(indices, values)
+
+
+# Add the dtype, shape and buffer of an array to a digest
+def _update(digest, array) -> None:
+    array = np.ascontiguousarray(array)
+    digest.update(f"{array.dtype.str}{array.shape}".encode())
+    digest.update(memoryview(array).cast('B'))
+
+
+class ResultCache:
+    # inputs:
+    #   - (optional) max_bytes = memory budget of the cached results
+    #   - (optional) directory = directory where results are also saved, None
+    #       to keep them in memory only
+    def __init__(self, max_bytes=RESULT_CACHE_BYTES, directory=None) -> None:
+        self.memory = sized_cache.SizedLRUCache(max_bytes)
+        self.directory = directory
+        self.disk_hits = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    # Cache key of a state checked with some settings
+    # inputs:
+    #   - digest = hash of the state, see amplitude_digest() and
+    #       support_digest()
+    #   - number_qubits, engine, ket_format, source_policy = settings of the
+    #       Entangled object that checks it
+    # output:
+    #   - tuple (number_qubits, engine, ket_format, source_policy, digest)
+    @staticmethod
+    def key(digest: str, number_qubits: int, engine: str, ket_format: str,
+            source_policy: str) -> tuple:
+        return number_qubits, engine, ket_format, source_policy, digest
+
+    # Path of the file of a key in the directory
+    def path(self, key) -> str:
+        return os.path.join(
+            self.directory, '-'.join(str(part) for part in key) + '.ent'
+            )
+
+    # Look up a result, in memory first and then on disk
+    # input:
+    #   - key = see key()
+    # output:
+    #   - cached result, or None
+    def get(self, key):
+        result = self.memory.get(key)
+        if result is not None or self.directory is None:
+            return result
+        try:
+            result = entanglement_result.load_result(self.path(key))
+        except (OSError, ValueError):
+            return None
+        self.disk_hits += 1
+        self.memory.put(key, result, result.nbytes)
+        return result
+
+    # Store a result, and save it to disk when there is a directory
+    # The cache keeps a copy of the result with read-only copies of its
+    # arrays, since it is shared by every later lookup; the result passed in
+    # is left as it is, and changing its arrays does not change the cache.
+    # inputs:
+    #   - key = see key()
+    #   - result = EntanglementResult or SparseEntanglementResult
+    def put(self, key, result) -> None:
+        result = copy.copy(result)
+        for name in entanglement_result.RESULT_ARRAYS[type(result).__name__]:
+            array = np.array(getattr(result, name))
+            array.flags.writeable = False
+            setattr(result, name, array)
+        self.memory.put(key, result, result.nbytes)
+        if self.directory is None:
+            return
+
+        # write to a temporary file first, so other processes sharing the
+        # directory never read a partial record
+        descriptor, temporary = tempfile.mkstemp(
+            dir=self.directory, suffix='.tmp'
+            )
+        try:
+            with os.fdopen(descriptor, 'wb') as stream:
+                entanglement_result.write_result(stream, result)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    # Counters and size of the cache
+    # output:
+    #   - dictionary with 'hits' (in memory), 'disk_hits', 'misses' (neither
+    #       in memory nor on disk), 'evictions', 'entries' and 'nbytes' (in
+    #       memory)
+    def stats(self) -> dict:
+        return {
+            'hits': self.memory.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.memory.misses - self.disk_hits,
+            'evictions': self.memory.evictions,
+            'entries': len(self.memory),
+            'nbytes': self.memory.nbytes
+            }
+
+    # Remove all results from memory and reset the counters; files on disk
+    # are kept
+    def clear(self) -> None:
+        self.memory.clear()
+        self.disk_hits = 0
@@ -0,0 +1,140 @@
+"""
+A least-recently-used (LRU) cache bounded by the memory size of its values.
+
+Entries are evicted in least-recently-used order whenever the total size of
+the cached values exceeds 'max_bytes'.  A value larger than 'max_bytes' is
+never cached.  Sizes are estimated with estimate_size() unless a size is given
+when the value is stored.  The cache is safe to share between threads.
+
+Example:
+>>> cache = SizedLRUCache(max_bytes=2**20)
+>>> cache.get_or_create('kets', lambda: tuple(range(10)))
+(0, 1, 2, 3, 4, 5, 6, 7, 8, 9)
+>>> cache.hits, cache.misses
+(0, 1)
+"""
+
+import collections
+import sys
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+
+
+# Estimate the memory size of a value in bytes
+# Containers are measured together with their contents.  Objects referenced
+# more than once are counted each time, so this is an upper bound.
+# input:
+#   - value = array, mapping, tuple, list or any other object
+# output:
+#   - estimated size in bytes
+def estimate_size(value) -> int:
+    if isinstance(value, np.ndarray):
+        return sys.getsizeof(value) + (0 if value.base is None else value.nbytes)
+    if isinstance(value, Mapping):
+        return sys.getsizeof(value) + sum(
+            estimate_size(key) + estimate_size(item)
+            for key, item in value.items()
+            )
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class SizedLRUCache:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # key: (value, size), ordered from least to most recently used
+        self._entries = collections.OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    # Total estimated size of the cached values in bytes
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    # Look up a cached value and mark it as most recently used
+    # inputs:
+    #   - key = hashable cache key
+    #   - (optional) default = value returned when key is not cached
+    # output:
+    #   - cached value, or default
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    # Store a value, evicting least recently used values to stay within
+    # max_bytes
+    # inputs:
+    #   - key = hashable cache key
+    #   - value = value to cache
+    #   - (optional) size = size of value in bytes, estimated if not given
+    def put(self, key, value, size=None) -> None:
+        if size is None:
+            size = estimate_size(value)
+
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._nbytes += size
+            self._evict()
+
+    # Look up a cached value, or create and cache it if it is missing
+    # The factory runs outside the lock, so two threads missing the same key
+    # may both create the value; the last one stored is kept.
+    # inputs:
+    #   - key = hashable cache key
+    #   - factory = function with no arguments that creates the value
+    # output:
+    #   - cached or newly created value
+    def get_or_create(self, key, factory):
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = factory()
+            self.put(key, value)
+        return value
+
+    # Change max_bytes, evicting values if the cache is now too large
+    def resize(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    # Remove all cached values and reset the counters
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    # Evict least recently used values until the cache fits in max_bytes
+    # The lock must be held by the caller
+    def _evict(self) -> None:
+        while self._nbytes > self.max_bytes:
+            _, (_, size) = self._entries.popitem(last=False)
+            self._nbytes -= size
+            self.evictions += 1
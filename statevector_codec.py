@@ -0,0 +1,116 @@
+"""
+JSON encodings of statevectors, shared by the service and the command line.
+
+Statevectors are sent as JSON in one of these forms:
+- "amplitudes", a list of [real, imaginary] pairs or real numbers indexed by
+    ket
+- "data", the base64 encoded bytes of a little-endian complex128 array, which
+    is several times faster to encode and decode than lists of numbers
+- "statevector", a dictionary of kets (bitstrings) and their amplitudes, as
+    [real, imaginary] pairs or real numbers
+- "indices" and "values", the kets with nonzero amplitudes (integers) and
+    their amplitudes, for the 'sparse' engine
+
+Decoding a malformed value raises one of DECODE_ERRORS, so callers can turn
+any bad input into an error reply or record.
+
+Example:
+>>> import statevector_codec as codec
+>>> codec.decode_amplitudes([[1, 0], [0, 1]])
+array([1.+0.j, 0.+1.j])
+>>> codec.decode_indices([0, 2**70], 3)
+Traceback (most recent call last):
+...
+ValueError: ket 1180591620717411303424 is out of range for 3 qubits
+
+See (Entanglement Criteria module)
+"""
+
+import base64
+import binascii
+
+import numpy as np
+
+import entanglement_sparse
+
+# exceptions raised by the decoders on malformed input
+DECODE_ERRORS = (KeyError, TypeError, ValueError, OverflowError, binascii.Error)
+
+
+# Convert JSON amplitudes to a complex array
+# input:
+#   - data = list of [real, imaginary] pairs or real numbers
+# output:
+#   - 1-D complex array
+def decode_amplitudes(data) -> np.ndarray:
+    values = np.asarray(data, dtype=float)
+    if values.ndim == 2 and values.shape[1] == 2:
+        return values[:, 0] + 1j*values[:, 1]
+    if values.ndim == 1:
+        return values.astype(complex)
+    raise ValueError(
+        "amplitudes must be real numbers or [real, imaginary] pairs"
+        )
+
+
+# Convert amplitudes to JSON, as [real, imaginary] pairs
+# input:
+#   - amplitudes = array-like of complex numbers
+# output:
+#   - list of [real, imaginary] lists
+def encode_amplitudes(amplitudes) -> list:
+    amplitudes = np.asarray(amplitudes, dtype=complex)
+    return np.stack([amplitudes.real, amplitudes.imag], axis=-1).tolist()
+
+
+# Convert base64 encoded bytes of little-endian complex128 amplitudes to an
+# array
+def decode_data(data: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype='<c16').astype(complex)
+
+
+# Convert amplitudes to base64 encoded bytes of little-endian complex128
+def encode_data(amplitudes) -> str:
+    amplitudes = np.ascontiguousarray(amplitudes, dtype='<c16')
+    return base64.b64encode(amplitudes.tobytes()).decode('ascii')
+
+
+# Convert a JSON statevector dictionary to a dictionary of complex amplitudes
+# input:
+#   - kets = dictionary of bitstrings and [real, imaginary] pairs or numbers
+# output:
+#   - dictionary of bitstrings and complex amplitudes
+def decode_kets(kets) -> dict:
+    if not isinstance(kets, dict):
+        raise TypeError("statevector must be a dictionary of kets")
+    return {
+        ket: complex(*value) if isinstance(value, list) else complex(value)
+        for ket, value in kets.items()
+        }
+
+
+# Convert JSON ket indices to an int64 array, checking their range first, so
+# no index overflows int64
+# inputs:
+#   - indices = list of integers
+#   - number_qubits = between 1 and entanglement_sparse.MAX_QUBITS
+# output:
+#   - 1-D int64 array
+def decode_indices(indices, number_qubits: int) -> np.ndarray:
+    if not 0 < number_qubits <= entanglement_sparse.MAX_QUBITS:
+        raise ValueError(
+            f"number_qubits must be between 1 and "
+            f"{entanglement_sparse.MAX_QUBITS}, got {number_qubits}"
+            )
+    if not isinstance(indices, list) or not all(
+        isinstance(index, int) and not isinstance(index, bool)
+        for index in indices
+        ):
+        raise TypeError("indices must be a list of integers")
+    size = 2**number_qubits
+    for index in indices:
+        if not 0 <= index < size:
+            raise ValueError(
+                f"ket {index} is out of range for {number_qubits} qubits"
+                )
+    return np.array(indices, dtype=np.int64)
@@ -0,0 +1,82 @@
+"""
+Shared fixtures of the tests.  The modules of the project are flat files in the
+parent directory, so it is put on the import path.
+
+See (Entanglement Criteria module)
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(
+    0, os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+
+import entanglement_class as entang
+
+# ket 1 amplitudes of the qubits of product_state()
+DYADIC = np.array([0.5, -2, 1.5j, -0.25 + 0.75j, 3 - 1j, 0.125])
+
+
+# Random complex amplitudes, nonzero at the zero ket (almost surely Entangled)
+def random_state(number_qubits: int, seed=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    size = 2**number_qubits
+    return rng.normal(size=size) + 1j*rng.normal(size=size)
+
+
+# Random product state with zero ket amplitude 1 (never Entangled)
+# The amplitudes of each qubit are small dyadic numbers, so every product of
+# them is exact whatever the order the engines multiply them in.
+def product_state(number_qubits: int, seed=0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    factors = rng.choice(DYADIC, size=number_qubits)
+    amplitudes = np.ones(1, dtype=complex)
+    for factor in factors:
+        amplitudes = np.kron(amplitudes, [1, factor])
+    return amplitudes
+
+
+# Random amplitudes with zero ket amplitude 0, so the criteria needs a basis
+# change
+def zero_ket_state(number_qubits: int, seed=0) -> np.ndarray:
+    amplitudes = random_state(number_qubits, seed)
+    amplitudes[0] = 0
+    return amplitudes
+
+
+# Product state with qubit 0 in state |1>, so its zero ket amplitude is 0 and
+# it is still not Entangled after the basis change
+def flipped_product_state(number_qubits: int, seed=0) -> np.ndarray:
+    return np.kron(product_state(number_qubits - 1, seed), [0, 1])
+
+
+STATES = {
+    'random': random_state,
+    'product': product_state,
+    'zero_ket': zero_ket_state,
+    'flipped_product': flipped_product_state
+    }
+
+
+# Statevector dictionary of bitstring kets, as Qiskit returns
+def ket_dictionary(amplitudes, number_qubits: int) -> dict:
+    return {
+        format(index, '0'+str(number_qubits)+'b'): amplitude
+        for index, amplitude in enumerate(amplitudes)
+        }
+
+
+# Result of the 'dict' engine with bitstring kets, the original implementation
+# the other engines and methods are checked against
+def baseline(amplitudes, number_qubits: int):
+    x = entang.Entangled(number_qubits, source_policy='first')
+    return x.entangled(ket_dictionary(amplitudes, number_qubits))
+
+
+@pytest.fixture(params=sorted(STATES))
+def state_kind(request):
+    return request.param
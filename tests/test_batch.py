@@ -0,0 +1,37 @@
+"""
+entangled_batch() against entangled() of each statevector.
+
+See (Entanglement Criteria module)
+"""
+
+import numpy as np
+
+import entanglement_class as entang
+from conftest import STATES, baseline, ket_dictionary
+
+
+def states(number_qubits: int) -> list:
+    return [STATES[kind](number_qubits, seed) for kind in sorted(STATES)
+            for seed in range(3)]
+
+
+def test_entangled_batch_matches_entangled():
+    amplitudes = states(4)
+    x = entang.Entangled(4, engine='numpy', source_policy='first')
+    verdicts, witnesses = x.entangled_batch(amplitudes, witnesses=True)
+
+    for state, verdict, witness in zip(amplitudes, verdicts, witnesses):
+        expected = baseline(state, 4)
+        assert verdict == expected.entangled
+        assert witness == expected.witness
+
+
+def test_entangled_batch_accepts_dictionaries_and_arrays():
+    amplitudes = states(3)
+    x = entang.Entangled(3, source_policy='first')
+    expected = x.entangled_batch(np.stack(amplitudes))
+    verdicts = x.entangled_batch(
+        ket_dictionary(state, 3) for state in amplitudes
+        )
+    np.testing.assert_array_equal(verdicts, expected)
+    assert verdicts.dtype == bool
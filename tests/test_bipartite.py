@@ -0,0 +1,79 @@
+"""
+Bipartite separability from the rank of the cut matrix.
+
+See (bipartite module)
+"""
+
+import numpy as np
+import pytest
+
+import bipartite
+import entanglement_class as entang
+from conftest import ket_dictionary, product_state, random_state
+
+BELL = np.array([1, 0, 0, 1])/np.sqrt(2)
+
+
+# Bell pair on qubits 2 and 1, and qubit 0 on its own
+def bell_and_qubit() -> np.ndarray:
+    return np.kron(BELL, [0.6, 0.8])
+
+
+def test_cut_matrix_layout():
+    amplitudes = np.arange(8, dtype=complex)
+    matrix = bipartite.cut_matrix(amplitudes, 3, [0])
+    assert matrix.shape == (2, 4)
+    # row: bit of qubit 0, column: bits of qubits 1 and 2
+    for ket in range(8):
+        assert matrix[ket & 1, ket >> 1] == ket
+
+
+@pytest.mark.parametrize('subsystem, expected', [
+    ([0], True), ([1], False), ([2], False), ([1, 2], True), ([0, 1], False)
+    ])
+def test_is_separable(subsystem, expected):
+    assert bipartite.is_separable(bell_and_qubit(), 3, subsystem) == expected
+
+
+def test_separable_cuts_match_single_cuts():
+    amplitudes = np.kron(random_state(2, 1), np.kron(BELL, random_state(1)))
+    cuts = bipartite.all_cuts(5)
+    assert len(cuts) == 2**4 - 1
+    results = bipartite.separable_cuts(amplitudes, 5, cuts)
+    for cut, result in zip(cuts, results):
+        assert result == bipartite.is_separable(amplitudes, 5, cut)
+    assert results[cuts.index((0,))]
+    assert results[cuts.index((0, 1, 2))]
+    assert not results[cuts.index((1,))]
+
+
+def test_product_states_factor_across_every_cut():
+    for seed in range(3):
+        amplitudes = product_state(5, seed)
+        assert bipartite.separable_cuts(
+            amplitudes, 5, bipartite.all_cuts(5)
+            ).all()
+
+
+def test_tolerance():
+    noisy = bell_and_qubit()
+    noisy[0b001] += 1e-9
+    assert not bipartite.is_separable(noisy, 3, [0])
+    assert bipartite.is_separable(noisy, 3, [0], tolerance=1e-6)
+
+
+def test_invalid_input():
+    with pytest.raises(ValueError):
+        bipartite.is_separable(np.zeros(8), 3, [0])
+    with pytest.raises(ValueError):
+        bipartite.separable_cuts(bell_and_qubit(), 3, [[3]])
+
+
+def test_entangled_methods():
+    amplitudes = bell_and_qubit()
+    x = entang.Entangled(3)
+    assert x.separable(ket_dictionary(amplitudes, 3), [0])
+    assert x.separable_cuts(amplitudes) == {
+        (0,): True, (1,): False, (0, 1): False
+        }
+    assert x.separable_cuts(amplitudes, [[2, 1]]) == {(1, 2): True}
@@ -0,0 +1,89 @@
+"""
+Command line entry point: verdict records, and an error record for every line
+that cannot be read, without stopping the run.
+
+See (entanglement_cli module)
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import entanglement_cli
+from conftest import product_state, random_state
+
+
+# Run the command line on JSON lines and read back the records
+def run_lines(tmp_path, lines, *arguments) -> tuple:
+    source = tmp_path / 'states.jsonl'
+    source.write_text('\n'.join(lines) + '\n')
+    output = tmp_path / 'records.jsonl'
+    status = entanglement_cli.main(
+        [str(source), '--output', str(output), *arguments]
+        )
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    return status, records
+
+
+def test_npy_batch(tmp_path):
+    states = np.stack(
+        [random_state(6, seed) for seed in range(5)]
+        + [product_state(6, seed) for seed in range(5)]
+        )
+    path = tmp_path / 'states.npy'
+    np.save(path, states)
+    output = tmp_path / 'records.jsonl'
+
+    status = entanglement_cli.main(
+        [str(path), '--output', str(output), '--chunk-size', '3']
+        )
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    assert status == 0
+    assert [record['index'] for record in records] == list(range(10))
+    assert [record['entangled'] for record in records] == [True]*5 + [False]*5
+
+
+def test_json_line_formats(tmp_path):
+    status, records = run_lines(tmp_path, [
+        '[1, 0, 0, 1]',
+        '{"id": "a", "amplitudes": [[1, 0], [0, 0], [0, 0], [1, 0]]}',
+        '{"statevector": {"00": 1, "01": 1, "10": 1, "11": 1}}',
+        '{"number_qubits": 40, "indices": [0, 1099511627775], '
+        '"values": [1, 1]}'
+        ])
+    assert status == 0
+    assert [record['entangled'] for record in records] == [
+        True, True, False, True
+        ]
+    assert records[1]['id'] == 'a'
+    assert records[3]['witness'] == '1'*40
+
+
+BAD_LINES = {
+    'not json': 'not json',
+    'not a statevector': '"text"',
+    'wrong length': '[1, 0, 0]',
+    'stated qubits differ': '{"number_qubits": 3, "amplitudes": [1, 0, 0, 1]}',
+    'too many qubits': '{"number_qubits": 200, "indices": [0], '
+                       '"values": [1]}',
+    'index overflow': '{"number_qubits": 3, "indices": [0, '
+                      + str(2**70) + '], "values": [1, 1]}',
+    'index out of range': '{"number_qubits": 3, "indices": [0, 8], '
+                          '"values": [1, 1]}',
+    'sparse without qubits': '{"indices": [0, 3], "values": [1, 1]}',
+    'bad base64': '{"data": "***"}',
+    }
+
+
+@pytest.mark.parametrize('line', BAD_LINES.values(), ids=BAD_LINES)
+def test_bad_line_gets_error_record(tmp_path, line):
+    status, records = run_lines(
+        tmp_path, ['[1, 0, 0, 1]', line, '[1, 1, 1, 1]']
+        )
+    assert status == 1
+    assert [record['index'] for record in records] == [0, 1, 2]
+    assert records[0]['entangled'] is True
+    assert 'error' in records[1]
+    assert 'entangled' not in records[1]
+    assert records[2]['entangled'] is False
@@ -0,0 +1,100 @@
+"""
+clusters(): the finest partition of the qubits into mutually unentangled
+clusters, checked on states built from known partitions.
+
+See (bipartite module)
+"""
+
+import numpy as np
+import pytest
+
+import bipartite
+import entanglement_class as entang
+from conftest import ket_dictionary, random_state
+
+
+# State that is a product of random states of the given clusters of qubits
+# (qubit i is bit 2**i of a ket)
+# inputs:
+#   - number_qubits
+#   - partition = list of tuples of qubits, covering every qubit once
+#   - (optional) seed
+# output:
+#   - complex array of length 2**number_qubits
+def partitioned_state(number_qubits: int, partition, seed=0) -> np.ndarray:
+    kets = np.arange(2**number_qubits)
+    amplitudes = np.ones(2**number_qubits, dtype=complex)
+    for position, cluster in enumerate(partition):
+        state = random_state(len(cluster), seed + position)
+        cluster_kets = np.zeros_like(kets)
+        for bit, qubit in enumerate(cluster):
+            cluster_kets |= (kets >> qubit & 1) << bit
+        amplitudes *= state[cluster_kets]
+    return amplitudes
+
+
+# Finest partition from every cut, for small states: two qubits are in the
+# same cluster unless some separable cut puts them on different sides
+def brute_force_clusters(amplitudes, number_qubits: int) -> list:
+    cuts = bipartite.all_cuts(number_qubits)
+    separable = bipartite.separable_cuts(amplitudes, number_qubits, cuts)
+    partition = [{qubit} for qubit in range(number_qubits)]
+    for first in range(number_qubits):
+        for second in range(first + 1, number_qubits):
+            apart = any(
+                (first in cut) != (second in cut)
+                for cut, result in zip(cuts, separable) if result
+                )
+            if not apart:
+                merged = next(c for c in partition if first in c)
+                other = next(c for c in partition if second in c)
+                if merged is not other:
+                    merged |= other
+                    partition.remove(other)
+    return sorted(tuple(sorted(cluster)) for cluster in partition)
+
+
+PARTITIONS = [
+    (3, [(0,), (1, 2)]),
+    (4, [(0, 2), (1, 3)]),
+    (5, [(0, 4), (1,), (2, 3)]),
+    (6, [(0, 3, 5), (1, 2, 4)]),
+    (6, [(0,), (1,), (2,), (3,), (4,), (5,)]),
+    (6, [(0, 1, 2, 3, 4, 5)]),
+    (7, [(0, 6), (1, 3, 5), (2,), (4,)]),
+    ]
+
+
+@pytest.mark.parametrize('number_qubits, partition', PARTITIONS)
+def test_known_partition(number_qubits, partition):
+    amplitudes = partitioned_state(number_qubits, partition)
+    assert bipartite.clusters(amplitudes, number_qubits) == partition
+    assert brute_force_clusters(amplitudes, number_qubits) == partition
+
+
+def test_ghz_and_bell():
+    ghz = np.zeros(8)
+    ghz[[0, 7]] = 1
+    bell_and_qubit = np.kron([1, 0, 0, 1], [0.6, 0.8])
+    assert bipartite.clusters(np.kron(ghz, bell_and_qubit), 6) == [
+        (0,), (1, 2), (3, 4, 5)
+        ]
+
+
+@pytest.mark.parametrize('number_qubits, partition', PARTITIONS)
+def test_entangled_clusters(number_qubits, partition):
+    amplitudes = partitioned_state(number_qubits, partition, seed=7)
+    x = entang.Entangled(number_qubits, source_policy='first')
+    assert x.clusters(ket_dictionary(amplitudes, number_qubits)) == partition
+
+    # with zero ket amplitude 0 the state is checked after a basis change,
+    # which does not change its clusters
+    amplitudes[0] = 0
+    assert x.clusters(amplitudes) == brute_force_clusters(
+        amplitudes, number_qubits
+        )
+
+
+def test_zero_state_is_rejected():
+    with pytest.raises(ValueError):
+        bipartite.clusters(np.zeros(4), 2)
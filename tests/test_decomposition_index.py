@@ -0,0 +1,117 @@
+"""
+DecompositionIndex: the rows of the index against decompositions derived from
+the bits of each ket, and the round trip through .npy files.
+
+See (decomposition_index module)
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import decomposition_index
+import entanglement_array
+import entanglement_class as entang
+
+
+# Basis kets of the set bits of a ket, from the leftmost bit
+def bit_decomposition(ket: int, number_qubits: int) -> list:
+    return [
+        1 << bit for bit in reversed(range(number_qubits)) if ket >> bit & 1
+        ]
+
+
+@pytest.mark.parametrize('number_qubits', (2, 3, 5, 9))
+def test_rows_match_the_bits_of_each_ket(number_qubits):
+    index = decomposition_index.DecompositionIndex.build(number_qubits)
+    kets = entanglement_array.non_basis_indices(number_qubits).tolist()
+    assert len(index) == len(kets) == 2**number_qubits - number_qubits - 1
+
+    basis = entanglement_array.basis_indices(number_qubits).tolist()
+    for position, ket in enumerate(kets):
+        assert decomposition_index.non_basis_position(ket) == position
+        expected = bit_decomposition(ket, number_qubits)
+        assert index.decomposition(ket) == expected
+        positions = index.positions_of(ket).tolist()
+        assert [basis[position] for position in positions] == expected
+
+    assert list(index.iter_decompositions(basis)) == [
+        bit_decomposition(ket, number_qubits) for ket in kets
+        ]
+
+
+# Blocks double in size, so a range crossing several blocks checks the
+# offsets of each one
+def test_iter_decompositions_of_a_range(monkeypatch):
+    monkeypatch.setattr(decomposition_index, 'FIRST_BLOCK_SIZE', 4)
+    monkeypatch.setattr(decomposition_index, 'BLOCK_SIZE', 16)
+    index = decomposition_index.DecompositionIndex.build(7)
+    everything = list(index.iter_decompositions())
+    assert len(everything) == len(index)
+    for start, stop in ((0, 1), (3, 40), (50, len(index)), (7, 7)):
+        assert list(index.iter_decompositions(start=start, stop=stop)) == (
+            everything[start:stop]
+            )
+
+
+@pytest.mark.parametrize('ket', (0, 1, 2, 4, 8, 16, -3))
+def test_zero_ket_and_basis_kets_are_not_in_the_index(ket):
+    index = decomposition_index.DecompositionIndex.build(4)
+    with pytest.raises(KeyError):
+        index.positions_of(ket)
+
+
+def test_save_and_load_memory_maps_the_index(tmp_path):
+    built = decomposition_index.DecompositionIndex.build(8)
+    built.save(tmp_path)
+    loaded = decomposition_index.DecompositionIndex.load(tmp_path, 8)
+
+    assert isinstance(loaded.offsets, np.memmap)
+    assert isinstance(loaded.positions, np.memmap)
+    assert not loaded.positions.flags.writeable
+    assert loaded.nbytes == built.nbytes
+    np.testing.assert_array_equal(loaded.offsets, built.offsets)
+    np.testing.assert_array_equal(loaded.positions, built.positions)
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_load_rejects_the_index_of_other_qubits(tmp_path):
+    offsets_path, positions_path = (
+        decomposition_index.DecompositionIndex.paths(tmp_path, 5)
+        )
+    decomposition_index.DecompositionIndex.build(4).save(tmp_path)
+    for path, other in zip(
+        decomposition_index.DecompositionIndex.paths(tmp_path, 4),
+        (offsets_path, positions_path)
+        ):
+        (tmp_path / other).write_bytes((tmp_path / path).read_bytes())
+
+    with pytest.raises(ValueError, match="not the index of 5 qubits"):
+        decomposition_index.DecompositionIndex.load(tmp_path, 5)
+
+
+def test_shared_index_builds_once_then_loads(tmp_path):
+    first = decomposition_index.shared_index(6, tmp_path)
+    assert len(list(tmp_path.glob('*.npy'))) == 2
+    modified = {path: path.stat().st_mtime_ns for path in tmp_path.iterdir()}
+
+    second = decomposition_index.shared_index(6, tmp_path)
+    assert {path: path.stat().st_mtime_ns
+            for path in tmp_path.iterdir()} == modified
+    np.testing.assert_array_equal(second.positions, first.positions)
+
+    # a corrupt index is built again
+    offsets_path, _ = decomposition_index.DecompositionIndex.paths(tmp_path, 6)
+    os.remove(offsets_path)
+    np.save(offsets_path, np.zeros(3, dtype=np.int64))
+    rebuilt = decomposition_index.shared_index(6, tmp_path)
+    np.testing.assert_array_equal(rebuilt.offsets, first.offsets)
+
+
+def test_entangled_reads_its_index_from_index_directory(tmp_path,
+                                                        monkeypatch):
+    monkeypatch.setattr(entang.Entangled, 'index_directory', str(tmp_path))
+    x = entang.Entangled(4, source_policy='first')
+    assert isinstance(x.decomposition_index.positions, np.memmap)
+    assert x.decomp_dict['1011']['basis_kets'] == ('1000', '0010', '0001')
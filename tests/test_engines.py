@@ -0,0 +1,69 @@
+"""
+Every engine and ket format of Entangled.entangled() against the 'dict' engine
+with bitstring kets, the original implementation of the criteria.
+
+See (Entanglement Criteria module)
+"""
+
+import numpy as np
+import pytest
+
+import entanglement_class as entang
+from conftest import STATES, baseline, ket_dictionary
+
+QUBITS = (2, 3, 6)
+
+
+# Convert the keys and basis kets of a result dictionary to bitstrings
+def bitstring_keys(result: dict, number_qubits: int) -> dict:
+    def ket(value):
+        if isinstance(value, str):
+            return value
+        return format(value, '0'+str(number_qubits)+'b')
+    return {
+        ket(key): dict(value, basis_kets=[ket(k) for k in value['basis_kets']])
+        for key, value in result.items()
+        }
+
+
+# Compare result dictionaries: the engines multiply basis ket amplitudes in
+# different orders, so target amplitudes of failing kets may differ in the
+# last bits
+def assert_results_match(result: dict, expected: dict) -> None:
+    assert result.keys() == expected.keys()
+    for ket, values in expected.items():
+        assert result[ket]['basis_kets'] == values['basis_kets']
+        assert result[ket]['equality'] == values['equality']
+        np.testing.assert_allclose(
+            result[ket]['target_amplitude'], values['target_amplitude'],
+            rtol=1e-12
+            )
+
+
+@pytest.mark.parametrize('number_qubits', QUBITS)
+@pytest.mark.parametrize('engine', entang.ENGINES)
+@pytest.mark.parametrize('ket_format', entang.KET_FORMATS)
+def test_engines_match_dict_baseline(state_kind, number_qubits, engine,
+                                     ket_format):
+    amplitudes = STATES[state_kind](number_qubits)
+    expected = baseline(amplitudes, number_qubits)
+
+    x = entang.Entangled(
+        number_qubits, engine=engine, ket_format=ket_format,
+        source_policy='first'
+        )
+    statevector = (
+        ket_dictionary(amplitudes, number_qubits) if ket_format == 'str'
+        else amplitudes
+        )
+    result = x.entangled(statevector)
+
+    assert result.entangled == expected.entangled
+    assert result.entangled == (state_kind in ('random', 'zero_ket'))
+    witness = result.witness
+    if witness is not None and ket_format == 'int':
+        witness = format(witness, '0'+str(number_qubits)+'b')
+    assert witness == expected.witness
+    assert_results_match(
+        bitstring_keys(result.to_dict(), number_qubits), expected.to_dict()
+        )
@@ -0,0 +1,84 @@
+"""
+Instrumentation records of Entangled calls: phases, counters, subscribers and
+running totals.
+
+See (instrumentation module)
+"""
+
+import numpy as np
+import pytest
+
+import entanglement_class as entang
+import instrumentation
+from conftest import STATES, ket_dictionary, product_state, random_state
+
+
+def instrumented(number_qubits: int, engine='numpy'):
+    metrics = instrumentation.Instrumentation()
+    events = []
+    metrics.subscribe(events.append)
+    x = entang.Entangled(
+        number_qubits, engine=engine, source_policy='first',
+        instrumentation=metrics
+        )
+    return x, metrics, events
+
+
+@pytest.mark.parametrize('engine', ('dict', 'numpy'))
+def test_entangled_event(engine):
+    x, metrics, events = instrumented(4, engine)
+    x.entangled(ket_dictionary(random_state(4), 4))
+
+    [event] = events
+    assert event['method'] == 'entangled'
+    assert (event['number_qubits'], event['engine']) == (4, engine)
+    assert event['error'] is None
+    assert event['counters'] == {
+        'statevectors': 1, 'kets_checked': 11, 'kets_failed': 11,
+        'basis_changes': 0
+        }
+    assert set(event['phases']) <= set(instrumentation.PHASES)
+    assert 'criteria' in event['phases']
+    assert all(seconds >= 0 for seconds in event['phases'].values())
+    assert event['seconds'] >= sum(event['phases'].values())
+
+
+def test_is_entangled_counts_kets_up_to_the_witness():
+    x, metrics, events = instrumented(4)
+    amplitudes = product_state(4)
+    amplitudes[0b0110] += 1
+    assert x.is_entangled(amplitudes) == (True, '0110')
+    # the non-basis kets up to 0110: 0011, 0101 and 0110
+    assert events[0]['counters']['kets_checked'] == 3
+    assert events[0]['counters']['kets_failed'] == 1
+
+
+def test_basis_changes_and_batch_totals():
+    x, metrics, events = instrumented(3)
+    states = np.stack([STATES[kind](3) for kind in sorted(STATES)])
+    x.entangled_batch(states)
+    x.entangled(STATES['zero_ket'](3))
+
+    totals = metrics.snapshot()
+    assert totals['calls'] == {'entangled_batch': 1, 'entangled': 1}
+    assert totals['counters']['statevectors'] == len(states) + 1
+    # flipped_product and zero_ket in the batch, and the single zero_ket
+    assert totals['counters']['basis_changes'] == 3
+    assert totals['errors'] == 0
+
+
+def test_failed_call_is_recorded():
+    x, metrics, events = instrumented(3)
+    with pytest.raises(ValueError):
+        x.entangled(np.ones(5, dtype=complex))
+    assert events[0]['error'] == 'ValueError'
+    assert metrics.snapshot()['errors'] == 1
+
+
+def test_null_record_records_nothing():
+    x = entang.Entangled(3, engine='numpy', source_policy='first')
+    x.entangled(random_state(3))
+    record = instrumentation.NULL_RECORD
+    with record.phase('criteria'):
+        record.count('statevectors')
+    assert not hasattr(record, 'counters')
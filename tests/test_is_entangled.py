@@ -0,0 +1,39 @@
+"""
+Early-exit checks, is_entangled() and iter_entangled(), against the full
+result of entangled().
+
+See (Entanglement Criteria module)
+"""
+
+import pytest
+
+import entanglement_class as entang
+from conftest import STATES, baseline, ket_dictionary
+
+
+@pytest.mark.parametrize('engine', entang.ENGINES)
+def test_is_entangled_matches_entangled(state_kind, engine):
+    amplitudes = STATES[state_kind](5)
+    x = entang.Entangled(
+        5, engine=engine, ket_format='int', source_policy='first'
+        )
+    verdict, witness = x.is_entangled(amplitudes)
+    expected = baseline(amplitudes, 5)
+
+    assert verdict == expected.entangled
+    assert witness == (
+        None if expected.witness is None else int(expected.witness, 2)
+        )
+
+
+@pytest.mark.parametrize('engine', ('dict', 'numpy'))
+def test_iter_entangled_matches_entangled(state_kind, engine):
+    amplitudes = STATES[state_kind](4)
+    x = entang.Entangled(4, engine=engine, source_policy='first')
+    expected = baseline(amplitudes, 4).to_dict()
+
+    results = dict(x.iter_entangled(ket_dictionary(amplitudes, 4)))
+    assert results.keys() == expected.keys()
+    for ket, values in expected.items():
+        assert list(results[ket]['basis_kets']) == values['basis_kets']
+        assert results[ket]['equality'] == values['equality']
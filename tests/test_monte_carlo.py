@@ -0,0 +1,92 @@
+"""
+Monte Carlo statistics: failing ket counts against the batch criteria,
+resumed runs and the command line.
+
+See (monte_carlo module)
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import entanglement_array
+import monte_carlo
+from conftest import product_state, random_state
+
+
+def states(number_qubits: int) -> np.ndarray:
+    return np.stack(
+        [random_state(number_qubits, seed) for seed in range(8)]
+        + [product_state(number_qubits, seed) for seed in range(8)]
+        )
+
+
+# block sizes that are not powers of two, or not a multiple of the number of
+# kets, give the last block fewer kets
+@pytest.mark.parametrize('block_size', (16, 48, 100, 2**16))
+def test_counts_agree_with_batch_criteria(block_size):
+    amplitudes = states(6)
+    failing_by_weight, failing_per_state = monte_carlo.count_failing_kets(
+        amplitudes, 6, block_size=block_size
+        )
+    witnesses = entanglement_array.batch_criteria(amplitudes, 6)
+
+    np.testing.assert_array_equal(failing_per_state > 0, witnesses >= 0)
+    assert failing_by_weight[:2].sum() == 0
+    assert failing_by_weight.sum() == failing_per_state.sum()
+    # every non-basis ket of a random state fails
+    np.testing.assert_array_equal(failing_per_state[:8], 2**6 - 6 - 1)
+
+
+def test_statistics_merge_and_summary():
+    first, second = (
+        monte_carlo.EntanglementStatistics(4) for _ in range(2)
+        )
+    first.add(np.array([0, 0, 6, 4, 1]), [11, 0])
+    second.add(np.array([0, 0, 6, 4, 1]), [11], basis_changes=1)
+    first.merge(second)
+
+    summary = first.summary()
+    assert (summary['states'], summary['entangled']) == (3, 2)
+    assert summary['basis_changes'] == 1
+    assert summary['failing_by_weight'] == [0, 0, 12, 8, 2]
+    assert summary['fraction_histogram'][0] == 1
+    assert summary['fraction_histogram'][-1] == 2
+    low, high = summary['confidence_interval']
+    assert low < 2/3 < high
+
+
+def test_resumed_run_draws_the_same_states(tmp_path):
+    whole = monte_carlo.MonteCarlo(4, seed=1, kind='mixed', chunk_size=10)
+    whole.run(50)
+
+    path = tmp_path / 'run.json'
+    stopped = monte_carlo.MonteCarlo(4, seed=1, kind='mixed', chunk_size=10)
+    stopped.run(20, path)
+    resumed = monte_carlo.MonteCarlo.load(path)
+    resumed.run(50, path)
+
+    assert resumed.seed == 1
+    assert resumed.statistics.to_dict() == whole.statistics.to_dict()
+
+
+def test_command_line_rejects_conflicting_resume(tmp_path, capsys):
+    path = str(tmp_path / 'run.json')
+    arguments = ['4', '30', '--kind', 'mixed', '--seed', '1',
+                 '--chunk-size', '10', '--state', path]
+    assert monte_carlo.main(arguments) == 0
+    assert json.loads(capsys.readouterr().out)['states'] == 30
+
+    # the same settings, or none, resume the run
+    assert monte_carlo.main(['4', '40', '--state', path]) == 0
+    assert json.loads(capsys.readouterr().out)['states'] == 40
+    assert monte_carlo.main(arguments[:1] + ['50'] + arguments[2:]) == 0
+    capsys.readouterr()
+
+    for conflict in (['--kind', 'haar'], ['--seed', '2'],
+                     ['--chunk-size', '20'], ['--product-fraction', '0.1']):
+        with pytest.raises(SystemExit, match="is a run with"):
+            monte_carlo.main(['4', '60', '--state', path] + conflict)
+    with pytest.raises(SystemExit, match="number qubits 4"):
+        monte_carlo.main(['5', '60', '--state', path])
@@ -0,0 +1,49 @@
+"""
+Parallel batch checks against serial checks.  Thresholds are lowered so small
+batches are really split across worker processes.
+
+See (entanglement_parallel module)
+"""
+
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import entanglement_array
+import entanglement_class as entang
+import entanglement_parallel
+from conftest import STATES, product_state, random_state
+
+NUMBER_QUBITS = 10
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with concurrent.futures.ProcessPoolExecutor(2) as pool:
+        yield pool
+
+
+def test_parallel_batch_matches_serial(executor):
+    amplitudes = np.stack(
+        [random_state(NUMBER_QUBITS, seed) for seed in range(6)]
+        + [product_state(NUMBER_QUBITS, seed) for seed in range(6)]
+        )
+    expected = entanglement_array.batch_criteria(amplitudes, NUMBER_QUBITS)
+    witnesses = entanglement_parallel.parallel_batch_criteria(
+        amplitudes, NUMBER_QUBITS, processes=2, min_batch=1,
+        executor=executor
+        )
+    np.testing.assert_array_equal(witnesses, expected)
+
+
+def test_entangled_batch_processes_match_serial():
+    states = [STATES[kind](6, seed) for kind in sorted(STATES)
+              for seed in range(20)]
+    x = entang.Entangled(6, engine='numpy', source_policy='first')
+    expected = x.entangled_batch(states, witnesses=True)
+    verdicts, witnesses = x.entangled_batch(
+        states, witnesses=True, processes=2
+        )
+    np.testing.assert_array_equal(verdicts, expected[0])
+    assert witnesses == expected[1]
@@ -0,0 +1,82 @@
+"""
+Seeded bulk random statevectors: shapes, reproducibility, populations and
+normalization.
+
+See (create_statevector module)
+"""
+
+import numpy as np
+import pytest
+
+import create_statevector
+import entanglement_array
+
+
+def test_same_seed_same_states():
+    first = create_statevector.random_statevectors(5, 10, seed=3, kind='mixed')
+    second = create_statevector.random_statevectors(
+        5, 10, seed=3, kind='mixed'
+        )
+    other = create_statevector.random_statevectors(5, 10, seed=4, kind='mixed')
+    assert first.shape == (10, 32)
+    assert first.dtype == complex
+    np.testing.assert_array_equal(first, second)
+    assert not np.array_equal(first, other)
+
+
+@pytest.mark.parametrize('kind', create_statevector.KINDS)
+def test_zero_ket_normalization(kind):
+    states = create_statevector.random_statevectors(4, 50, seed=1, kind=kind)
+    np.testing.assert_array_equal(states[:, 0], 1)
+
+
+def test_unit_normalization():
+    states = create_statevector.random_statevectors(
+        4, 50, seed=1, kind='mixed', normalization='unit'
+        )
+    np.testing.assert_allclose(np.linalg.norm(states, axis=1), 1)
+
+
+# Product states pass every check exactly, and Haar states fail
+def test_kinds_and_verdicts():
+    states, products = create_statevector.random_statevectors(
+        6, 200, seed=2, kind='mixed', product_fraction=0.3,
+        return_kinds=True
+        )
+    witnesses = entanglement_array.batch_criteria(states, 6)
+    np.testing.assert_array_equal(witnesses < 0, products)
+    assert 30 < products.sum() < 90
+
+
+def test_fills_out():
+    out = np.zeros((8, 16), dtype=complex)
+    states = create_statevector.random_statevectors(
+        4, 8, seed=5, kind='product', out=out
+        )
+    assert states is out
+    np.testing.assert_array_equal(
+        out, create_statevector.random_statevectors(4, 8, 5, 'product')
+        )
+    with pytest.raises(ValueError):
+        create_statevector.random_statevectors(
+            4, 8, out=np.zeros((8, 8), dtype=complex)
+            )
+
+
+def test_chunks_are_reproducible():
+    chunks = list(create_statevector.iter_random_statevectors(
+        3, 10, chunk_size=4, seed=9, kind='mixed'
+        ))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    again = create_statevector.iter_random_statevectors(
+        3, 10, chunk_size=4, seed=9, kind='mixed'
+        )
+    for chunk, repeated in zip(chunks, again):
+        np.testing.assert_array_equal(chunk, repeated)
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        create_statevector.random_statevectors(3, 2, kind='ghz')
+    with pytest.raises(ValueError):
+        create_statevector.random_statevectors(3, 2, normalization='l1')
@@ -0,0 +1,66 @@
+"""
+EntanglementResult: the verdict, and the read-only mapping that replaces the
+nested dictionary entangled() used to return.
+
+See (entanglement_result module)
+"""
+
+import numpy as np
+import pytest
+
+import entanglement_class as entang
+import entanglement_result
+from conftest import ket_dictionary, random_state
+
+
+def test_mapping_of_non_basis_kets():
+    x = entang.Entangled(3, source_policy='first')
+    result = x.entangled(ket_dictionary(random_state(3), 3))
+
+    assert list(result) == ['011', '101', '110', '111']
+    assert len(result) == 4
+    assert result['101']['basis_kets'] == ['100', '001']
+    assert result.to_dict() == {ket: result[ket] for ket in result}
+    for ket in ('000', '001', '100', '1000', 'abc', 8):
+        with pytest.raises(KeyError):
+            result[ket]
+    assert repr(result) == (
+        "<EntanglementResult: 3 qubits, Entangled, 4 of 4 non-basis kets "
+        "fail>"
+        )
+
+
+def test_decimal_and_bitstring_keys_agree():
+    amplitudes = random_state(4)
+    by_bitstring = entang.Entangled(4, source_policy='first').entangled(
+        ket_dictionary(amplitudes, 4)
+        )
+    by_index = entang.Entangled(
+        4, ket_format='int', source_policy='first'
+        ).entangled(amplitudes)
+    assert by_index[0b1011]['basis_kets'] == [8, 2, 1]
+    assert by_index.witness == int(by_bitstring.witness, 2)
+    assert by_index[11]['target_amplitude'] == (
+        by_bitstring['1011']['target_amplitude']
+        )
+
+
+# Only non-basis kets decide the verdict, whatever the checks of the zero ket
+# and the basis kets hold
+def test_verdict_ignores_zero_ket_and_basis_kets():
+    equality = np.ones(16, dtype=bool)
+    equality[[0, 1, 2, 4, 8]] = False
+    result = entanglement_result.EntanglementResult(
+        4, np.zeros(16, dtype=complex), equality
+        )
+    assert not result.entangled
+    assert result.witness is None
+    assert len(result.failing_kets()) == 0
+
+    equality[6] = False
+    result = entanglement_result.EntanglementResult(
+        4, np.zeros(16, dtype=complex), equality
+        )
+    assert result.entangled
+    assert result.witness == '0110'
+    np.testing.assert_array_equal(result.failing_kets(), [6])
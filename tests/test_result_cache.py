@@ -0,0 +1,123 @@
+"""
+ResultCache: hits, misses and evictions in memory, the round trip through a
+directory, and the normalized key shared by scaled states.
+
+See (result_cache module)
+"""
+
+import numpy as np
+import pytest
+
+import entanglement_class as entang
+import result_cache
+from conftest import ket_dictionary, product_state, random_state, \
+    zero_ket_state
+from test_serialization import assert_same_result
+
+
+def checker(cache, engine='numpy', source_policy='first', number_qubits=5):
+    return entang.Entangled(
+        number_qubits, engine=engine, source_policy=source_policy,
+        result_cache=cache
+        )
+
+
+def test_hits_and_misses():
+    cache = result_cache.ResultCache()
+    x = checker(cache)
+    first = x.entangled(random_state(5))
+    again = x.entangled(random_state(5))
+    x.entangled(random_state(5, seed=1))
+
+    assert again is not first
+    assert_same_result(again, first)
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+    assert stats['disk_hits'] == 0
+
+
+def test_least_recently_used_results_are_evicted():
+    cache = result_cache.ResultCache()
+    x = checker(cache)
+    x.entangled(random_state(5))
+    cache.memory.resize(cache.memory.nbytes)
+    x.entangled(random_state(5, seed=1))
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['entries'] == 1
+
+    x.entangled(random_state(5))
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (0, 3, 2)
+
+
+def test_results_are_read_back_from_the_directory(tmp_path):
+    amplitudes = zero_ket_state(5)
+    expected = checker(result_cache.ResultCache(directory=tmp_path)).entangled(
+        amplitudes
+        )
+    assert len(list(tmp_path.glob('*.ent'))) == 1
+
+    # a new cache, as after a restart or in another process
+    cache = result_cache.ResultCache(directory=tmp_path)
+    result = checker(cache).entangled(amplitudes)
+    assert_same_result(result, expected)
+    assert cache.stats()['disk_hits'] == 1
+    assert cache.stats()['misses'] == 0
+
+    checker(cache).entangled(amplitudes)
+    assert cache.stats()['hits'] == 1
+
+
+@pytest.mark.parametrize('engine', entang.ENGINES)
+@pytest.mark.parametrize(
+    'state', (random_state, product_state, zero_ket_state)
+    )
+def test_scaled_states_share_a_result(engine, state):
+    cache = result_cache.ResultCache()
+    x = checker(cache, engine)
+    amplitudes = state(5)
+    expected = x.entangled(ket_dictionary(amplitudes, 5))
+    for factor in (2, -0.5, 1j):
+        result = x.entangled(ket_dictionary(factor*amplitudes, 5))
+        assert_same_result(result, expected)
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['hits'] == 3
+
+
+# The key follows the basis change: the same state with another ket as
+# source is a different key
+def test_key_follows_the_source_ket():
+    amplitudes = zero_ket_state(4)
+    assert result_cache.amplitude_digest(amplitudes, 1) != (
+        result_cache.amplitude_digest(amplitudes, 2)
+        )
+    # hashing in blocks does not change the digest
+    assert result_cache.amplitude_digest(amplitudes, 3, block_size=3) == (
+        result_cache.amplitude_digest(amplitudes, 3)
+        )
+
+
+# The cache keeps its own read-only copy of a result
+def test_arrays_of_the_caller_stay_writeable():
+    cache = result_cache.ResultCache()
+    x = checker(cache)
+    result = x.entangled(random_state(5))
+    expected = result.target_amplitudes.copy()
+    assert result.target_amplitudes.flags.writeable
+    result.target_amplitudes[:] = 0
+
+    cached = x.entangled(random_state(5))
+    np.testing.assert_array_equal(cached.target_amplitudes, expected)
+    assert not cached.target_amplitudes.flags.writeable
+    with pytest.raises(ValueError):
+        cached.target_amplitudes[0] = 1
+
+
+@pytest.mark.parametrize('source_policy', ('interactive', 'random'))
+def test_policies_without_a_fixed_source_are_not_cached(source_policy):
+    cache = result_cache.ResultCache()
+    x = checker(cache, source_policy=source_policy)
+    x.entangled(random_state(5))
+    x.entangled(random_state(5))
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['misses'] == 0
@@ -0,0 +1,96 @@
+"""
+Round trip of EntanglementResult and SparseEntanglementResult through binary
+records and JSON.
+
+See (entanglement_result module)
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+import entanglement_class as entang
+import entanglement_result
+from conftest import ket_dictionary, product_state, random_state, \
+    zero_ket_state
+
+
+# Results of a few states with every engine, bitstring and decimal kets
+def results():
+    for engine in entang.ENGINES:
+        for ket_format in entang.KET_FORMATS:
+            x = entang.Entangled(
+                5, engine=engine, ket_format=ket_format,
+                source_policy='first'
+                )
+            for state in (random_state, product_state, zero_ket_state):
+                amplitudes = state(5)
+                statevector = (
+                    ket_dictionary(amplitudes, 5) if ket_format == 'str'
+                    else amplitudes
+                    )
+                yield x.entangled(statevector)
+
+
+RESULTS = list(results())
+
+
+def assert_same_result(result, expected) -> None:
+    assert type(result) is type(expected)
+    assert result.number_qubits == expected.number_qubits
+    assert result.ket_format == expected.ket_format
+    assert result.entangled == expected.entangled
+    assert result.witness == expected.witness
+    assert result.to_dict() == expected.to_dict()
+    for name in entanglement_result.RESULT_ARRAYS[type(result).__name__]:
+        np.testing.assert_array_equal(
+            getattr(result, name), getattr(expected, name)
+            )
+
+
+@pytest.mark.parametrize('result', RESULTS, ids=repr)
+@pytest.mark.parametrize('mmap', (True, False))
+def test_binary_round_trip(tmp_path, result, mmap):
+    path = tmp_path / 'result.ent'
+    entanglement_result.save_result(result, path)
+    assert_same_result(
+        entanglement_result.load_result(path, mmap=mmap), result
+        )
+
+
+def test_records_written_one_after_another(tmp_path):
+    path = tmp_path / 'results.ent'
+    with open(path, 'wb') as stream:
+        for result in RESULTS:
+            entanglement_result.write_result(stream, result)
+
+    loaded = list(entanglement_result.iter_results(path))
+    assert len(loaded) == len(RESULTS)
+    for result, expected in zip(loaded, RESULTS):
+        assert_same_result(result, expected)
+
+
+def test_truncated_record_is_rejected(tmp_path):
+    path = tmp_path / 'result.ent'
+    entanglement_result.save_result(RESULTS[0], path)
+    path.write_bytes(path.read_bytes()[:-64])
+    with pytest.raises(ValueError, match="truncated"):
+        entanglement_result.load_result(path)
+
+
+def test_json_round_trip(tmp_path):
+    result = RESULTS[0]
+    path = tmp_path / 'result.json'
+    entanglement_result.save_result(result, path, 'json')
+    with open(path) as stream:
+        document = json.load(stream)
+
+    assert document['entangled'] == result.entangled
+    assert document['witness'] == result.witness
+    assert document['kets'].keys() == result.to_dict().keys()
+    for ket, value in result.to_dict().items():
+        real, imaginary = document['kets'][ket]['target_amplitude']
+        assert complex(real, imaginary) == value['target_amplitude']
+        assert document['kets'][ket]['equality'] == value['equality']
+
@@ -0,0 +1,124 @@
+"""
+EntanglementService over a local socket: verdicts, and an error reply for every
+malformed or out-of-range request, so no client waits forever.
+
+See (entanglement_service module)
+"""
+
+import asyncio
+import json
+
+import pytest
+
+import entanglement_service as service
+from conftest import product_state, random_state
+
+# seconds to wait for a reply before a test fails
+REPLY_TIMEOUT = 10
+
+
+# Start a service, run a coroutine function with it, its address and a raw
+# connection, and close everything
+def with_service(test):
+    async def main():
+        server = service.EntanglementService(max_qubits=12)
+        host, port = await server.start()
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            return await asyncio.wait_for(
+                test(server, (host, port), reader, writer),
+                REPLY_TIMEOUT
+                )
+        finally:
+            writer.close()
+            await server.close()
+    return asyncio.run(main())
+
+
+# Send raw lines and read one reply per line
+async def exchange(reader, writer, lines) -> list:
+    for line in lines:
+        writer.write(line.encode() + b'\n')
+    await writer.drain()
+    return [json.loads(await reader.readline()) for line in lines]
+
+
+def test_verdicts():
+    async def test(server, address, reader, writer):
+        client = await service.EntanglementClient.connect(*address)
+        try:
+            return await asyncio.gather(
+                client.check(4, random_state(4)),
+                client.check(4, product_state(4)),
+                client.check(2, {'00': 1, '11': 1}),
+                client.check_sparse(40, [0, 2**40 - 1], [1, 1])
+                )
+        finally:
+            await client.close()
+
+    replies = with_service(test)
+    assert [reply['entangled'] for reply in replies] == [
+        True, False, True, True
+        ]
+    assert replies[1]['witness'] is None
+    assert replies[2]['witness'] == '11'
+
+
+BAD_REQUESTS = {
+    'not json': 'not json',
+    'not an object': '[1, 2]',
+    'missing qubits': '{"id": 1, "amplitudes": [1, 0]}',
+    'wrong length': '{"id": 1, "number_qubits": 2, "amplitudes": [1, 0]}',
+    'all zero': '{"id": 1, "number_qubits": 1, "amplitudes": [0, 0]}',
+    'too many qubits': '{"id": 1, "number_qubits": 200, "amplitudes": [1]}',
+    'bad base64': '{"id": 1, "number_qubits": 1, "data": "***"}',
+    'bad kets': '{"id": 1, "number_qubits": 1, "statevector": [1, 2]}',
+    'bad method': '{"id": 1, "method": "shutdown"}',
+    'index overflow': '{"id": 1, "number_qubits": 3, "indices": [0, '
+                      + str(2**70) + '], "values": [1, 1]}',
+    'index out of range': '{"id": 1, "number_qubits": 3, '
+                          '"indices": [0, 8], "values": [1, 1]}',
+    'negative index': '{"id": 1, "number_qubits": 3, '
+                      '"indices": [-1], "values": [1]}',
+    'sparse too many qubits': '{"id": 1, "number_qubits": 200, '
+                              '"indices": [0], "values": [1]}',
+    'sparse no qubits': '{"id": 1, "number_qubits": 0, '
+                        '"indices": [0], "values": [1]}',
+    'index not an integer': '{"id": 1, "number_qubits": 3, '
+                            '"indices": [0.5], "values": [1]}',
+    }
+
+
+@pytest.mark.parametrize('line', BAD_REQUESTS.values(), ids=BAD_REQUESTS)
+def test_bad_request_gets_error_reply(line):
+    async def test(server, address, reader, writer):
+        replies = await exchange(reader, writer, [line, line])
+        # the connection still works after the errors
+        replies += await exchange(reader, writer, [
+            '{"id": "ok", "number_qubits": 2, "amplitudes": [1, 0, 0, 1]}'
+            ])
+        return replies, server.stats()
+
+    replies, stats = with_service(test)
+    for reply in replies[:2]:
+        assert 'error' in reply
+        assert 'entangled' not in reply
+    assert replies[2] == {'id': 'ok', 'entangled': True, 'witness': '11'}
+    assert stats['errors'] == 2
+    # rejected requests never create warm checkers
+    assert all(not key.startswith('sparse') for key in stats['warm'])
+
+
+def test_unexpected_failure_still_replies(monkeypatch):
+    async def fail(number_qubits, amplitudes):
+        raise RuntimeError("broken")
+
+    async def test(server, address, reader, writer):
+        monkeypatch.setattr(server, 'check', fail)
+        return await exchange(reader, writer, [
+            '{"id": 7, "number_qubits": 1, "amplitudes": [1, 0]}'
+            ])
+
+    [reply] = with_service(test)
+    assert reply['id'] == 7
+    assert reply['error'] == "internal error: RuntimeError: broken"
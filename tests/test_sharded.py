@@ -0,0 +1,56 @@
+"""
+Sharded checks of one statevector against serial checks.  Thresholds are
+lowered so small statevectors are really split across worker processes.
+
+See (entanglement_parallel module)
+"""
+
+import concurrent.futures
+
+import numpy as np
+import pytest
+
+import entanglement_array
+import entanglement_class as entang
+import entanglement_parallel
+from conftest import STATES
+
+NUMBER_QUBITS = 10
+BLOCK_SIZE = 64
+
+
+@pytest.fixture(scope='module')
+def executor():
+    with concurrent.futures.ProcessPoolExecutor(2) as pool:
+        yield pool
+
+
+# The sharded witness is a failing ket, but not necessarily the first one,
+# since shards stop as soon as any shard finds a failed check
+@pytest.mark.parametrize('kind', sorted(STATES))
+@pytest.mark.parametrize('on_disk', (False, True))
+def test_sharded_matches_serial(tmp_path, executor, kind, on_disk):
+    amplitudes = STATES[kind](NUMBER_QUBITS)
+    source_index = entanglement_array.choose_source_index(amplitudes, 'first')
+    serial = entanglement_array.first_violation(
+        amplitudes, NUMBER_QUBITS, BLOCK_SIZE, source_index=source_index
+        )
+    if on_disk:
+        np.save(tmp_path / 'state.npy', amplitudes)
+        amplitudes = entanglement_array.load_statevector(
+            tmp_path / 'state.npy'
+            )
+
+    witness = entanglement_parallel.sharded_criteria(
+        amplitudes, NUMBER_QUBITS, processes=2, source_index=source_index,
+        block_size=BLOCK_SIZE, min_size=0, executor=executor
+        )
+
+    assert (witness is None) == (serial is None)
+    if witness is not None:
+        result = entang.Entangled(
+            NUMBER_QUBITS, engine='numpy', ket_format='int',
+            source_policy='first'
+            ).entangled(STATES[kind](NUMBER_QUBITS))
+        assert witness in result.failing_kets()
+        assert witness >= serial
@@ -0,0 +1,91 @@
+"""
+SizedLRUCache: least-recently-used eviction bounded by size, and the
+structures it shares between Entangled objects.
+
+See (sized_cache module)
+"""
+
+import numpy as np
+import pytest
+
+import entanglement_class as entang
+import sized_cache
+
+
+def test_hits_and_misses():
+    cache = sized_cache.SizedLRUCache(max_bytes=100)
+    assert cache.get('a') is None
+    cache.put('a', 1, size=10)
+    assert cache.get('a') == 1
+    assert 'a' in cache
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used():
+    cache = sized_cache.SizedLRUCache(max_bytes=30)
+    for key in 'abc':
+        cache.put(key, key, size=10)
+    cache.get('a')
+    cache.put('d', 'd', size=10)
+
+    assert 'b' not in cache
+    assert all(key in cache for key in 'acd')
+    assert cache.nbytes == 30
+    assert cache.evictions == 1
+
+
+def test_replacing_a_key_updates_its_size():
+    cache = sized_cache.SizedLRUCache(max_bytes=100)
+    cache.put('a', 1, size=40)
+    cache.put('a', 2, size=10)
+    assert cache.get('a') == 2
+    assert (len(cache), cache.nbytes) == (1, 10)
+
+
+def test_value_larger_than_the_cache_is_not_kept():
+    cache = sized_cache.SizedLRUCache(max_bytes=10)
+    cache.put('small', 1, size=5)
+    cache.put('large', 2, size=11)
+    assert 'large' not in cache
+    assert 'small' in cache
+
+
+def test_resize_evicts():
+    cache = sized_cache.SizedLRUCache(max_bytes=100)
+    for key in range(10):
+        cache.put(key, key, size=10)
+    cache.resize(35)
+    assert list(range(7, 10)) == [key for key in range(10) if key in cache]
+    assert cache.nbytes == 30
+
+
+def test_get_or_create_calls_the_factory_once():
+    cache = sized_cache.SizedLRUCache(max_bytes=2**20)
+    calls = []
+
+    def factory():
+        calls.append(1)
+        return tuple(range(10))
+
+    assert cache.get_or_create('kets', factory) == tuple(range(10))
+    assert cache.get_or_create('kets', factory) == tuple(range(10))
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('value', [
+    np.zeros(100), {'a': (1, 2, 3)}, [np.arange(10), 'text']
+    ])
+def test_estimate_size_counts_contents(value):
+    assert sized_cache.estimate_size(value) > sized_cache.estimate_size(None)
+    if isinstance(value, np.ndarray):
+        assert sized_cache.estimate_size(value) >= value.nbytes
+
+
+def test_entangled_objects_share_read_only_structures():
+    entang.Entangled.structure_cache.clear()
+    first, second = entang.Entangled(4), entang.Entangled(4)
+    assert first.kets is second.kets
+    assert first.decomp_dict is second.decomp_dict
+    assert first.decomp_dict['0011']['basis_kets'] == ('0010', '0001')
+    with pytest.raises(TypeError):
+        first.decomp_dict['0011']['basis_kets'] = []
@@ -0,0 +1,101 @@
+"""
+Statevectors on disk: is_entangled() and entangled() on memory-mapped arrays
+and file paths, and results written one block at a time.
+
+See (entanglement_array module)
+"""
+
+import numpy as np
+import pytest
+
+import entanglement_array
+import entanglement_class as entang
+import entanglement_result
+from conftest import STATES, baseline
+
+
+@pytest.mark.parametrize('engine', entang.ENGINES)
+def test_is_entangled_reads_files(tmp_path, state_kind, engine):
+    amplitudes = STATES[state_kind](8)
+    path = tmp_path / 'state.npy'
+    np.save(path, amplitudes)
+    expected = baseline(amplitudes, 8)
+
+    x = entang.Entangled(8, engine=engine, source_policy='first')
+    for statevector in (str(path), entanglement_array.load_statevector(path)):
+        assert x.is_entangled(statevector) == (
+            expected.entangled, expected.witness
+            )
+
+
+def test_raw_complex128_files(tmp_path):
+    amplitudes = STATES['random'](6)
+    path = tmp_path / 'state.bin'
+    amplitudes.tofile(path)
+    loaded = entanglement_array.load_statevector(path, 6)
+    np.testing.assert_array_equal(loaded, amplitudes)
+    with pytest.raises(ValueError):
+        entanglement_array.load_statevector(path, 7)
+
+
+@pytest.mark.parametrize('engine', ('dict', 'numpy'))
+def test_entangled_reads_files_block_by_block(tmp_path, monkeypatch,
+                                              state_kind, engine):
+    amplitudes = STATES[state_kind](8)
+    path = tmp_path / 'state.npy'
+    np.save(path, amplitudes)
+    expected = entang.Entangled(
+        8, engine='numpy', ket_format='int', source_policy='first'
+        ).entangled(amplitudes)
+
+    x = entang.Entangled(
+        8, engine=engine, ket_format='int', source_policy='first'
+        )
+    monkeypatch.setattr(entang.Entangled, 'result_directory', str(tmp_path))
+    for statevector in (str(path), entanglement_array.load_statevector(path)):
+        result = x.entangled(statevector)
+        assert result.entangled == expected.entangled
+        assert result.witness == expected.witness
+        np.testing.assert_array_equal(
+            result.target_amplitudes, expected.target_amplitudes
+            )
+        np.testing.assert_array_equal(
+            result.equality_bits, expected.equality_bits
+            )
+        assert result.to_dict() == expected.to_dict()
+        # the result is mapped from a record that is already removed
+        assert isinstance(result.target_amplitudes, np.memmap)
+        assert list(tmp_path.glob('*.ent')) == []
+
+
+# Blocks of 8 kets, the smallest a record can be written in
+@pytest.mark.parametrize('number_qubits', (2, 3, 6))
+def test_result_writer_matches_result(tmp_path, state_kind, number_qubits):
+    amplitudes = STATES[state_kind](number_qubits)
+    source_index = entanglement_array.choose_source_index(amplitudes, 'first')
+    targets, equality = entanglement_array.criteria(
+        entanglement_array.basis_change(amplitudes, source_index)
+        if source_index else amplitudes,
+        number_qubits
+        )
+    expected = entanglement_result.EntanglementResult(
+        number_qubits, targets, equality
+        )
+
+    writer = entanglement_result.ResultWriter(
+        tmp_path / 'result.ent', number_qubits
+        )
+    for start in range(0, 2**number_qubits, 8):
+        writer.write_block(
+            start, targets[start:start + 8], equality[start:start + 8]
+            )
+    result = writer.close()
+
+    assert result.entangled == expected.entangled
+    assert result.witness == expected.witness
+    np.testing.assert_array_equal(
+        result.target_amplitudes, expected.target_amplitudes
+        )
+    np.testing.assert_array_equal(result.equality_bits, expected.equality_bits)
+    loaded = entanglement_result.load_result(tmp_path / 'result.ent')
+    assert loaded.witness == expected.witness